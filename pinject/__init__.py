@@ -27,8 +27,9 @@ __all__ = [
 
 from .bindings import BindingSpec
 __all__.extend(['BindingSpec'])
-from .decorators import annotate_arg, inject, injectable, provides
-__all__.extend(['annotate_arg', 'inject', 'injectable', 'provides'])
+from .decorators import annotate_arg, inject, injectable, optional_arg, provides
+__all__.extend(
+    ['annotate_arg', 'inject', 'injectable', 'optional_arg', 'provides'])
 for thing_name in dir(errors):
     thing = getattr(errors, thing_name)
     if type(thing) == type(str):
@@ -36,10 +37,18 @@ for thing_name in dir(errors):
         __all__.append(thing_name)
 from .initializers import copy_args_to_internal_fields
 from .initializers import copy_args_to_public_fields
+from .locations import set_capturing_call_sites
+__all__.extend(['set_capturing_call_sites'])
 from .object_graph import new_object_graph
 __all__.extend(['new_object_graph'])
-from .scoping import PROTOTYPE, Scope, SINGLETON
-__all__.extend(['PROTOTYPE', 'Scope', 'SINGLETON'])
+from .scoping import (
+    CacheScope, PoolScope, PROTOTYPE, REQUEST, Scope, SINGLETON, TenantScope,
+    THREAD, WEAK_SINGLETON)
+__all__.extend(
+    ['CacheScope', 'PoolScope', 'PROTOTYPE', 'REQUEST', 'Scope', 'SINGLETON',
+     'TenantScope', 'THREAD', 'WEAK_SINGLETON'])
+from .support import get_introspection_stats
+__all__.extend(['get_introspection_stats'])
 
 # TODO(kurts): figure out how to avoid breaking unittests by uncommenting this
 #   section.
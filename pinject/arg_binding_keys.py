@@ -21,10 +21,12 @@ from . import provider_indirections
 class ArgBindingKey(object):
     """The binding key for an arg of a function."""
 
-    def __init__(self, arg_name, binding_key, provider_indirection):
+    def __init__(self, arg_name, binding_key, provider_indirection,
+                 is_optional=False):
         self._arg_name = arg_name
         self.binding_key = binding_key
         self.provider_indirection = provider_indirection
+        self.is_optional = is_optional
 
     def __repr__(self):
         return '<{0}>'.format(self)
@@ -37,7 +39,8 @@ class ArgBindingKey(object):
         return (isinstance(other, ArgBindingKey) and
                 self._arg_name == other._arg_name and
                 self.binding_key == other.binding_key and
-                self.provider_indirection == other.provider_indirection)
+                self.provider_indirection == other.provider_indirection and
+                self.is_optional == other.is_optional)
 
     def __ne__(self, other):
         return not (self == other)
@@ -112,13 +115,15 @@ _PROVIDE_PREFIX = 'provide_'
 _PROVIDE_PREFIX_LEN = len(_PROVIDE_PREFIX)
 
 
-def new(arg_name, annotated_with=None):
+def new(arg_name, annotated_with=None, is_optional=False):
     """Creates an ArgBindingKey.
 
     Args:
       arg_name: the name of the bound arg
       annotation: an Annotation, or None to create an unannotated arg binding
           key
+      is_optional: whether the arg is left to its default value when nothing
+          is bound to it
     Returns:
       a new ArgBindingKey
     """
@@ -129,4 +134,5 @@ def new(arg_name, annotated_with=None):
         binding_key_name = arg_name
         provider_indirection = provider_indirections.NO_INDIRECTION
     binding_key = binding_keys.new(binding_key_name, annotated_with)
-    return ArgBindingKey(arg_name, binding_key, provider_indirection)
+    return ArgBindingKey(arg_name, binding_key, provider_indirection,
+                         is_optional)
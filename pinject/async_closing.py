@@ -0,0 +1,54 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+This module uses async syntax, so it is only imported on Python 3.5+.
+"""
+
+
+import inspect
+import sys
+
+import six
+
+
+async def aclose_all(closer, instances):
+    """Closes instances, in order, awaiting whatever closing returns.
+
+    Every instance is closed, even if closing one of them raises an
+    exception.
+
+    Args:
+      closer: a closing.Closer
+      instances: a sequence of instances, in the order to close them
+    Raises:
+      Exception: the first exception that closing an instance raised
+    """
+    first_exc_info = None
+    for instance in instances:
+        try:
+            close_fn = closer.get_close_fn(instance, use_async=True)
+            if close_fn is None:
+                continue
+            result = close_fn()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            if first_exc_info is None:
+                first_exc_info = sys.exc_info()
+    if first_exc_info is not None:
+        six.reraise(*first_exc_info)
+
+
+async def return_when_awaited(value):
+    return value
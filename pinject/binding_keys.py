@@ -37,6 +37,9 @@ class BindingKey(object):
         return 'the binding name "{0}" ({1})'.format(
             self._name, self.annotation_as_adjective())
 
+    def get_arg_name(self):
+        return self._name
+
     def annotation_as_adjective(self):
         return self._annotation.as_adjective()
 
@@ -51,6 +54,90 @@ class BindingKey(object):
     def __hash__(self):
         return hash(self._name) ^ hash(self._annotation)
 
+    def without_direct_args(self):
+        return self
+
+
+class DirectArgsBindingKey(BindingKey):
+    """The key for a binding, provided with particular direct args.
+
+    Scopes that memoize per set of direct args (e.g., CacheScope) memoize
+    separately under these keys.  Args of different types are never equal
+    here, so that, e.g., 1, True and 1.0 are memoized separately.
+    """
+
+    def __init__(self, binding_key, direct_pargs, direct_kwargs):
+        """Initializer.
+
+        Args:
+          binding_key: a BindingKey
+          direct_pargs: a tuple of hashable positional args
+          direct_kwargs: a frozenset of (name, hashable value) pairs
+        """
+        BindingKey.__init__(self, binding_key._name, binding_key._annotation)
+        self._binding_key = binding_key
+        self._direct_pargs = direct_pargs
+        self._direct_kwargs = direct_kwargs
+        self._typed_direct_args = (
+            tuple(_get_typed(value) for value in direct_pargs),
+            frozenset((name, _get_typed(value))
+                      for name, value in direct_kwargs))
+
+    def __str__(self):
+        return '{0} with direct pargs {1!r} and kwargs {2!r}'.format(
+            self._binding_key, self._direct_pargs,
+            dict(self._direct_kwargs))
+
+    def __eq__(self, other):
+        return (isinstance(other, DirectArgsBindingKey) and
+                self._binding_key == other._binding_key and
+                self._typed_direct_args == other._typed_direct_args)
+
+    def __hash__(self):
+        return hash(self._binding_key) ^ hash(self._typed_direct_args)
+
+    def without_direct_args(self):
+        return self._binding_key
+
+
+class QualifiedBindingKey(BindingKey):
+    """The key for a binding, qualified by the object graph providing it.
+
+    Scopes shared by several object graphs memoize separately under these
+    keys what each graph provides with its own bindings.
+    """
+
+    def __init__(self, binding_key, qualifier):
+        """Initializer.
+
+        Args:
+          binding_key: a BindingKey
+          qualifier: an object identifying the object graph, compared by
+              identity
+        """
+        BindingKey.__init__(self, binding_key._name, binding_key._annotation)
+        self._binding_key = binding_key
+        self._qualifier = qualifier
+
+    def __str__(self):
+        return str(self._binding_key)
+
+    def __eq__(self, other):
+        return (isinstance(other, QualifiedBindingKey) and
+                self._binding_key == other._binding_key and
+                self._qualifier is other._qualifier)
+
+    def __hash__(self):
+        return hash(self._binding_key) ^ id(self._qualifier)
+
+
+def _get_typed(value):
+    if isinstance(value, tuple):
+        return type(value), tuple(_get_typed(item) for item in value)
+    if isinstance(value, frozenset):
+        return type(value), frozenset(_get_typed(item) for item in value)
+    return type(value), value
+
 
 def new(arg_name, annotated_with=None):
     """Creates a BindingKey.
@@ -66,3 +153,38 @@ def new(arg_name, annotated_with=None):
     else:
         annotation = annotations.NO_ANNOTATION
     return BindingKey(arg_name, annotation)
+
+
+def new_with_direct_args(binding_key, direct_pargs, direct_kwargs):
+    """Creates a BindingKey for providing with particular direct args.
+
+    Args:
+      binding_key: a BindingKey
+      direct_pargs: a sequence of positional args
+      direct_kwargs: a dict of keyword args
+    Returns:
+      binding_key if there are no direct args, else a new
+          DirectArgsBindingKey, or None if any direct arg is unhashable
+    """
+    if not direct_pargs and not direct_kwargs:
+        return binding_key
+    try:
+        direct_args_binding_key = DirectArgsBindingKey(
+            binding_key, tuple(direct_pargs),
+            frozenset(direct_kwargs.items()))
+        hash(direct_args_binding_key)
+    except TypeError:
+        return None
+    return direct_args_binding_key
+
+
+def new_qualified(binding_key, qualifier):
+    """Creates a BindingKey qualified by an object graph.
+
+    Args:
+      binding_key: a BindingKey
+      qualifier: an object identifying the object graph
+    Returns:
+      a new QualifiedBindingKey
+    """
+    return QualifiedBindingKey(binding_key, qualifier)
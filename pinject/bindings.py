@@ -26,15 +26,25 @@ from . import providing
 from . import scoping
 
 
+TO_CLASS = 'class'
+TO_SOURCE_CLASS = 'source class'
+TO_INSTANCE = 'instance'
+TO_PROVIDER_FN = 'provider function'
+
+_IS_CLASS_ALIAS_PROVIDER_FN_ATTR = '_pinject_is_class_alias_provider_fn'
+
+
 class Binding(object):
 
     def __init__(self, binding_key, proviser_fn, get_binding_target_desc_fn,
-                 scope_id, get_binding_loc_fn):
+                 scope_id, get_binding_loc_fn, target_kind=None, target=None):
         self.binding_key = binding_key
         self.proviser_fn = proviser_fn
         self.get_binding_target_desc_fn = get_binding_target_desc_fn
         self.scope_id = scope_id
         self._get_binding_loc_fn = get_binding_loc_fn
+        self.target_kind = target_kind
+        self.target = target
 
     def __str__(self):
         return 'the binding at {0}, from {1} to {2}, in "{3}" scope'.format(
@@ -104,15 +114,28 @@ def get_overall_binding_key_to_binding_maps(bindings_lists):
 class BindingMapping(object):
 
     def __init__(self, binding_key_to_binding,
-                 collided_binding_key_to_bindings):
+                 collided_binding_key_to_bindings, parent=None):
+        """Initializer.
+
+        Args:
+          binding_key_to_binding: a dict mapping BindingKey to Binding
+          collided_binding_key_to_bindings: a dict mapping BindingKey to the
+              Bindings that collided for it
+          parent: a BindingMapping to fall back to for binding keys that
+              this one doesn't contain, or None
+        """
         self._binding_key_to_binding = binding_key_to_binding
         self._collided_binding_key_to_bindings = (
             collided_binding_key_to_bindings)
+        self._parent = parent
 
     def verify_requirements(self, required_bindings):
         for required_binding in required_bindings:
             required_binding_key = required_binding.binding_key
-            if required_binding_key not in self._binding_key_to_binding:
+            if (self._parent is not None and
+                    not self.contains(required_binding_key)):
+                self._parent.verify_requirements([required_binding])
+            elif required_binding_key not in self._binding_key_to_binding:
                 if (required_binding_key in
                     self._collided_binding_key_to_bindings):
                     raise errors.ConflictingRequiredBindingError(
@@ -122,16 +145,31 @@ class BindingMapping(object):
                 else:
                     raise errors.MissingRequiredBindingError(required_binding)
 
-    def get(self, binding_key, injection_site_desc):
+    def is_bound(self, binding_key):
+        """Returns whether this mapping, or its parent, has binding_key."""
+        return (binding_key in self._binding_key_to_binding or
+                binding_key in self._collided_binding_key_to_bindings or
+                (self._parent is not None and
+                 self._parent.is_bound(binding_key)))
+
+    def contains(self, binding_key):
+        """Returns whether this mapping, not its parent, has binding_key."""
+        return (binding_key in self._binding_key_to_binding or
+                binding_key in self._collided_binding_key_to_bindings)
+
+    def get(self, binding_key, injection_site_fn):
         if binding_key in self._binding_key_to_binding:
             return self._binding_key_to_binding[binding_key]
+        elif (self._parent is not None and
+              binding_key not in self._collided_binding_key_to_bindings):
+            return self._parent.get(binding_key, injection_site_fn)
         elif binding_key in self._collided_binding_key_to_bindings:
             raise errors.AmbiguousArgNameError(
-                injection_site_desc, binding_key,
+                injection_site_fn, binding_key,
                 self._collided_binding_key_to_bindings[binding_key])
         else:
             raise errors.NothingInjectableForArgError(
-                binding_key, injection_site_desc)
+                binding_key, injection_site_fn)
 
 
 def default_get_arg_names_from_class_name(class_name):
@@ -176,17 +214,33 @@ def get_explicit_class_bindings(
 def get_provider_bindings(
         binding_spec, known_scope_ids,
         get_arg_names_from_provider_fn_name=(
-            providing.default_get_arg_names_from_provider_fn_name)):
+            providing.default_get_arg_names_from_provider_fn_name),
+        discovery_cache=None):
     provider_bindings = []
-    fns = inspect.getmembers(binding_spec, lambda x: inspect.ismethod(x))
-    for _, fn in fns:
+    provider_fn_names = None
+    if discovery_cache is not None:
+        provider_fn_names = discovery_cache.get_provider_fn_names(
+            binding_spec, get_arg_names_from_provider_fn_name)
+    if provider_fn_names is not None:
+        fns = [(fn_name, getattr(binding_spec, fn_name))
+               for fn_name in provider_fn_names]
+    else:
+        fns = inspect.getmembers(binding_spec, lambda x: inspect.ismethod(x))
+    found_provider_fn_names = []
+    for fn_name, fn in fns:
         default_arg_names = get_arg_names_from_provider_fn_name(fn.__name__)
         fn_bindings = get_provider_fn_bindings(fn, default_arg_names)
+        if fn_bindings:
+            found_provider_fn_names.append(fn_name)
         for binding in fn_bindings:
             if binding.scope_id not in known_scope_ids:
                 raise errors.UnknownScopeError(
                     binding.scope_id, locations.get_name_and_loc(fn))
         provider_bindings.extend(fn_bindings)
+    if discovery_cache is not None and provider_fn_names is None:
+        discovery_cache.set_provider_fn_names(
+            binding_spec, get_arg_names_from_provider_fn_name,
+            found_provider_fn_names)
     return provider_bindings
 
 
@@ -204,6 +258,43 @@ def get_implicit_class_bindings(
     return implicit_bindings
 
 
+def get_source_class_bindings(
+        source_classes, only_use_explicit_bindings,
+        get_arg_names_from_class_name=(
+            default_get_arg_names_from_class_name)):
+    """Creates bindings for classes found without importing their modules.
+
+    Binding specs aren't bound, since they're only ever passed to
+    new_object_graph(), never injected.
+
+    Args:
+      source_classes: a sequence of finding.SourceClass
+      only_use_explicit_bindings: whether to create bindings only for classes
+          whose initializers are explicitly injectable
+      get_arg_names_from_class_name: a function mapping a class name to a
+          sequence of the arg names to which those classes should be
+          implicitly bound
+    Returns:
+      a pair of the list of implicit bindings and the list of explicit
+          bindings
+    """
+    implicit_bindings = []
+    explicit_bindings = []
+    for source_class in source_classes:
+        if source_class.is_binding_spec:
+            continue
+        for arg_name in get_arg_names_from_class_name(source_class.name):
+            if not only_use_explicit_bindings:
+                implicit_bindings.append(new_binding_to_source_class(
+                    binding_keys.new(arg_name), source_class,
+                    scoping.DEFAULT_SCOPE, source_class.get_loc))
+            if source_class.is_explicitly_injectable:
+                explicit_bindings.append(new_binding_to_source_class(
+                    binding_keys.new(arg_name), source_class,
+                    scoping.DEFAULT_SCOPE, source_class.get_loc))
+    return implicit_bindings, explicit_bindings
+
+
 class Binder(object):
 
     def __init__(self, collected_bindings, scope_ids):
@@ -237,6 +328,7 @@ class Binder(object):
                                  in_scope=in_scope)
             def provide_it(_pinject_class):
                 return _pinject_class
+            setattr(provide_it, _IS_CLASS_ALIAS_PROVIDER_FN_ATTR, True)
             with self._lock:
                 self._collected_bindings.extend(
                     get_provider_fn_bindings(provide_it, [arg_name]))
@@ -265,7 +357,18 @@ def new_binding_to_class(binding_key, to_class, in_scope, get_binding_loc_fn):
     def GetBindingTargetDesc():
         return 'the class {0}'.format(locations.get_name_and_loc(to_class))
     return Binding(binding_key, Proviser, GetBindingTargetDesc, in_scope,
-                   get_binding_loc_fn)
+                   get_binding_loc_fn, TO_CLASS, to_class)
+
+
+def new_binding_to_source_class(
+        binding_key, source_class, in_scope, get_binding_loc_fn):
+    def Proviser(injection_context, obj_provider, pargs, kwargs):
+        return obj_provider.provide_class(
+            source_class.get_class(), injection_context, pargs, kwargs)
+    def GetBindingTargetDesc():
+        return 'the class {0}'.format(source_class)
+    return Binding(binding_key, Proviser, GetBindingTargetDesc, in_scope,
+                   get_binding_loc_fn, TO_SOURCE_CLASS, source_class)
 
 
 def new_binding_to_instance(
@@ -278,7 +381,7 @@ def new_binding_to_instance(
     def GetBindingTargetDesc():
         return 'the instance {0!r}'.format(to_instance)
     return Binding(binding_key, Proviser, GetBindingTargetDesc, in_scope,
-                   get_binding_loc_fn)
+                   get_binding_loc_fn, TO_INSTANCE, to_instance)
 
 
 class BindingSpec(object):
@@ -310,5 +413,21 @@ def get_provider_fn_bindings(provider_fn, default_arg_names):
                                  provider_decoration.annotated_with),
                 Proviser, GetBindingTargetDescFn,
                 provider_decoration.in_scope_id,
-                lambda p_fn=provider_fn: locations.get_loc(p_fn))
+                lambda p_fn=provider_fn: locations.get_loc(p_fn),
+                TO_PROVIDER_FN, provider_fn)
         for provider_decoration in provider_decorations]
+
+
+def is_class_alias_provider_fn(provider_fn):
+    """Returns whether a provider function was created by Binder.bind().
+
+    bind(arg_name, to_class=...) binds the arg name to a provider function
+    that just returns whatever is bound to a hidden binding key for the
+    class, so that the class is memoized at the class level.
+
+    Args:
+      provider_fn: a provider function
+    Returns:
+      True iff provider_fn returns its only arg unchanged
+    """
+    return getattr(provider_fn, _IS_CLASS_ALIAS_PROVIDER_FN_ATTR, False)
@@ -0,0 +1,233 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import sys
+import threading
+import weakref
+
+import six
+
+from . import support
+
+
+class Closer(object):
+    """Tears down provided instances that hold resources.
+
+    An instance is closed with the close hook registered for its class (or
+    one of its superclasses), else, if the object graph created it, with its
+    close() method.  Other instances (e.g., those returned by provider
+    functions, which may be shared with something else) are left alone.
+    __exit__() methods are never called, since the object graph never
+    entered the instances.
+    """
+
+    def __init__(self, externally_owned_instances=(), created_instances=None,
+                 created_instances_lock=None):
+        """Initializer.
+
+        Args:
+          externally_owned_instances: instances that must never be closed,
+              because something other than the object graph created them
+              (e.g., instances bound with bind(..., to_instance=...))
+          created_instances: a WeakValueDictionary mapping the IDs of the
+              instances that the object graph (or a related one) created to
+              the instances, or None for a new one
+          created_instances_lock: the lock guarding created_instances, or
+              None for a new one
+        """
+        self._cls_to_close_fn = []
+        self._externally_owned_instance_ids = set(
+            id(instance) for instance in externally_owned_instances)
+        # Keeping the instances referenced keeps their IDs from being reused.
+        self._externally_owned_instances = list(externally_owned_instances)
+        # Instances that can't be weakly referenced aren't recorded, so
+        # they're only closed by close hooks.  Instances are recorded by ID,
+        # rather than in a WeakSet, since they needn't be hashable, and an
+        # equal instance that the object graph didn't create mustn't count.
+        if created_instances is None:
+            created_instances = weakref.WeakValueDictionary()
+        self._created_instances = created_instances
+        if created_instances_lock is None:
+            created_instances_lock = threading.Lock()
+        self._created_instances_lock = created_instances_lock
+        self._lock = threading.Lock()
+
+    def new_child(self, externally_owned_instances=()):
+        """Creates a Closer for a child or overlay object graph.
+
+        Instances created by either Closer's object graph count as created
+        by both, since a child's instances may be memoized in its parent's
+        scopes.
+
+        Args:
+          externally_owned_instances: instances that the child must never
+              close
+        Returns:
+          a new Closer
+        """
+        return Closer(externally_owned_instances, self._created_instances,
+                      self._created_instances_lock)
+
+    def record_created(self, instance):
+        """Records that the object graph created an instance.
+
+        Args:
+          instance: an instance that the object graph created by calling its
+              class
+        """
+        if not _is_closeable_class.get(type(instance)):
+            return
+        try:
+            with self._created_instances_lock:
+                self._created_instances[id(instance)] = instance
+        except TypeError:
+            pass
+
+    def register_close_hook(self, cls, close_fn):
+        with self._lock:
+            # Replacing the list, rather than changing it, lets
+            # get_close_fn() iterate over it without the lock.
+            self._cls_to_close_fn = (
+                [(cls, close_fn)] + self._cls_to_close_fn)
+
+    def get_close_fn(self, instance, use_async=False):
+        """Returns a function that closes an instance, or None.
+
+        Args:
+          instance: a provided instance
+          use_async: whether to prefer aclose(), which returns an
+              awaitable, over close()
+        Returns:
+          a function taking no args, or None if instance needs no closing
+        """
+        if id(instance) in self._externally_owned_instance_ids:
+            return None
+        for cls, close_fn in self._cls_to_close_fn:
+            if isinstance(instance, cls):
+                return lambda: close_fn(instance)
+        if self._created_instances.get(id(instance)) is not instance:
+            return None
+        if use_async and callable(getattr(instance, 'aclose', None)):
+            return instance.aclose
+        if callable(getattr(instance, 'close', None)):
+            return instance.close
+        return None
+
+    def close_all(self, instances):
+        """Closes instances, in order.
+
+        Every instance is closed, even if closing one of them raises an
+        exception.
+
+        Args:
+          instances: a sequence of instances, in the order to close them
+        Raises:
+          Exception: the first exception that closing an instance raised
+        """
+        first_exc_info = None
+        for instance in instances:
+            try:
+                close_fn = self.get_close_fn(instance)
+                if close_fn is not None:
+                    close_fn()
+            except Exception:
+                if first_exc_info is None:
+                    first_exc_info = sys.exc_info()
+        if first_exc_info is not None:
+            six.reraise(*first_exc_info)
+
+
+_is_closeable_class = support.IntrospectionCache(
+    'closeable_classes',
+    lambda cls: (callable(getattr(cls, 'close', None)) or
+                 callable(getattr(cls, 'aclose', None))))
+
+
+def pop_all_scope_instances(scopes, last_scope, dependency_index=None):
+    """Takes the memoized instances from scopes, in teardown order.
+
+    Each instance comes before the instances that it depends on, as far as
+    the dependency index knows, even when they're in different scopes.
+    Otherwise, the instances in last_scope come last, and each scope's own
+    order is kept.
+
+    Args:
+      scopes: a sequence of scopes, some of which may define
+          pop_binding_keys_and_instances(), returning (BindingKey, instance)
+          pairs, or pop_instances(), returning only instances, in the order
+          to tear them down, and forgetting them
+      last_scope: the scope whose instances to tear down last, because the
+          instances in other scopes may depend on them
+      dependency_index: a DependencyIndex of the binding keys that the
+          instances were provided for, or None
+    Returns:
+      a list of distinct instances
+    """
+    ordered_scopes = [scope for scope in scopes if scope is not last_scope]
+    ordered_scopes.append(last_scope)
+    binding_keys_and_instances = []
+    instance_ids = set()
+    for scope in ordered_scopes:
+        if hasattr(scope, 'pop_binding_keys_and_instances'):
+            scope_binding_keys_and_instances = (
+                scope.pop_binding_keys_and_instances())
+        elif hasattr(scope, 'pop_instances'):
+            scope_binding_keys_and_instances = [
+                (None, instance) for instance in scope.pop_instances()]
+        else:
+            continue
+        for binding_key, instance in scope_binding_keys_and_instances:
+            if id(instance) not in instance_ids:
+                instance_ids.add(id(instance))
+                binding_keys_and_instances.append((binding_key, instance))
+    if dependency_index is None:
+        return [instance for _, instance in binding_keys_and_instances]
+    return _get_dependents_first(binding_keys_and_instances, dependency_index)
+
+
+def _get_dependents_first(binding_keys_and_instances, dependency_index):
+    binding_key_to_instances = {}
+    for binding_key, instance in binding_keys_and_instances:
+        if binding_key is not None:
+            binding_key_to_instances.setdefault(binding_key, []).append(
+                instance)
+    ordered_instances = []
+    visited_binding_keys = set()
+    for binding_key, instance in binding_keys_and_instances:
+        if binding_key is None:
+            ordered_instances.append(instance)
+            continue
+        if binding_key in visited_binding_keys:
+            continue
+        # This is a depth-first search of the dependents, which adds each
+        # binding key's instances after those of everything depending on
+        # it.  It's iterative, since dependency chains can be long.
+        visited_binding_keys.add(binding_key)
+        to_visit = [(binding_key, iter(
+            dependency_index.get_direct_dependents(binding_key)))]
+        while to_visit:
+            visiting_binding_key, dependents = to_visit[-1]
+            for dependent in dependents:
+                if dependent not in visited_binding_keys:
+                    visited_binding_keys.add(dependent)
+                    to_visit.append((dependent, iter(
+                        dependency_index.get_direct_dependents(dependent))))
+                    break
+            else:
+                to_visit.pop()
+                ordered_instances.extend(
+                    binding_key_to_instances.get(visiting_binding_key, ()))
+    return ordered_instances
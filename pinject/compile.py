@@ -0,0 +1,405 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Compiles an object graph ahead of time into a module of plain functions.
+
+Usage:
+  python -m pinject.compile --class some.module:SomeClass \\
+      --binding-spec some.module:SomeBindingSpec --output some_wiring.py
+  python -m pinject.compile --class some.module:SomeClass \\
+      --binding-spec some.module:SomeBindingSpec --check some_wiring.py
+"""
+
+
+import argparse
+import ast
+import importlib
+import inspect
+import sys
+
+from . import arg_binding_keys
+from . import bindings
+from . import decorators
+from . import errors
+from . import finding
+from . import locations
+from . import object_graph
+from . import provider_indirections
+from . import scoping
+from . import support
+
+
+_COMPILABLE_SCOPE_IDS = [scoping.SINGLETON, scoping.PROTOTYPE]
+
+
+def compile_object_graph(obj_graph, classes):
+    """Generates a module that provides instances without an object graph.
+
+    The generated module has a provide_*() function for each of the classes,
+    and a provide() function taking one of the classes, which are equivalent
+    to calling obj_graph.provide() with the class.  The wiring and scopes are
+    resolved now, so the generated functions call initializers and provider
+    methods directly.
+
+    Only bindings in singleton or prototype scope, to importable classes and
+    provider functions, to binding specs whose initializers take no args, and
+    to instances that are python literals can be compiled.
+
+    Args:
+      obj_graph: an ObjectGraph
+      classes: the classes of which the generated module provides instances
+    Returns:
+      the source code of the generated module
+    Raises:
+      Error: an instance of one of the classes is not providable, or its
+          provision cannot be compiled
+    """
+    support.verify_class_types(classes, 'classes')
+    compiler = _Compiler(obj_graph._obj_provider, obj_graph._is_injectable_fn)
+    for cls in classes:
+        compiler.add_root_class(cls)
+    return compiler.get_source()
+
+
+class _Compiler(object):
+
+    def __init__(self, obj_provider, is_injectable_fn):
+        self._obj_provider = obj_provider
+        self._is_injectable_fn = is_injectable_fn
+        self._module_names = set()
+        self._binding_spec_var_defs = []
+        self._binding_spec_to_var_name = {}
+        self._instance_var_defs = []
+        self._binding_to_fn_name = {}
+        self._num_bindings = 0
+        self._binding_stack = []
+        self._fn_defs = []
+        self._root_fn_defs = []
+        self._cls_ref_to_root_fn_name = []
+
+    def add_root_class(self, cls):
+        if not self._is_injectable_fn(cls):
+            raise errors.NonExplicitlyBoundClassError(
+                locations.get_back_frame_loc(), cls)
+        cls_ref = self._get_ref(cls, 'the class {0}'.format(
+            locations.get_name_and_loc(cls)))
+        if support.is_constructor_defined(cls):
+            call_args = self._get_call_args(cls.__init__)
+        else:
+            call_args = []
+        root_fn_name = self._get_root_fn_name(cls)
+        self._root_fn_defs.append(
+            'def {0}():\n    return {1}({2})\n'.format(
+                root_fn_name, cls_ref, ', '.join(call_args)))
+        self._cls_ref_to_root_fn_name.append((cls_ref, root_fn_name))
+
+    def get_source(self):
+        if not self._is_injecting_none_allowed():
+            self._module_names.add(errors.__name__)
+        sections = []
+        sections.append(
+            '"""Provides instances without an object graph.\n\n'
+            'Generated by pinject.compile; do not edit.  Run pinject.compile'
+            ' with\n--check to verify that this module is up to date.\n'
+            '"""\n')
+        sections.append('import threading\n\n' + ''.join(
+            'import {0}\n'.format(module_name)
+            for module_name in sorted(self._module_names)))
+        sections.append('_rlock = threading.RLock()\n_singletons = {}\n')
+        if self._binding_spec_var_defs or self._instance_var_defs:
+            sections.append(''.join(
+                self._binding_spec_var_defs + self._instance_var_defs))
+        sections.extend(self._fn_defs)
+        sections.extend(self._root_fn_defs)
+        sections.append(
+            '_CLASS_TO_PROVIDE_FN = {{\n{0}}}\n'.format(''.join(
+                '    {0}: {1},\n'.format(cls_ref, root_fn_name)
+                for cls_ref, root_fn_name in self._cls_ref_to_root_fn_name)))
+        sections.append(
+            'def provide(cls):\n    return _CLASS_TO_PROVIDE_FN[cls]()\n')
+        return '\n\n'.join(sections)
+
+    def _is_injecting_none_allowed(self):
+        return self._obj_provider.is_injecting_none_allowed()
+
+    def _get_root_fn_name(self, cls):
+        arg_names = bindings.default_get_arg_names_from_class_name(
+            cls.__name__)
+        base_name = 'provide_{0}'.format(
+            arg_names[0] if arg_names else cls.__name__.lower())
+        root_fn_names = [
+            root_fn_name for _, root_fn_name in self._cls_ref_to_root_fn_name]
+        root_fn_name = base_name
+        index = 2
+        while root_fn_name in root_fn_names:
+            root_fn_name = '{0}_{1}'.format(base_name, index)
+            index += 1
+        return root_fn_name
+
+    def _get_call_args(self, fn):
+        arg_binding_key_to_expr = {}
+        for arg_binding_key in self._obj_provider.get_bound_arg_binding_keys(
+                decorators.get_injectable_arg_binding_keys(fn, [], {})):
+            binding = self._obj_provider.get_binding(
+                arg_binding_key.binding_key, fn)
+            fn_name = self._get_binding_fn_name(binding)
+            if (arg_binding_key.provider_indirection is
+                    provider_indirections.INDIRECTION):
+                arg_binding_key_to_expr[arg_binding_key] = fn_name
+            else:
+                if _get_required_direct_arg_names(binding):
+                    raise errors.OnlyInstantiableViaProviderFunctionError(
+                        fn, arg_binding_key, binding)
+                arg_binding_key_to_expr[arg_binding_key] = fn_name + '()'
+        arg_name_to_expr = arg_binding_keys.create_kwargs(
+            list(arg_binding_key_to_expr.keys()),
+            lambda arg_binding_key: arg_binding_key_to_expr[arg_binding_key])
+        return ['{0}={1}'.format(arg_name, arg_name_to_expr[arg_name])
+                for arg_name in sorted(arg_name_to_expr.keys())]
+
+    def _get_binding_fn_name(self, binding):
+        if binding in self._binding_to_fn_name:
+            return self._binding_to_fn_name[binding]
+        if binding in self._binding_stack:
+            raise errors.CyclicInjectionError(self._binding_stack + [binding])
+        if binding.scope_id not in _COMPILABLE_SCOPE_IDS:
+            raise errors.UncompilableError(
+                binding, 'only bindings in {0} can be compiled'.format(
+                    ' or '.join(str(scope_id)
+                                for scope_id in _COMPILABLE_SCOPE_IDS)))
+        self._binding_stack.append(binding)
+        try:
+            index = self._num_bindings
+            self._num_bindings += 1
+            fn_name = '_provide_{0}'.format(index)
+            if binding.target_kind == bindings.TO_INSTANCE:
+                fn_def = self._get_instance_fn_def(binding, fn_name, index)
+            else:
+                fn_def = self._get_call_fn_def(binding, fn_name, index)
+        finally:
+            self._binding_stack.pop()
+        self._binding_to_fn_name[binding] = fn_name
+        self._fn_defs.append('# {0}\n{1}'.format(
+            self._get_binding_desc(binding), fn_def))
+        return fn_name
+
+    def _get_binding_desc(self, binding):
+        # Classes bound with bind() are memoized under binding keys annotated
+        # with the class and scope ID, whose descriptions include memory
+        # addresses, which would make the generated source differ from run
+        # to run.
+        cls = _get_target_class(binding)
+        if cls is not None:
+            return 'the class {0}'.format(self._get_ref(cls, binding))
+        return str(binding.binding_key)
+
+    def _get_instance_fn_def(self, binding, fn_name, index):
+        instance_repr = repr(binding.target)
+        try:
+            is_literal = ast.literal_eval(instance_repr) == binding.target
+        except (ValueError, SyntaxError):
+            is_literal = False
+        if not is_literal:
+            raise errors.UncompilableError(
+                binding, 'only instances that are python literals can be'
+                ' compiled')
+        if binding.target is None and not self._is_injecting_none_allowed():
+            raise errors.InjectingNoneDisallowedError(binding)
+        instance_var_name = '_instance_{0}'.format(index)
+        self._instance_var_defs.append('{0} = {1}\n'.format(
+            instance_var_name, instance_repr))
+        return 'def {0}():\n    return {1}\n'.format(
+            fn_name, instance_var_name)
+
+    def _get_call_fn_def(self, binding, fn_name, index):
+        cls = _get_target_class(binding)
+        if cls is not None:
+            callee_ref = self._get_ref(cls, binding)
+            if support.is_constructor_defined(cls):
+                call_args = self._get_call_args(cls.__init__)
+            else:
+                call_args = []
+        elif bindings.is_class_alias_provider_fn(binding.target):
+            [call_arg] = self._get_call_args(binding.target)
+            _, callee_ref = call_arg.split('=', 1)
+            call_args = None
+        else:
+            provider_fn = binding.target
+            if inspect.ismethod(provider_fn):
+                callee_ref = '{0}.{1}'.format(
+                    self._get_binding_spec_var_name(
+                        provider_fn.__self__, binding),
+                    provider_fn.__name__)
+            else:
+                callee_ref = self._get_ref(provider_fn, binding)
+            call_args = self._get_call_args(provider_fn)
+        if call_args is None:
+            new_instance_expr = callee_ref
+        else:
+            new_instance_expr = '{0}({1})'.format(
+                callee_ref, ', '.join(['*pargs'] + call_args + ['**kwargs']))
+        lines = ['def {0}(*pargs, **kwargs):'.format(fn_name)]
+        # Like SingletonScope, this memoizes by binding alone, whatever
+        # direct args are passed.
+        if binding.scope_id == scoping.SINGLETON:
+            lines.extend([
+                '    try:',
+                '        return _singletons[{0}]'.format(index),
+                '    except KeyError:',
+                '        with _rlock:',
+                '            if {0} not in _singletons:'.format(index),
+                '                instance = {0}'.format(new_instance_expr)])
+            lines.extend(
+                self._get_none_check_lines(binding, '                '))
+            lines.extend([
+                '                _singletons[{0}] = instance'.format(index),
+                '            return _singletons[{0}]'.format(index)])
+        else:
+            lines.append('    instance = {0}'.format(new_instance_expr))
+            lines.extend(self._get_none_check_lines(binding, '    '))
+            lines.append('    return instance')
+        return ''.join(line + '\n' for line in lines)
+
+    def _get_none_check_lines(self, binding, indent):
+        if (self._is_injecting_none_allowed() or
+                _get_target_class(binding) is not None):
+            return []
+        return [indent + 'if instance is None:',
+                indent + '    raise {0}.InjectingNoneDisallowedError({1!r})'
+                .format(errors.__name__, self._get_binding_desc(binding))]
+
+    def _get_binding_spec_var_name(self, binding_spec, binding):
+        if binding_spec in self._binding_spec_to_var_name:
+            return self._binding_spec_to_var_name[binding_spec]
+        binding_spec_class = binding_spec.__class__
+        if (support.is_constructor_defined(binding_spec_class) and
+                support.get_method_args(binding_spec_class.__init__)[0] !=
+                ['self']):
+            raise errors.UncompilableError(
+                binding, 'binding spec {0} has initializer args'.format(
+                    binding_spec_class.__name__))
+        var_name = '_binding_spec_{0}'.format(
+            len(self._binding_spec_to_var_name))
+        self._binding_spec_var_defs.append('{0} = {1}()\n'.format(
+            var_name, self._get_ref(binding_spec_class, binding)))
+        self._binding_spec_to_var_name[binding_spec] = var_name
+        return var_name
+
+    def _get_ref(self, thing, thing_desc):
+        module_name = getattr(thing, '__module__', None)
+        qualname = getattr(thing, '__qualname__', thing.__name__)
+        if (module_name is None or module_name == '__main__' or
+                locations.LOCALS_TOKEN in qualname):
+            raise errors.UncompilableError(
+                thing_desc, '{0} is not importable'.format(qualname))
+        referent = sys.modules.get(module_name)
+        for name in qualname.split('.'):
+            referent = getattr(referent, name, None)
+        if referent is not thing:
+            raise errors.UncompilableError(
+                thing_desc, '{0}.{1} is not importable'.format(
+                    module_name, qualname))
+        self._module_names.add(module_name)
+        return '{0}.{1}'.format(module_name, qualname)
+
+
+def _get_required_direct_arg_names(binding):
+    cls = _get_target_class(binding)
+    if cls is not None:
+        if not support.is_constructor_defined(cls):
+            return []
+        return decorators.get_required_direct_arg_names(cls.__init__)
+    elif binding.target_kind == bindings.TO_PROVIDER_FN:
+        return decorators.get_required_direct_arg_names(binding.target)
+    return []
+
+
+def _get_target_class(binding):
+    if binding.target_kind == bindings.TO_CLASS:
+        return binding.target
+    elif binding.target_kind == bindings.TO_SOURCE_CLASS:
+        # Compiling happens ahead of time, so importing is fine.
+        return binding.target.get_class()
+    return None
+
+
+def _import_thing(thing_path):
+    module_name, _, qualname = thing_path.partition(':')
+    thing = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        thing = getattr(thing, name)
+    return thing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pinject.compile',
+        description='Compiles an object graph into a module of functions.')
+    parser.add_argument(
+        '--class', dest='classes', action='append', required=True,
+        metavar='MODULE:CLASS',
+        help='a class whose instances the generated module provides')
+    parser.add_argument(
+        '--binding-spec', dest='binding_specs', action='append', default=[],
+        metavar='MODULE:CLASS',
+        help='a binding spec class to instantiate and use')
+    parser.add_argument(
+        '--module', dest='modules', action='append', metavar='MODULE',
+        help='a module in which to look for classes for implicit bindings'
+        ' (by default, all imported modules)')
+    parser.add_argument('--only-use-explicit-bindings', action='store_true')
+    parser.add_argument('--allow-injecting-none', action='store_true')
+    output_group = parser.add_mutually_exclusive_group(required=True)
+    output_group.add_argument(
+        '--output', metavar='PATH', help='where to write the generated module')
+    output_group.add_argument(
+        '--check', metavar='PATH',
+        help='a previously generated module to verify is up to date')
+    args = parser.parse_args(argv)
+
+    classes = [_import_thing(cls_path) for cls_path in args.classes]
+    binding_specs = [_import_thing(binding_spec_path)()
+                     for binding_spec_path in args.binding_specs]
+    if args.modules is not None:
+        modules = [importlib.import_module(module_name)
+                   for module_name in args.modules]
+    else:
+        modules = finding.ALL_IMPORTED_MODULES
+    try:
+        obj_graph = object_graph.new_object_graph(
+            modules=modules, binding_specs=binding_specs,
+            only_use_explicit_bindings=args.only_use_explicit_bindings,
+            allow_injecting_none=args.allow_injecting_none)
+        source = compile_object_graph(obj_graph, classes)
+    except errors.Error as e:
+        sys.stderr.write('{0}\n'.format(e))
+        return 1
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            output_file.write(source)
+        return 0
+    try:
+        with open(args.check) as checked_file:
+            checked_source = checked_file.read()
+    except (IOError, OSError):
+        checked_source = None
+    if checked_source != source:
+        sys.stderr.write('{0} does not match the object graph; regenerate it'
+                         ' with --output\n'.format(args.check))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
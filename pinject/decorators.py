@@ -53,6 +53,33 @@ def annotate_arg(arg_name, with_annotation):
                                 arg_binding_key=arg_binding_key)
 
 
+def optional_arg(arg_name, with_annotation=None):
+    """Marks an injected arg as optional.
+
+    An optional arg is injected if something is bound to it, and otherwise
+    keeps its default value, i.e.,
+      @optional_arg('foo')
+      def a_function(foo=None):  # ...
+    is OK, but
+      @optional_arg('foo')
+      def a_function(foo):  # ...
+    is not.
+
+    An optional arg may also be annotated, via with_annotation, since the
+    same arg (on the same function) may not be annotated twice.
+
+    Args:
+      arg_name: the name of the optional arg on the decorated function
+      with_annotation: an annotation object, or None
+    Returns:
+      a function that will decorate functions passed to it
+    """
+    arg_binding_key = arg_binding_keys.new(
+        arg_name, with_annotation, is_optional=True)
+    return _get_pinject_wrapper(locations.get_back_frame_loc(),
+                                arg_binding_key=arg_binding_key)
+
+
 def inject(arg_names=None, all_except=None):
     """Marks an initializer explicitly as injectable.
 
@@ -75,6 +102,11 @@ def inject(arg_names=None, all_except=None):
     initialzer via Pinject?).  At most one of arg_names and all_except may be
     specified.  A function may be decorated by @inject at most once.
 
+    Args passed directly don't change what a scope memoizes by: only scopes
+    that define provide_with_direct_args() (e.g., CacheScope) memoize an
+    instance per set of direct args.  Other memoizing scopes, like
+    SINGLETON, provide whatever they memoized first, whatever the args.
+
     """
     back_frame_loc = locations.get_back_frame_loc()
     if arg_names is not None and all_except is not None:
@@ -220,11 +252,18 @@ def _get_pinject_wrapper(
         inject_arg_names=None, inject_all_except_arg_names=None):
     def get_pinject_decorated_fn_with_additions(fn):
         pinject_decorated_fn = _get_pinject_decorated_fn(fn)
-        orig_arg_names, unused_varargs, unused_keywords, unused_defaults = (
+        orig_arg_names, unused_varargs, unused_keywords, defaults = (
             support.get_method_args(getattr(pinject_decorated_fn, _ORIG_FN_ATTR)))
         if arg_binding_key is not None:
             if not arg_binding_key.can_apply_to_one_of_arg_names(orig_arg_names):
                 raise errors.NoSuchArgToInjectError(decorator_loc, arg_binding_key, fn)
+            if arg_binding_key.is_optional:
+                num_args_with_defaults = len(defaults) if defaults else 0
+                if not arg_binding_key.can_apply_to_one_of_arg_names(
+                        orig_arg_names[len(orig_arg_names) -
+                                       num_args_with_defaults:]):
+                    raise errors.OptionalArgWithoutDefaultError(
+                        decorator_loc, arg_binding_key)
             if arg_binding_key.conflicts_with_any_arg_binding_key(
                 getattr(pinject_decorated_fn, _ARG_BINDING_KEYS_ATTR)):
                 raise errors.MultipleAnnotationsForSameArgError(
@@ -263,11 +302,19 @@ def _get_pinject_wrapper(
     return get_pinject_decorated_fn_with_additions
 
 
-def is_explicitly_injectable(cls):
+def _is_explicitly_injectable(cls):
     return (hasattr(cls, '__init__') and
             hasattr(cls.__init__, _IS_WRAPPER_ATTR))
 
 
+_explicitly_injectable_cache = support.IntrospectionCache(
+    'is_explicitly_injectable', _is_explicitly_injectable)
+
+
+def is_explicitly_injectable(cls):
+    return _explicitly_injectable_cache.get(cls)
+
+
 def get_injectable_arg_binding_keys(fn, direct_pargs, direct_kwargs):
     non_injectable_arg_names = []
     if hasattr(fn, _IS_WRAPPER_ATTR):
@@ -295,6 +342,48 @@ def get_injectable_arg_binding_keys(fn, direct_pargs, direct_kwargs):
     return all_arg_binding_keys
 
 
+def get_required_direct_arg_names(fn):
+    """Returns the names of the args that must be passed directly to fn.
+
+    Args:
+      fn: a (possibly decorated) initializer or provider function
+    Returns:
+      the (possibly empty) sequence of the names of fn's args without
+          defaults that are not injected
+    """
+    if hasattr(fn, _IS_WRAPPER_ATTR):
+        orig_fn = getattr(fn, _ORIG_FN_ATTR)
+        non_injectable_arg_names = getattr(
+            fn, _NON_INJECTABLE_ARG_NAMES_ATTR, [])
+    else:
+        orig_fn = fn
+        non_injectable_arg_names = []
+    arg_names, unused_varargs, unused_keywords, defaults = (
+        support.get_method_args(orig_fn))
+    num_args_with_defaults = len(defaults) if defaults is not None else 0
+    if num_args_with_defaults:
+        arg_names = arg_names[:-num_args_with_defaults]
+    return [arg_name for arg_name in _remove_self_if_exists(arg_names)
+            if arg_name in non_injectable_arg_names]
+
+
+def get_arg_names(fn):
+    """Returns the names of fn's args, in order.
+
+    Args:
+      fn: a (possibly decorated) function
+    Returns:
+      the (possibly empty) sequence of the names of fn's args, other than self
+    """
+    if hasattr(fn, _IS_WRAPPER_ATTR):
+        orig_fn = getattr(fn, _ORIG_FN_ATTR)
+    else:
+        orig_fn = fn
+    arg_names, unused_varargs, unused_keywords, unused_defaults = (
+        support.get_method_args(orig_fn))
+    return _remove_self_if_exists(arg_names)
+
+
 # TODO(kurts): this feels icky.  Is there no way around this, because
 # cls.__init__() takes self but instance.__init__() doesn't, and python is
 # awkward here?
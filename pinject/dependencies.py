@@ -0,0 +1,115 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import threading
+
+
+class DependencyIndex(object):
+    """A record of which binding keys were used to provide which others.
+
+    The index is filled in at provision time, so it only knows about the
+    dependencies of things that have actually been provided.
+    """
+
+    def __init__(self, parent=None):
+        """Initializer.
+
+        Args:
+          parent: a DependencyIndex whose dependencies are also known to
+              this index (e.g., an overlay object graph's original graph's),
+              but which isn't recorded into, or None
+        """
+        self._binding_key_to_dependents = {}
+        self._parent = parent
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def record(self, binding_key, dependent_binding_key):
+        """Records that binding_key was provided for dependent_binding_key.
+
+        Args:
+          binding_key: the BindingKey of the provided dependency
+          dependent_binding_key: the BindingKey of whatever the dependency
+              was injected into
+        """
+        dependents = self._binding_key_to_dependents.get(binding_key)
+        if dependents is not None and dependent_binding_key in dependents:
+            return
+        with self._lock:
+            self._binding_key_to_dependents.setdefault(
+                binding_key, set()).add(dependent_binding_key)
+            self._version += 1
+
+    def get_version(self):
+        """Returns a number that changes whenever the dependencies change.
+
+        This includes dependencies recorded in the parent index.
+        """
+        if self._parent is not None:
+            # Both only ever increase, so their sum changes with either.
+            return self._version + self._parent.get_version()
+        return self._version
+
+    def get_direct_dependents(self, binding_key):
+        """Returns what binding_key was provided for.
+
+        Args:
+          binding_key: a BindingKey
+        Returns:
+          a set of the BindingKeys that depend directly on binding_key
+        """
+        with self._lock:
+            return self._get_direct_dependents(binding_key)
+
+    def get_transitive_dependents(self, binding_keys):
+        """Returns everything that (indirectly) depends on the binding keys.
+
+        Args:
+          binding_keys: a sequence of BindingKey
+        Returns:
+          a set of the BindingKeys that depend, directly or transitively, on
+              any of binding_keys, not including binding_keys themselves
+              (unless they depend on each other)
+        """
+        with self._lock:
+            dependents = set()
+            to_visit = list(binding_keys)
+            while to_visit:
+                binding_key = to_visit.pop()
+                for dependent in self._get_direct_dependents(binding_key):
+                    if dependent not in dependents:
+                        dependents.add(dependent)
+                        to_visit.append(dependent)
+            return dependents
+
+    def _get_direct_dependents(self, binding_key):
+        # This must be called with self._lock held.
+        dependents = set(self._binding_key_to_dependents.get(binding_key, ()))
+        if self._parent is not None:
+            with self._parent._lock:
+                dependents |= self._parent._get_direct_dependents(binding_key)
+        return dependents
+
+    def clear(self):
+        """Forgets all dependencies recorded in this index (not its parent)."""
+        with self._lock:
+            self._binding_key_to_dependents = {}
+            self._version += 1
+
+    def reset_after_fork(self):
+        # The lock may have been held by another thread at fork time, and
+        # that thread doesn't exist in the child.
+        self._lock = threading.Lock()
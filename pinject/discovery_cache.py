@@ -0,0 +1,337 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import six
+
+_CACHE_FORMAT_VERSION = 2
+
+
+class DiscoveryCache(object):
+    """An on-disk cache of what finding classes and bindings discovered.
+
+    Everything cached is keyed by the signatures (path, modification time,
+    size) of the source files it came from, so that changing a source file
+    invalidates what was discovered in it.  The classes in a module are also
+    keyed by the names of all of its members, since those can change without
+    its own source file changing, e.g., via "from other_module import *".
+    Arg names are additionally keyed by the naming function that produced
+    them.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._is_dirty = False
+        self._contents = self._load()
+
+    def _load(self):
+        empty_contents = {'version': _CACHE_FORMAT_VERSION,
+                          'python_version': sys.version,
+                          'modules': {},
+                          'class_arg_names': {},
+                          'provider_fn_names': {}}
+        try:
+            with open(self._path) as cache_file:
+                contents = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return empty_contents
+        if (not isinstance(contents, dict) or
+                contents.get('version') != _CACHE_FORMAT_VERSION or
+                contents.get('python_version') != sys.version):
+            return empty_contents
+        return contents
+
+    def save(self):
+        """Writes the cache to its file, if anything changed.
+
+        Failing to write the cache file is not an error, since the cache is
+        only an optimization.
+        """
+        with self._lock:
+            if not self._is_dirty:
+                return
+            cache_dir = os.path.dirname(os.path.abspath(self._path))
+            try:
+                fd, temp_path = tempfile.mkstemp(dir=cache_dir)
+            except (IOError, OSError):
+                return
+            try:
+                with os.fdopen(fd, 'w') as temp_file:
+                    json.dump(self._contents, temp_file, sort_keys=True)
+                # Replacing the file atomically means that concurrently
+                # starting processes never read a partially written cache.
+                getattr(os, 'replace', os.rename)(temp_path, self._path)
+            except (IOError, OSError):
+                os.remove(temp_path)
+                return
+            self._is_dirty = False
+
+    def get_classes_in_module(self, module):
+        """Returns the cached classes found in a module.
+
+        Args:
+          module: a module
+        Returns:
+          a set of classes, or None if nothing valid is cached for module
+        """
+        entry = self._contents['modules'].get(_get_module_key(module))
+        if (entry is None or
+                entry['signature'] != _get_module_signature(module)):
+            return None
+        # Comparing names is much cheaper than finding the classes anew.
+        module_dict = vars(module)
+        if six.viewkeys(module_dict) != set(entry['member_names']):
+            return None
+        classes = [module_dict[member_name]
+                   for member_name in entry['class_member_names']]
+        if not all(map(inspect.isclass, classes)):
+            return None
+        return set(classes)
+
+    def set_class_member_names_in_module(self, module, member_names):
+        """Caches the names of the module members that are classes.
+
+        Args:
+          module: a module
+          member_names: a sequence of the names of module's members that are
+              classes
+        """
+        with self._lock:
+            self._contents['modules'][_get_module_key(module)] = {
+                'signature': _get_module_signature(module),
+                'member_names': sorted(vars(module)),
+                'class_member_names': sorted(member_names)}
+            self._is_dirty = True
+
+    def get_memoized_arg_names_fn(self, get_arg_names_from_class_name):
+        """Wraps a class naming function so that its results are cached.
+
+        Args:
+          get_arg_names_from_class_name: a function mapping a class name to a
+              sequence of the arg names to which those classes should be
+              implicitly bound
+        Returns:
+          a function equivalent to get_arg_names_from_class_name, or
+              get_arg_names_from_class_name itself if it is not a function
+              whose identity can be recorded
+        """
+        fn_key = _get_fn_key(get_arg_names_from_class_name)
+        if fn_key is None:
+            return get_arg_names_from_class_name
+        class_name_to_arg_names = self._contents['class_arg_names'].setdefault(
+            fn_key, {})
+        def MemoizedGetArgNamesFromClassName(class_name):
+            arg_names = class_name_to_arg_names.get(class_name)
+            if arg_names is None:
+                arg_names = list(get_arg_names_from_class_name(class_name))
+                with self._lock:
+                    class_name_to_arg_names[class_name] = arg_names
+                    self._is_dirty = True
+            return arg_names
+        return MemoizedGetArgNamesFromClassName
+
+    def get_provider_fn_names(self, binding_spec,
+                              get_arg_names_from_provider_fn_name):
+        """Returns the cached names of a binding spec's provider methods.
+
+        Args:
+          binding_spec: a BindingSpec
+          get_arg_names_from_provider_fn_name: the function used to find
+              provider methods by name
+        Returns:
+          a sequence of method names, or None if nothing valid is cached for
+              binding_spec's class
+        """
+        fn_key = _get_fn_key(get_arg_names_from_provider_fn_name)
+        if fn_key is None:
+            return None
+        entry = self._contents['provider_fn_names'].get(fn_key, {}).get(
+            _get_class_key(binding_spec.__class__))
+        signatures = _get_class_signatures(binding_spec.__class__)
+        if (entry is None or signatures is None or
+                entry['signatures'] != signatures):
+            return None
+        return entry['provider_fn_names']
+
+    def set_provider_fn_names(self, binding_spec,
+                              get_arg_names_from_provider_fn_name,
+                              provider_fn_names):
+        """Caches the names of a binding spec's provider methods.
+
+        Args:
+          binding_spec: a BindingSpec
+          get_arg_names_from_provider_fn_name: the function used to find
+              provider methods by name
+          provider_fn_names: a sequence of the names of binding_spec's
+              methods that are provider methods
+        """
+        fn_key = _get_fn_key(get_arg_names_from_provider_fn_name)
+        signatures = _get_class_signatures(binding_spec.__class__)
+        if fn_key is None or signatures is None:
+            return
+        with self._lock:
+            self._contents['provider_fn_names'].setdefault(fn_key, {})[
+                _get_class_key(binding_spec.__class__)] = {
+                    'signatures': signatures,
+                    'provider_fn_names': sorted(provider_fn_names)}
+            self._is_dirty = True
+
+
+def _get_module_key(module):
+    # Modules can share names, e.g., io and _io are both named io.
+    return '{0}:{1}'.format(module.__name__, getattr(module, '__file__', None))
+
+
+def _get_module_signature(module):
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except (IOError, OSError):
+        return None
+    return [path, stat.st_mtime, stat.st_size]
+
+
+def _get_class_key(cls):
+    return '{0}:{1}'.format(
+        cls.__module__, getattr(cls, '__qualname__', cls.__name__))
+
+
+def _get_class_signatures(cls):
+    """Returns the signatures of the source files defining a class.
+
+    Returns:
+      a list of the signatures of cls and its superclasses, or None if the
+          source file of one of them can't be found, in which case nothing
+          about cls can be cached
+    """
+    signatures = []
+    for superclass in inspect.getmro(cls):
+        if superclass.__module__ in sys.builtin_module_names:
+            # These can only change along with the python version.
+            continue
+        module = sys.modules.get(superclass.__module__)
+        if module is None:
+            continue
+        module_signature = _get_module_signature(module)
+        if module_signature is None:
+            return None
+        signatures.append([_get_class_key(superclass), module_signature])
+    return signatures
+
+
+def _get_fn_key(fn):
+    fn_hash = hashlib.sha1()
+    if not _update_fn_hash(fn_hash, fn, set()):
+        return None
+    return '{0}.{1}:{2}'.format(
+        fn.__module__, getattr(fn, '__qualname__', fn.__name__),
+        fn_hash.hexdigest())
+
+
+def _update_fn_hash(fn_hash, fn, visited_codes):
+    """Hashes what a function's results can depend on.
+
+    That's its code, and the values of its default args, its closure's
+    cells and the globals it references.  Values that can't be hashed
+    reliably from run to run (e.g., because they're mutable, or their repr
+    includes their memory address) make the function uncacheable.
+
+    Returns:
+      whether the function is cacheable
+    """
+    code = getattr(fn, '__code__', None)
+    if code is None:
+        return False
+    if code in visited_codes:
+        # The function (indirectly) references itself.
+        return True
+    visited_codes.add(code)
+    _update_code_hash(fn_hash, code)
+    values = list(fn.__defaults__ or ())
+    kwdefaults = getattr(fn, '__kwdefaults__', None) or {}
+    for name in sorted(kwdefaults):
+        values.extend([name, kwdefaults[name]])
+    for cell in fn.__closure__ or ():
+        try:
+            values.append(cell.cell_contents)
+        except ValueError:
+            # The cell is empty, e.g., its variable isn't assigned yet.
+            return False
+    fn_globals = fn.__globals__
+    for name in sorted(_get_referenced_names(code)):
+        if name in fn_globals:
+            values.extend([name, fn_globals[name]])
+    return all(_update_value_hash(fn_hash, value, visited_codes)
+               for value in values)
+
+
+def _get_referenced_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _get_referenced_names(const)
+    return names
+
+
+_PLAIN_VALUE_TYPES = (type(None), bool, float, complex, bytes) + tuple(
+    set(six.integer_types + six.string_types + (six.text_type,)))
+
+
+def _update_value_hash(value_hash, value, visited_codes):
+    if isinstance(value, _PLAIN_VALUE_TYPES):
+        # Including the type keeps, e.g., 1 and True apart.
+        value_hash.update('{0}:{1!r}\n'.format(
+            type(value).__name__, value).encode('utf-8'))
+    elif isinstance(value, tuple):
+        value_hash.update('tuple:{0}\n'.format(len(value)).encode('utf-8'))
+        return all(_update_value_hash(value_hash, element, visited_codes)
+                   for element in value)
+    elif inspect.ismodule(value):
+        value_hash.update('module:{0}\n'.format(value.__name__).encode(
+            'utf-8'))
+    elif inspect.isclass(value):
+        signatures = _get_class_signatures(value)
+        if signatures is None:
+            return False
+        value_hash.update('class:{0}\n'.format(
+            json.dumps(signatures)).encode('utf-8'))
+    elif inspect.isfunction(value):
+        return _update_fn_hash(value_hash, value, visited_codes)
+    else:
+        return False
+    return True
+
+
+def _update_code_hash(code_hash, code):
+    code_hash.update(code.co_code)
+    code_hash.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts:
+        # The repr of a nested code object includes its memory address, which
+        # changes from run to run.
+        if inspect.iscode(const):
+            _update_code_hash(code_hash, const)
+        else:
+            code_hash.update(repr(const).encode('utf-8'))
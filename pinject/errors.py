@@ -18,263 +18,543 @@ from . import locations
 
 
 class Error(Exception):
-    pass
+    """The base class of the errors that Pinject raises.
+
+    Subclasses keep what went wrong as public attributes, and describe it in
+    _get_msg(), which is only called when the error is converted to a
+    string.  Raising and catching an error is therefore cheap, even when its
+    message would need source files to be read.  Its args and repr() are
+    also built from the message, when they're first asked for.
+    """
+
+    def __init__(self, msg=None):
+        if msg is None:
+            Exception.__init__(self)
+        else:
+            Exception.__init__(self, msg)
+        self._msg = msg
+
+    def __str__(self):
+        if self._msg is None:
+            self._msg = self._get_msg()
+        return self._msg
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, str(self))
+
+    @property
+    def args(self):
+        return (str(self),)
+
+    @args.setter
+    def args(self, args):
+        args = tuple(args)
+        self._msg = str(args[0]) if len(args) == 1 else str(args)
+
+    def _get_msg(self):
+        return ''
 
 
 class AmbiguousArgNameError(Error):
 
-    def __init__(self, injection_site_desc, binding_key, bindings):
-        Error.__init__(
-            self, 'when injecting {0}, {1} ambiguously refers to any'
-            ' of:\n{2}'.format(
-                injection_site_desc, binding_key, '\n'.join(
-                    '  {0}'.format(b.get_binding_target_desc_fn())
-                    for b in bindings)))
+    def __init__(self, injection_site_fn, binding_key, bindings):
+        Error.__init__(self)
+        self.injection_site_fn = injection_site_fn
+        self.binding_key = binding_key
+        self.bindings = bindings
+
+    def _get_msg(self):
+        return ('when injecting {0}, {1} ambiguously refers to any'
+                ' of:\n{2}'.format(
+                    locations.get_name_and_loc(self.injection_site_fn),
+                    self.binding_key, '\n'.join(
+                        '  {0}'.format(b.get_binding_target_desc_fn())
+                        for b in self.bindings)))
 
 
 class BadDependencyScopeError(Error):
 
-    def __init__(self, injection_site_desc,
+    def __init__(self, injection_site_fn,
                  from_scope_id, to_scope_id, binding_key):
-        Error.__init__(
-            self, 'when injecting {0} in {1}, scope {2} is not usable from'
-            ' scope {3}'.format(
-                binding_key, injection_site_desc, to_scope_id, from_scope_id))
+        Error.__init__(self)
+        self.injection_site_fn = injection_site_fn
+        self.from_scope_id = from_scope_id
+        self.to_scope_id = to_scope_id
+        self.binding_key = binding_key
+
+    def _get_msg(self):
+        return ('when injecting {0} in {1}, scope {2} is not usable from'
+                ' scope {3}'.format(
+                    self.binding_key,
+                    locations.get_name_and_loc(self.injection_site_fn),
+                    self.to_scope_id, self.from_scope_id))
+
+
+class ClosedObjectGraphError(Error):
+
+    def __init__(self, provide_loc):
+        Error.__init__(self)
+        self.provide_loc = provide_loc
+
+    def _get_msg(self):
+        return 'cannot provide at {0}: the object graph is closed'.format(
+            self.provide_loc)
 
 
 class ConfigureMethodMissingArgsError(Error):
 
     def __init__(self, configure_fn, possible_args):
-        Error.__init__(
-            self, 'binding spec method {0} must have at least'
-            ' one of the expected args {1}'.format(
-                locations.get_name_and_loc(configure_fn), possible_args))
+        Error.__init__(self)
+        self.configure_fn = configure_fn
+        self.possible_args = possible_args
+
+    def _get_msg(self):
+        return ('binding spec method {0} must have at least one of the'
+                ' expected args {1}'.format(
+                    locations.get_name_and_loc(self.configure_fn),
+                    self.possible_args))
 
 
 class ConflictingExplicitBindingsError(Error):
 
     def __init__(self, colliding_bindings):
-        Error.__init__(
-            self, 'multiple explicit bindings for same binding name:\n'
-            '{0}'.format('\n'.join('  {0}'.format(b)
-                                   for b in colliding_bindings)))
+        Error.__init__(self)
+        self.colliding_bindings = colliding_bindings
+
+    def _get_msg(self):
+        return 'multiple explicit bindings for same binding name:\n{0}'.format(
+            '\n'.join('  {0}'.format(b) for b in self.colliding_bindings))
 
 
 class ConflictingRequiredBindingError(Error):
 
     def __init__(self, required_binding, colliding_bindings):
-        Error.__init__(
-            self, 'conflicting implicit bindings for binding required at {0}'
-            ' for {1}:\n{2}'.format(
-                required_binding.require_loc, required_binding.binding_key,
-                '\n'.join('  {0}'.format(b) for b in colliding_bindings)))
+        Error.__init__(self)
+        self.required_binding = required_binding
+        self.colliding_bindings = colliding_bindings
+
+    def _get_msg(self):
+        return ('conflicting implicit bindings for binding required at {0}'
+                ' for {1}:\n{2}'.format(
+                    self.required_binding.require_loc,
+                    self.required_binding.binding_key,
+                    '\n'.join('  {0}'.format(b)
+                              for b in self.colliding_bindings)))
 
 
 class CyclicInjectionError(Error):
 
     def __init__(self, binding_stack):
-        Error.__init__(
-            self, 'cyclic injections:\n{0}'.format(
-                '\n'.join('  {0}'.format(b) for b in binding_stack)))
+        Error.__init__(self)
+        self.binding_stack = binding_stack
+
+    def _get_msg(self):
+        return 'cyclic injections:\n{0}'.format(
+            '\n'.join('  {0}'.format(b) for b in self.binding_stack))
 
 
 class DecoratorAppliedToNonInitError(Error):
 
     def __init__(self, decorator_name, fn):
-        Error.__init__(
-            self, '@{0} cannot be applied to non-initializer {1}'.format(
-                decorator_name, locations.get_name_and_loc(fn)))
+        Error.__init__(self)
+        self.decorator_name = decorator_name
+        self.fn = fn
+
+    def _get_msg(self):
+        return '@{0} cannot be applied to non-initializer {1}'.format(
+            self.decorator_name, locations.get_name_and_loc(self.fn))
 
 
 class DirectlyPassingInjectedArgsError(Error):
 
-    def __init__(self, duplicated_args, injection_site_desc, provider_fn):
-        Error.__init__(
-            self, 'somewhere in {0}, injected args {1} passed directly when'
-            ' calling {2}'.format(
-                injection_site_desc, list(duplicated_args),
-                locations.get_name_and_loc(provider_fn)))
+    def __init__(self, duplicated_args, injection_site_fn, provider_fn):
+        Error.__init__(self)
+        self.duplicated_args = duplicated_args
+        self.injection_site_fn = injection_site_fn
+        self.provider_fn = provider_fn
+
+    def _get_msg(self):
+        return ('somewhere in {0}, injected args {1} passed directly when'
+                ' calling {2}'.format(
+                    locations.get_name_and_loc(self.injection_site_fn),
+                    list(self.duplicated_args),
+                    locations.get_name_and_loc(self.provider_fn)))
 
 
 class DuplicateDecoratorError(Error):
 
     def __init__(self, decorator_name, second_decorator_loc):
-        Error.__init__(
-            self, 'at {0}, @{1} cannot be applied twice'.format(
-                second_decorator_loc, decorator_name))
+        Error.__init__(self)
+        self.decorator_name = decorator_name
+        self.second_decorator_loc = second_decorator_loc
+
+    def _get_msg(self):
+        return 'at {0}, @{1} cannot be applied twice'.format(
+            self.second_decorator_loc, self.decorator_name)
 
 
 class EmptyBindingSpecError(Error):
 
     def __init__(self, binding_spec):
-        Error.__init__(
-            self, 'binding spec {0} at {1} must have either a configure()'
-            ' method or a provider method but has neither'.format(
-                binding_spec.__class__.__name__,
-                locations.get_loc(binding_spec.__class__)))
+        Error.__init__(self)
+        self.binding_spec = binding_spec
+
+    def _get_msg(self):
+        return ('binding spec {0} at {1} must have either a configure()'
+                ' method or a provider method but has neither'.format(
+                    self.binding_spec.__class__.__name__,
+                    locations.get_loc(self.binding_spec.__class__)))
 
 
 class EmptyProvidesDecoratorError(Error):
 
     def __init__(self, at_provides_loc):
-        Error.__init__(
-            self, '@provides() at {0} needs at least one non-default'
-            ' arg'.format(at_provides_loc))
+        Error.__init__(self)
+        self.at_provides_loc = at_provides_loc
+
+    def _get_msg(self):
+        return '@provides() at {0} needs at least one non-default arg'.format(
+            self.at_provides_loc)
 
 
 class EmptySequenceArgError(Error):
 
     def __init__(self, call_site_loc, arg_name):
-        Error.__init__(
-            self, 'expected non-empty sequence arg {0} at {1}'.format(
-                arg_name, call_site_loc))
+        Error.__init__(self)
+        self.call_site_loc = call_site_loc
+        self.arg_name = arg_name
+
+    def _get_msg(self):
+        return 'expected non-empty sequence arg {0} at {1}'.format(
+            self.arg_name, self.call_site_loc)
+
+
+class FrozenObjectGraphError(Error):
+
+    def __init__(self, binding_key):
+        Error.__init__(self)
+        self.binding_key = binding_key
+
+    def _get_msg(self):
+        return ('cannot provide {0} in singleton scope for the first time,'
+                ' since the object graph is frozen'.format(self.binding_key))
 
 
 class InjectingNoneDisallowedError(Error):
 
-    def __init__(self, proviser_desc):
-        Error.__init__(
-            self, 'cannot inject None (returned from {0}) because'
-            ' allow_injecting_none=False'.format(proviser_desc))
+    def __init__(self, binding):
+        Error.__init__(self)
+        self.binding = binding
+
+    def _get_msg(self):
+        return ('cannot inject None (returned from {0}) because'
+                ' allow_injecting_none=False'.format(
+                    self.binding.get_binding_target_desc_fn()))
 
 
 class InvalidBindingTargetError(Error):
 
     def __init__(self, binding_loc, binding_key, binding_target,
                  expected_type_str):
-        Error.__init__(
-            self, '{0} cannot be bound to {1} at {2} because the latter is of'
-            ' type {3}, not {4}'.format(
-                binding_key, binding_target, binding_loc,
-                type(binding_target).__name__, expected_type_str))
+        Error.__init__(self)
+        self.binding_loc = binding_loc
+        self.binding_key = binding_key
+        self.binding_target = binding_target
+        self.expected_type_str = expected_type_str
+
+    def _get_msg(self):
+        return ('{0} cannot be bound to {1} at {2} because the latter is of'
+                ' type {3}, not {4}'.format(
+                    self.binding_key, self.binding_target, self.binding_loc,
+                    type(self.binding_target).__name__,
+                    self.expected_type_str))
 
 
 class MissingRequiredBindingError(Error):
 
     def __init__(self, required_binding):
-        Error.__init__(
-            self, 'at {0}, binding required for {1}, but no such binding was'
-            ' ever created'.format(required_binding.require_loc,
-                                   required_binding.binding_key))
+        Error.__init__(self)
+        self.required_binding = required_binding
+
+    def _get_msg(self):
+        return ('at {0}, binding required for {1}, but no such binding was'
+                ' ever created'.format(self.required_binding.require_loc,
+                                       self.required_binding.binding_key))
 
 
 class MultipleAnnotationsForSameArgError(Error):
 
     def __init__(self, arg_binding_key, decorator_loc):
-        Error.__init__(
-            self, 'multiple annotations for {0} at {1}'.format(
-                arg_binding_key, decorator_loc))
+        Error.__init__(self)
+        self.arg_binding_key = arg_binding_key
+        self.decorator_loc = decorator_loc
+
+    def _get_msg(self):
+        return 'multiple annotations for {0} at {1}'.format(
+            self.arg_binding_key, self.decorator_loc)
 
 
 class MultipleBindingTargetArgsError(Error):
 
     def __init__(self, binding_loc, binding_key, arg_names):
-        Error.__init__(
-            self, 'multiple binding target args {0} given for {1} at'
-            ' {2}'.format(arg_names, binding_key, binding_loc))
+        Error.__init__(self)
+        self.binding_loc = binding_loc
+        self.binding_key = binding_key
+        self.arg_names = arg_names
+
+    def _get_msg(self):
+        return 'multiple binding target args {0} given for {1} at {2}'.format(
+            self.arg_names, self.binding_key, self.binding_loc)
+
+
+class NoActiveRequestError(Error):
+
+    def __init__(self, binding_key):
+        Error.__init__(self)
+        self.binding_key = binding_key
+
+    def _get_msg(self):
+        return ('cannot provide {0} in request scope outside of a'
+                ' request'.format(self.binding_key))
+
+
+class NoActivePoolLeaseError(Error):
+
+    def __init__(self, binding_key):
+        Error.__init__(self)
+        self.binding_key = binding_key
+
+    def _get_msg(self):
+        return ('cannot provide {0} in a pool scope outside of a'
+                ' lease'.format(self.binding_key))
+
+
+class NoActiveTenantError(Error):
+
+    def __init__(self, binding_key):
+        Error.__init__(self)
+        self.binding_key = binding_key
+
+    def _get_msg(self):
+        return ('cannot provide {0} in a tenant scope outside of a'
+                ' tenant() block'.format(self.binding_key))
 
 
 class NoBindingTargetArgsError(Error):
 
     def __init__(self, binding_loc, binding_key):
-        Error.__init__(
-            self, 'no binding target arg given for {0} at {1}'.format(
-                binding_key, binding_loc))
+        Error.__init__(self)
+        self.binding_loc = binding_loc
+        self.binding_key = binding_key
+
+    def _get_msg(self):
+        return 'no binding target arg given for {0} at {1}'.format(
+            self.binding_key, self.binding_loc)
 
 
 class NoRemainingArgsToInjectError(Error):
 
     def __init__(self, decorator_loc):
-        Error.__init__(
-            self, 'at {0}, all args are declared passed directly and therefore'
-            ' no args will be injected; call the method directly'
-            ' instead?'.format(decorator_loc))
+        Error.__init__(self)
+        self.decorator_loc = decorator_loc
+
+    def _get_msg(self):
+        return ('at {0}, all args are declared passed directly and therefore'
+                ' no args will be injected; call the method directly'
+                ' instead?'.format(self.decorator_loc))
 
 
 class NoSuchArgError(Error):
 
     def __init__(self, call_site_loc, arg_name):
-        Error.__init__(self, 'at {0}, no such arg named {1}'.format(
-            call_site_loc, arg_name))
+        Error.__init__(self)
+        self.call_site_loc = call_site_loc
+        self.arg_name = arg_name
+
+    def _get_msg(self):
+        return 'at {0}, no such arg named {1}'.format(
+            self.call_site_loc, self.arg_name)
 
 
 # TODO(kurts): replace NoSuchArgToInjectError with NoSuchArgError.
 class NoSuchArgToInjectError(Error):
 
     def __init__(self, decorator_loc, arg_binding_key, fn):
-        Error.__init__(
-            self, 'cannot inject {0} into {1} at {2}: no such arg name'.format(
-                arg_binding_key, fn.__name__, decorator_loc))
+        Error.__init__(self)
+        self.decorator_loc = decorator_loc
+        self.arg_binding_key = arg_binding_key
+        self.fn = fn
+
+    def _get_msg(self):
+        return 'cannot inject {0} into {1} at {2}: no such arg name'.format(
+            self.arg_binding_key, self.fn.__name__, self.decorator_loc)
 
 
 class NonExplicitlyBoundClassError(Error):
 
     def __init__(self, provide_loc, cls):
-        Error.__init__(
-            self, 'at {0}, cannot instantiate class {1}, since it is not'
-            ' explicitly marked as injectable and only_use_explicit_bindings'
-            ' is set to True'.format(provide_loc, cls.__name__))
+        Error.__init__(self)
+        self.provide_loc = provide_loc
+        self.cls = cls
+
+    def _get_msg(self):
+        return ('at {0}, cannot instantiate class {1}, since it is not'
+                ' explicitly marked as injectable and'
+                ' only_use_explicit_bindings is set to True'.format(
+                    self.provide_loc, self.cls.__name__))
 
 
 class NothingInjectableForArgError(Error):
 
-    def __init__(self, binding_key, injection_site_desc):
-        Error.__init__(
-            self, 'when injecting {0}, nothing injectable for {1}'.format(
-                injection_site_desc, binding_key))
+    def __init__(self, binding_key, injection_site_fn):
+        Error.__init__(self)
+        self.binding_key = binding_key
+        self.injection_site_fn = injection_site_fn
+
+    def _get_msg(self):
+        return 'when injecting {0}, nothing injectable for {1}'.format(
+            locations.get_name_and_loc(self.injection_site_fn),
+            self.binding_key)
 
 
 class OnlyInstantiableViaProviderFunctionError(Error):
 
-    def __init__(self, injection_site_fn, arg_binding_key, binding_target_desc):
-        Error.__init__(
-            self, 'when injecting {0}, {1} cannot be injected, because its'
-            ' provider, {2}, needs at least one directly passed arg'.format(
-                locations.get_name_and_loc(injection_site_fn),
-                arg_binding_key, binding_target_desc))
+    def __init__(self, injection_site_fn, arg_binding_key, binding):
+        Error.__init__(self)
+        self.injection_site_fn = injection_site_fn
+        self.arg_binding_key = arg_binding_key
+        self.binding = binding
+
+    def _get_msg(self):
+        return ('when injecting {0}, {1} cannot be injected, because its'
+                ' provider, {2}, needs at least one directly passed'
+                ' arg'.format(
+                    locations.get_name_and_loc(self.injection_site_fn),
+                    self.arg_binding_key,
+                    self.binding.get_binding_target_desc_fn()))
+
+
+class OptionalArgWithoutDefaultError(Error):
+
+    def __init__(self, decorator_loc, arg_binding_key):
+        Error.__init__(self)
+        self.decorator_loc = decorator_loc
+        self.arg_binding_key = arg_binding_key
+
+    def _get_msg(self):
+        return ('at {0}, {1} cannot be optional, since it has no default'
+                ' value'.format(self.decorator_loc, self.arg_binding_key))
 
 
 class OverridingDefaultScopeError(Error):
 
     def __init__(self, scope_id):
-        Error.__init__(
-            self, 'cannot override default scope {0}'.format(scope_id))
+        Error.__init__(self)
+        self.scope_id = scope_id
+
+    def _get_msg(self):
+        return 'cannot override default scope {0}'.format(self.scope_id)
 
 
 class PargsDisallowedWhenCopyingArgsError(Error):
 
     def __init__(self, decorator_name, fn, pargs_arg_name):
-        Error.__init__(
-            self, 'decorator @{0} cannot be applied to {1} with *{2}'.format(
-                decorator_name, locations.get_name_and_loc(fn), pargs_arg_name))
+        Error.__init__(self)
+        self.decorator_name = decorator_name
+        self.fn = fn
+        self.pargs_arg_name = pargs_arg_name
+
+    def _get_msg(self):
+        return 'decorator @{0} cannot be applied to {1} with *{2}'.format(
+            self.decorator_name, locations.get_name_and_loc(self.fn),
+            self.pargs_arg_name)
+
+
+class PoolTimeoutError(Error):
+
+    def __init__(self, binding_key, max_size, timeout_secs):
+        Error.__init__(self)
+        self.binding_key = binding_key
+        self.max_size = max_size
+        self.timeout_secs = timeout_secs
+
+    def _get_msg(self):
+        return ('timed out after {0} seconds waiting for one of the {1}'
+                ' pooled instances for {2}'.format(
+                    self.timeout_secs, self.max_size, self.binding_key))
 
 
 class TooManyArgsToInjectDecoratorError(Error):
 
     def __init__(self, decorator_loc):
-        Error.__init__(
-            self, 'at {0}, cannot specify both arg_names and'
-            ' all_except'.format(decorator_loc))
+        Error.__init__(self)
+        self.decorator_loc = decorator_loc
+
+    def _get_msg(self):
+        return ('at {0}, cannot specify both arg_names and'
+                ' all_except'.format(self.decorator_loc))
+
+
+class UncompilableError(Error):
+
+    def __init__(self, thing_desc, reason):
+        Error.__init__(self)
+        self.thing_desc = thing_desc
+        self.reason = reason
+
+    def _get_msg(self):
+        return 'cannot compile {0}: {1}'.format(self.thing_desc, self.reason)
 
 
 class UnknownScopeError(Error):
 
     def __init__(self, scope_id, binding_loc):
-        Error.__init__(self, 'unknown scope ID {0} in binding created at'
-                       ' {1}'.format(scope_id, binding_loc))
+        Error.__init__(self)
+        self.scope_id = scope_id
+        self.binding_loc = binding_loc
+
+    def _get_msg(self):
+        return 'unknown scope ID {0} in binding created at {1}'.format(
+            self.scope_id, self.binding_loc)
+
+
+class UnweakrefableInstanceError(Error):
+
+    def __init__(self, binding_key, instance_type):
+        Error.__init__(self)
+        self.binding_key = binding_key
+        self.instance_type = instance_type
+
+    def _get_msg(self):
+        return ('cannot provide {0} in weak singleton scope, since'
+                ' instances of {1} cannot be weakly referenced'.format(
+                    self.binding_key, self.instance_type))
 
 
 class WrongArgElementTypeError(Error):
 
     def __init__(self, arg_name, idx, expected_type_desc, actual_type_desc):
-        Error.__init__(
-            self, 'wrong type for element {0} of arg {1}: expected {2} but got'
-            ' {3}'.format(idx, arg_name, expected_type_desc, actual_type_desc))
+        Error.__init__(self)
+        self.arg_name = arg_name
+        self.idx = idx
+        self.expected_type_desc = expected_type_desc
+        self.actual_type_desc = actual_type_desc
+
+    def _get_msg(self):
+        return ('wrong type for element {0} of arg {1}: expected {2} but got'
+                ' {3}'.format(self.idx, self.arg_name,
+                              self.expected_type_desc,
+                              self.actual_type_desc))
 
 
 class WrongArgTypeError(Error):
 
     def __init__(self, arg_name, expected_type_desc, actual_type_desc):
-        Error.__init__(
-            self, 'wrong type for arg {0}: expected {1} but got {2}'.format(
-                arg_name, expected_type_desc, actual_type_desc))
+        Error.__init__(self)
+        self.arg_name = arg_name
+        self.expected_type_desc = expected_type_desc
+        self.actual_type_desc = actual_type_desc
+
+    def _get_msg(self):
+        return 'wrong type for arg {0}: expected {1} but got {2}'.format(
+            self.arg_name, self.expected_type_desc, self.actual_type_desc)
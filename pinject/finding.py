@@ -14,14 +14,20 @@ limitations under the License.
 """
 
 
+import ast
+import importlib
 import inspect
+import multiprocessing
+import os
+import re
 import sys
+import threading
 
 
 ALL_IMPORTED_MODULES = object()
 
 
-def find_classes(modules, classes):
+def find_classes(modules, classes, discovery_cache=None):
     if classes is not None:
         all_classes = set(classes)
     else:
@@ -29,7 +35,7 @@ def find_classes(modules, classes):
     for module in _get_explicit_or_default_modules(modules):
         # TODO(kurts): how is a module getting to be None??
         if module is not None:
-            all_classes |= _find_classes_in_module(module)
+            all_classes |= _find_classes_in_module(module, discovery_cache)
     return all_classes
 
 
@@ -41,12 +47,18 @@ def _get_explicit_or_default_modules(modules):
     return modules
 
 
-def _find_classes_in_module(module):
+def _find_classes_in_module(module, discovery_cache=None):
+    if discovery_cache is not None:
+        classes = discovery_cache.get_classes_in_module(module)
+        if classes is not None:
+            return classes
     classes = set()
+    class_member_names = []
     for member_name, member in inspect.getmembers(module):
         try:
             if inspect.isclass(member) and not member_name == '__class__':
                 classes.add(member)
+                class_member_names.append(member_name)
         except NameError:
             # In Python 3 calling isinstance() on SWIG's global cvar property
             # raises:
@@ -54,4 +66,166 @@ def _find_classes_in_module(module):
             # In that case just continue, otherwise let the Error through.
             if not member_name == 'cvar':
                 raise
+    if discovery_cache is not None:
+        discovery_cache.set_class_member_names_in_module(
+            module, class_member_names)
     return classes
+
+
+_MODULE_NAME_PART_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_INJECT_DECORATOR_NAMES = ['inject', 'injectable']
+_BINDING_SPEC_CLASS_NAME = 'BindingSpec'
+
+
+class SourceClass(object):
+    """A class found by parsing source code, whose module isn't imported yet.
+
+    The module is imported the first time get_class() is called.
+    """
+
+    def __init__(self, module_name, name, path, line,
+                 is_explicitly_injectable, is_binding_spec):
+        self.module_name = module_name
+        self.name = name
+        self.path = path
+        self.line = line
+        self.is_explicitly_injectable = is_explicitly_injectable
+        self.is_binding_spec = is_binding_spec
+        self._cls = None
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return '{0}.{1} at {2}:{3}'.format(
+            self.module_name, self.name, self.path, self.line)
+
+    def get_loc(self):
+        return '{0}:{1}'.format(self.path, self.line)
+
+    def get_class(self):
+        """Imports the class's module, if needed, and returns the class."""
+        if self._cls is None:
+            with self._lock:
+                if self._cls is None:
+                    module = importlib.import_module(self.module_name)
+                    self._cls = getattr(module, self.name)
+        return self._cls
+
+
+def find_source_classes(package_roots, num_processes=1):
+    """Finds the classes defined in python source files, without importing.
+
+    Source files are parsed in this process, or optionally in a pool of
+    worker processes.  Only classes
+    defined at the top level of a module are found, just like for imported
+    modules.  An initializer counts as explicitly injectable if it is
+    decorated with something named inject or injectable, and a class counts
+    as a binding spec if one of its bases is named BindingSpec.
+
+    Args:
+      package_roots: directories, like the entries of sys.path, under which
+          to look for python source files; the module names of the files are
+          relative to these directories
+      num_processes: the number of worker processes with which to parse the
+          source files; if None, then the number of CPUs; if 1 (the default),
+          then files are parsed in this process, which is the only safe
+          choice when, e.g., this may run while a module is being imported,
+          since worker processes started by spawning re-import __main__
+    Returns:
+      a list of SourceClass
+    """
+    path_and_module_names = []
+    for package_root in package_roots:
+        path_and_module_names.extend(_get_source_files(package_root))
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    num_processes = min(num_processes, len(path_and_module_names))
+    if num_processes <= 1:
+        all_class_infos = [_parse_source_file(path_and_module_name)
+                           for path_and_module_name in path_and_module_names]
+    else:
+        pool = multiprocessing.Pool(num_processes)
+        try:
+            all_class_infos = pool.map(
+                _parse_source_file, path_and_module_names,
+                chunksize=max(1, len(path_and_module_names) //
+                              (num_processes * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    source_classes = []
+    for (path, module_name), class_infos in zip(path_and_module_names,
+                                                all_class_infos):
+        for (name, line, is_explicitly_injectable,
+             is_binding_spec) in class_infos:
+            source_classes.append(SourceClass(
+                module_name, name, path, line, is_explicitly_injectable,
+                is_binding_spec))
+    return source_classes
+
+
+def _get_source_files(package_root):
+    path_and_module_names = []
+    for dir_path, dir_names, file_names in os.walk(package_root):
+        dir_names[:] = sorted(dir_name for dir_name in dir_names
+                              if _MODULE_NAME_PART_RE.match(dir_name))
+        rel_dir_path = os.path.relpath(dir_path, package_root)
+        if rel_dir_path == os.curdir:
+            package_parts = []
+        else:
+            package_parts = rel_dir_path.split(os.sep)
+        for file_name in sorted(file_names):
+            module_part, ext = os.path.splitext(file_name)
+            if ext != '.py' or not _MODULE_NAME_PART_RE.match(module_part):
+                continue
+            if module_part == '__init__':
+                if not package_parts:
+                    continue
+                module_parts = package_parts
+            else:
+                module_parts = package_parts + [module_part]
+            path_and_module_names.append(
+                (os.path.join(dir_path, file_name), '.'.join(module_parts)))
+    return path_and_module_names
+
+
+def _parse_source_file(path_and_module_name):
+    # This runs in worker processes, so it takes and returns only picklable
+    # things.
+    path, unused_module_name = path_and_module_name
+    try:
+        with open(path, 'rb') as source_file:
+            tree = ast.parse(source_file.read(), path)
+    except (IOError, OSError, SyntaxError, ValueError):
+        # A file that can't be parsed can't be imported either, so it can't
+        # provide anything.
+        return []
+    class_infos = []
+    class_names = set()
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name not in class_names:
+            class_names.add(node.name)
+            class_infos.append(
+                (node.name, node.lineno, _has_inject_decorated_init(node),
+                 any(_get_expr_name(base) == _BINDING_SPEC_CLASS_NAME
+                     for base in node.bases)))
+    return class_infos
+
+
+def _has_inject_decorated_init(class_node):
+    for node in class_node.body:
+        if isinstance(node, ast.FunctionDef) and node.name == '__init__':
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call):
+                    decorator = decorator.func
+                if _get_expr_name(decorator) in _INJECT_DECORATOR_NAMES:
+                    return True
+    return False
+
+
+def _get_expr_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
@@ -49,7 +49,7 @@ class _InjectionContext(object):
     """The context of dependency-injecting some bound value."""
 
     def __init__(self, injection_site_fn, binding_stack, scope_id,
-                 is_scope_usable_from_scope_fn):
+                 is_scope_usable_from_scope_fn, batch_cache=None):
         """Initializer.
 
         Args:
@@ -61,11 +61,14 @@ class _InjectionContext(object):
           is_scope_usable_from_scope_fn: a function taking two scope IDs and
               returning whether an object in the first scope can be injected
               into an object from the second scope
+          batch_cache: a BatchCache for the batch of instances being
+              provided, or None if not providing a batch
         """
         self._injection_site_fn = injection_site_fn
         self._binding_stack = binding_stack
         self._scope_id = scope_id
         self._is_scope_usable_from_scope_fn = is_scope_usable_from_scope_fn
+        self._batch_cache = batch_cache
 
     def get_child(self, injection_site_fn, binding):
         """Creates a child injection context.
@@ -86,12 +89,74 @@ class _InjectionContext(object):
         if not self._is_scope_usable_from_scope_fn(
                 child_scope_id, self._scope_id):
             raise errors.BadDependencyScopeError(
-                self.get_injection_site_desc(),
+                self._injection_site_fn,
                 self._scope_id, child_scope_id, binding.binding_key)
         return _InjectionContext(
             injection_site_fn, new_binding_stack, child_scope_id,
-            self._is_scope_usable_from_scope_fn)
+            self._is_scope_usable_from_scope_fn, self._batch_cache)
+
+    def with_batch_cache(self, batch_cache):
+        """Creates a copy of this context, for providing a batch.
+
+        Args:
+          batch_cache: a BatchCache
+        Returns:
+          a new _InjectionContext, whose descendants share batch_cache
+        """
+        return _InjectionContext(
+            self._injection_site_fn, self._binding_stack, self._scope_id,
+            self._is_scope_usable_from_scope_fn, batch_cache)
+
+    def get_batch_cache(self):
+        """Returns the BatchCache if providing a batch, else None."""
+        if self._batch_cache is None or self._batch_cache.is_closed():
+            return None
+        return self._batch_cache
+
+    def get_binding_key(self):
+        """Returns the binding key of the current binding, if any.
+
+        Returns:
+          the BindingKey of the current (last) binding, or None if nothing is
+              being provided yet (i.e., at the top level)
+        """
+        if not self._binding_stack:
+            return None
+        return self._binding_stack[-1].binding_key
+
+    def get_injection_site_fn(self):
+        """Returns the function currently being injected into."""
+        return self._injection_site_fn
 
     def get_injection_site_desc(self):
         """Returns a description of the current injection site."""
         return locations.get_name_and_loc(self._injection_site_fn)
+
+
+class BatchCache(object):
+    """Remembers instances provided while providing a batch of instances.
+
+    Only instances from built-in memoizing scopes should be remembered,
+    since they'd be provided again anyway.  Each is remembered with its
+    binding, so that reusing it checks scopes like providing it would.
+    """
+
+    def __init__(self):
+        self._binding_key_to_binding_and_instance = {}
+        self._is_closed = False
+
+    def get(self, binding_key, default=None):
+        """Returns the (Binding, instance) pair remembered, or default."""
+        return self._binding_key_to_binding_and_instance.get(
+            binding_key, default)
+
+    def set(self, binding_key, binding, instance):
+        self._binding_key_to_binding_and_instance[binding_key] = (
+            binding, instance)
+
+    def close(self):
+        self._is_closed = True
+        self._binding_key_to_binding_and_instance = {}
+
+    def is_closed(self):
+        return self._is_closed
@@ -15,16 +15,20 @@ limitations under the License.
 
 
 import inspect
+import sys
 
 LOCALS_TOKEN = '<locals>'
 
+_UNKNOWN_LOC = 'unknown location'
+_is_capturing_call_sites = True
+
 
 def get_loc(thing):
     try:
         return '{0}:{1}'.format(
             inspect.getfile(thing), inspect.getsourcelines(thing)[1])
     except (TypeError, IOError):
-        return 'unknown location'
+        return _UNKNOWN_LOC
 
 
 def get_name_and_loc(thing):
@@ -41,10 +45,62 @@ def get_name_and_loc(thing):
         return class_name
 
 
+class CallSite(object):
+    """Where a function was called from.
+
+    This is cheap to create, since the file:line string for it is only
+    formatted when it's converted to a string (e.g., in an error message).
+    """
+
+    __slots__ = ('_code', '_lineno')
+
+    def __init__(self, code, lineno):
+        self._code = code
+        self._lineno = lineno
+
+    def __str__(self):
+        if self._code is None:
+            return _UNKNOWN_LOC
+        return '{0}:{1}'.format(self._code.co_filename, self._lineno)
+
+    def __repr__(self):
+        return '<{0}>'.format(self)
+
+    def __eq__(self, other):
+        return (isinstance(other, CallSite) and
+                self._code is other._code and self._lineno == other._lineno)
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return hash(self._code) ^ hash(self._lineno)
+
+
+_UNKNOWN_CALL_SITE = CallSite(None, None)
+
+
+def set_capturing_call_sites(is_capturing):
+    """Sets whether to capture where decorators, bind(), etc. are called.
+
+    Call sites are captured by default, so that error messages can say
+    where the error was made.  Not capturing them makes decorating and
+    binding slightly cheaper, but then error messages say "unknown
+    location" instead.
+
+    Args:
+      is_capturing: whether to capture call sites from now on
+    """
+    global _is_capturing_call_sites
+    _is_capturing_call_sites = is_capturing
+
+
 def get_back_frame_loc():
-    back_frame = inspect.currentframe().f_back.f_back
-    return '{0}:{1}'.format(back_frame.f_code.co_filename,
-                            back_frame.f_lineno)
+    """Returns the CallSite of the caller of this function's caller."""
+    if not _is_capturing_call_sites:
+        return _UNKNOWN_CALL_SITE
+    back_frame = sys._getframe(2)
+    return CallSite(back_frame.f_code, back_frame.f_lineno)
 
 
 def _get_type_name(target_thing):
@@ -14,8 +14,16 @@ limitations under the License.
 """
 
 
+import gc
+import os
+import weakref
+
+from . import binding_keys
 from . import bindings
+from . import closing
 from . import decorators
+from . import dependencies as dependencies_lib
+from . import discovery_cache as discovery_cache_lib
 from . import errors
 from . import finding
 from . import injection_contexts
@@ -37,7 +45,9 @@ def new_object_graph(
         get_arg_names_from_provider_fn_name=(
             providing.default_get_arg_names_from_provider_fn_name),
         id_to_scope=None, is_scope_usable_from_scope=lambda _1, _2: True,
-        use_short_stack_traces=True):
+        use_short_stack_traces=True, discovery_cache_path=None,
+        package_roots=None, num_parsing_processes=1,
+        record_lock_metrics=False):
     """Creates a new object graph.
 
     Args:
@@ -68,6 +78,26 @@ def new_object_graph(
       use_short_stack_traces: whether to shorten the stack traces for
           exceptions that Pinject raises, so that they don't contain the
           innards of Pinject
+      discovery_cache_path: the path of a file in which to cache the classes
+          and provider methods found, and the arg names derived from them,
+          so that later object graph creation can skip that work for source
+          files that haven't changed; if None (the default), then nothing is
+          cached
+      package_roots: directories, like the entries of sys.path, under which
+          to find classes (other than binding specs) for which to create
+          implicit bindings by parsing source files, without importing them;
+          the module defining such a class is imported only when the class
+          is first provided; if None (the default), then no directories
+      num_parsing_processes: the number of worker processes with which to
+          parse the source files under package_roots; if None, then the
+          number of CPUs; if 1 (the default), then files are parsed in this
+          process; using worker processes requires that creating the object
+          graph is safe when __main__ is re-imported, i.e., that it happens
+          under an "if __name__ == '__main__':" guard
+      record_lock_metrics: whether the built-in singleton scopes (SINGLETON
+          and WEAK_SINGLETON) record how long providing each binding key
+          waits for, and holds, their locks; see
+          ObjectGraph.get_lock_metrics()
     Returns:
       an ObjectGraph
     Raises:
@@ -82,6 +112,8 @@ def new_object_graph(
         if binding_specs is not None:
             support.verify_subclasses(
                 binding_specs, bindings.BindingSpec, 'binding_specs')
+        if package_roots is not None:
+            support.verify_string_types(package_roots, 'package_roots')
         if get_arg_names_from_class_name is not None:
             support.verify_callable(get_arg_names_from_class_name,
                                     'get_arg_names_from_class_name')
@@ -93,11 +125,20 @@ def new_object_graph(
                                     'is_scope_usable_from_scope')
         injection_context_factory = injection_contexts.InjectionContextFactory(
             is_scope_usable_from_scope)
-        id_to_scope = scoping.get_id_to_scope_with_defaults(id_to_scope)
+        id_to_scope = scoping.get_id_to_scope_with_defaults(
+            id_to_scope, record_lock_metrics)
         bindable_scopes = scoping.BindableScopes(id_to_scope)
         known_scope_ids = id_to_scope.keys()
+        if discovery_cache_path is not None:
+            discovery_cache = discovery_cache_lib.DiscoveryCache(
+                discovery_cache_path)
+            get_arg_names_from_class_name = (
+                discovery_cache.get_memoized_arg_names_fn(
+                    get_arg_names_from_class_name))
+        else:
+            discovery_cache = None
 
-        found_classes = finding.find_classes(modules, classes)
+        found_classes = finding.find_classes(modules, classes, discovery_cache)
         if only_use_explicit_bindings:
             implicit_class_bindings = []
         else:
@@ -105,50 +146,33 @@ def new_object_graph(
                 found_classes, get_arg_names_from_class_name)
         explicit_bindings = bindings.get_explicit_class_bindings(
             found_classes, get_arg_names_from_class_name)
-        binder = bindings.Binder(explicit_bindings, known_scope_ids)
-        required_bindings = required_bindings_lib.RequiredBindings()
-        if binding_specs is not None:
-            binding_specs = list(binding_specs)
-            processed_binding_specs = set()
-            while binding_specs:
-                binding_spec = binding_specs.pop()
-                if binding_spec in processed_binding_specs:
-                    continue
-                processed_binding_specs.add(binding_spec)
-                all_kwargs = {'bind': binder.bind,
-                              'require': required_bindings.require}
-                has_configure = hasattr(binding_spec, configure_method_name)
-                if has_configure:
-                    configure_method = getattr(binding_spec, configure_method_name)
-                    configure_kwargs = _pare_to_present_args(
-                        all_kwargs, configure_method)
-                    if not configure_kwargs:
-                        raise errors.ConfigureMethodMissingArgsError(
-                            configure_method, all_kwargs.keys())
-                    try:
-                        configure_method(**configure_kwargs)
-                    except NotImplementedError:
-                        has_configure = False
-                dependencies = None
-                if hasattr(binding_spec, dependencies_method_name):
-                    dependencies_method = (
-                        getattr(binding_spec, dependencies_method_name))
-                    dependencies = dependencies_method()
-                    binding_specs.extend(dependencies)
-                provider_bindings = bindings.get_provider_bindings(
-                    binding_spec, known_scope_ids,
-                    get_arg_names_from_provider_fn_name)
-                explicit_bindings.extend(provider_bindings)
-                if (not has_configure and
-                    not dependencies and
-                    not provider_bindings):
-                    raise errors.EmptyBindingSpecError(binding_spec)
+        if package_roots is not None:
+            found_class_names = set(
+                (cls.__module__, cls.__name__) for cls in found_classes)
+            source_classes = [
+                source_class for source_class in
+                finding.find_source_classes(
+                    package_roots, num_parsing_processes)
+                if (source_class.module_name, source_class.name) not in
+                found_class_names]
+            implicit_source_class_bindings, explicit_source_class_bindings = (
+                bindings.get_source_class_bindings(
+                    source_classes, only_use_explicit_bindings,
+                    get_arg_names_from_class_name))
+            implicit_class_bindings.extend(implicit_source_class_bindings)
+            explicit_bindings.extend(explicit_source_class_bindings)
+        required_bindings = _collect_binding_spec_bindings(
+            binding_specs, explicit_bindings, known_scope_ids,
+            configure_method_name, dependencies_method_name,
+            get_arg_names_from_provider_fn_name, discovery_cache)
         binding_key_to_binding, collided_binding_key_to_bindings = (
             bindings.get_overall_binding_key_to_binding_maps(
                 [implicit_class_bindings, explicit_bindings]))
         binding_mapping = bindings.BindingMapping(
             binding_key_to_binding, collided_binding_key_to_bindings)
         binding_mapping.verify_requirements(required_bindings.get())
+        if discovery_cache is not None:
+            discovery_cache.save()
     except errors.Error as e:
         if use_short_stack_traces:
             raise e
@@ -157,11 +181,93 @@ def new_object_graph(
 
     is_injectable_fn = {True: decorators.is_explicitly_injectable,
                         False: (lambda cls: True)}[only_use_explicit_bindings]
+    dependency_index = dependencies_lib.DependencyIndex()
+    closer = closing.Closer(
+        externally_owned_instances=[
+            binding.target for binding in explicit_bindings
+            if binding.target_kind == bindings.TO_INSTANCE])
     obj_provider = object_providers.ObjectProvider(
-        binding_mapping, bindable_scopes, allow_injecting_none)
+        binding_mapping, bindable_scopes, allow_injecting_none,
+        dependency_index, closer=closer)
+    child_factory = _ChildObjectGraphFactory(
+        only_use_explicit_bindings, allow_injecting_none,
+        configure_method_name, dependencies_method_name,
+        get_arg_names_from_class_name, get_arg_names_from_provider_fn_name,
+        injection_context_factory, is_injectable_fn, use_short_stack_traces)
     return ObjectGraph(
         obj_provider, injection_context_factory, is_injectable_fn,
-        use_short_stack_traces)
+        use_short_stack_traces, bindable_scopes, dependency_index, closer,
+        child_factory)
+
+
+def _collect_binding_spec_bindings(
+        binding_specs, explicit_bindings, known_scope_ids,
+        configure_method_name, dependencies_method_name,
+        get_arg_names_from_provider_fn_name, discovery_cache):
+    """Collects the bindings from binding specs and their dependencies.
+
+    Args:
+      binding_specs: the BindingSpec subclasses to get bindings and provider
+          methods from, or None
+      explicit_bindings: a list, to which to append the explicit bindings
+      known_scope_ids: the IDs of the scopes that bindings may be in
+      configure_method_name: the name of binding specs' configure method
+      dependencies_method_name: the name of binding specs' dependencies method
+      get_arg_names_from_provider_fn_name: a function mapping a provider
+          method name to a sequence of the arg names for which that method is
+          a provider (if any)
+      discovery_cache: a DiscoveryCache, or None
+    Returns:
+      the RequiredBindings that the binding specs require
+    Raises:
+      Error: a binding spec is invalid
+    """
+    binder = bindings.Binder(explicit_bindings, known_scope_ids)
+    required_bindings = required_bindings_lib.RequiredBindings()
+    if binding_specs is not None:
+        binding_specs = list(binding_specs)
+        processed_binding_specs = set()
+        while binding_specs:
+            binding_spec = binding_specs.pop()
+            if binding_spec in processed_binding_specs:
+                continue
+            processed_binding_specs.add(binding_spec)
+            all_kwargs = {'bind': binder.bind,
+                          'require': required_bindings.require}
+            has_configure = hasattr(binding_spec, configure_method_name)
+            if has_configure:
+                configure_method = getattr(binding_spec, configure_method_name)
+                configure_kwargs = _pare_to_present_args(
+                    all_kwargs, configure_method)
+                if not configure_kwargs:
+                    raise errors.ConfigureMethodMissingArgsError(
+                        configure_method, all_kwargs.keys())
+                try:
+                    configure_method(**configure_kwargs)
+                except NotImplementedError:
+                    has_configure = False
+            dependencies = None
+            if hasattr(binding_spec, dependencies_method_name):
+                dependencies_method = (
+                    getattr(binding_spec, dependencies_method_name))
+                dependencies = dependencies_method()
+                binding_specs.extend(dependencies)
+            provider_bindings = bindings.get_provider_bindings(
+                binding_spec, known_scope_ids,
+                get_arg_names_from_provider_fn_name, discovery_cache)
+            explicit_bindings.extend(provider_bindings)
+            if (not has_configure and
+                not dependencies and
+                not provider_bindings):
+                raise errors.EmptyBindingSpecError(binding_spec)
+    return required_bindings
+
+
+def _get_public_arg_names(binding_keys_to_name):
+    # Binding to a class creates a hidden binding key for the class itself.
+    return sorted(set(
+        binding_key.get_arg_name() for binding_key in binding_keys_to_name
+        if not binding_key.get_arg_name().startswith('_pinject_')))
 
 
 def _pare_to_present_args(kwargs, fn):
@@ -174,11 +280,24 @@ class ObjectGraph(object):
     """A graph of objects instantiable with dependency injection."""
 
     def __init__(self, obj_provider, injection_context_factory,
-                 is_injectable_fn, use_short_stack_traces):
+                 is_injectable_fn, use_short_stack_traces, bindable_scopes,
+                 dependency_index, closer, child_factory):
         self._obj_provider = obj_provider
         self._injection_context_factory = injection_context_factory
         self._is_injectable_fn = is_injectable_fn
         self._use_short_stack_traces = use_short_stack_traces
+        self._bindable_scopes = bindable_scopes
+        self._dependency_index = dependency_index
+        self._closer = closer
+        self._child_factory = child_factory
+        for scope in bindable_scopes.get_all_scopes():
+            if hasattr(scope, 'set_closer'):
+                scope.set_closer(closer)
+        self._fork_unsafe_binding_keys = []
+        self._is_registered_at_fork = False
+        self._is_closed = False
+        self._fn_to_call_plan = weakref.WeakKeyDictionary()
+        self._cls_to_is_providable = {}
 
     def provide(self, cls):
         """Provides an instance of the given class.
@@ -191,6 +310,9 @@ class ObjectGraph(object):
           Error: an instance of cls is not providable
         """
         support.verify_class_type(cls, 'cls')
+        if self._is_closed:
+            raise errors.ClosedObjectGraphError(
+                locations.get_back_frame_loc())
         if not self._is_injectable_fn(cls):
             provide_loc = locations.get_back_frame_loc()
             raise errors.NonExplicitlyBoundClassError(provide_loc, cls)
@@ -203,3 +325,662 @@ class ObjectGraph(object):
                 raise e
             else:
                 raise
+
+    def try_provide(self, cls, default=None):
+        """Provides an instance of the given class, if everything is bound.
+
+        This is like provide(), except that it returns default, instead of
+        raising an error, if cls isn't injectable, or if nothing is bound to
+        some arg that providing cls would (transitively) inject.  Which
+        classes can be provided is worked out once per class.
+
+        Args:
+          cls: a class (not an instance)
+          default: what to return if cls can't be provided
+        Returns:
+          an instance of cls, or default
+        Raises:
+          Error: an instance of cls is not providable for some other reason
+        """
+        support.verify_class_type(cls, 'cls')
+        if self._is_closed:
+            raise errors.ClosedObjectGraphError(
+                locations.get_back_frame_loc())
+        is_providable = self._cls_to_is_providable.get(cls)
+        if is_providable is None:
+            try:
+                is_providable = (
+                    self._is_injectable_fn(cls) and
+                    self._obj_provider.is_providable_class(cls))
+            except errors.Error as e:
+                if self._use_short_stack_traces:
+                    raise e
+                else:
+                    raise
+            self._cls_to_is_providable[cls] = is_providable
+        if not is_providable:
+            return default
+        try:
+            return self._obj_provider.provide_class(
+                cls, self._injection_context_factory.new(cls.__init__),
+                direct_init_pargs=[], direct_init_kwargs={})
+        except errors.Error as e:
+            if self._use_short_stack_traces:
+                raise e
+            else:
+                raise
+
+    def provide_many(self, classes):
+        """Provides an instance of each of the given classes.
+
+        This is faster than calling provide() for each class, since
+        dependencies in the built-in singleton scopes (SINGLETON,
+        WEAK_SINGLETON and overlay singletons) are only looked up once for all
+        the instances.
+
+        Args:
+          classes: a sequence of classes (not instances)
+        Returns:
+          a list of instances of the classes, in the same order
+        Raises:
+          Error: an instance of one of the classes is not providable
+        """
+        support.verify_class_types(classes, 'classes')
+        if self._is_closed:
+            raise errors.ClosedObjectGraphError(
+                locations.get_back_frame_loc())
+        for cls in set(classes):
+            if not self._is_injectable_fn(cls):
+                provide_loc = locations.get_back_frame_loc()
+                raise errors.NonExplicitlyBoundClassError(provide_loc, cls)
+        return self._provide_all(classes)
+
+    def provide_batch(self, cls, num_instances):
+        """Provides several instances of the given class.
+
+        This is faster than calling provide() repeatedly, since dependencies
+        in the built-in singleton scopes (SINGLETON, WEAK_SINGLETON and overlay
+        singletons) are only looked up once for all the instances.
+
+        Args:
+          cls: a class (not an instance)
+          num_instances: the number of instances to provide
+        Returns:
+          a list of num_instances distinct instances of cls
+        Raises:
+          Error: an instance of cls is not providable
+        """
+        support.verify_class_type(cls, 'cls')
+        if self._is_closed:
+            raise errors.ClosedObjectGraphError(
+                locations.get_back_frame_loc())
+        if not self._is_injectable_fn(cls):
+            provide_loc = locations.get_back_frame_loc()
+            raise errors.NonExplicitlyBoundClassError(provide_loc, cls)
+        return self._provide_all([cls] * num_instances)
+
+    def _provide_all(self, classes):
+        batch_cache = injection_contexts.BatchCache()
+        cls_to_injection_context = {}
+        for cls in classes:
+            if cls not in cls_to_injection_context:
+                cls_to_injection_context[cls] = (
+                    self._injection_context_factory.new(
+                        cls.__init__).with_batch_cache(batch_cache))
+        try:
+            return [self._obj_provider.provide_class(
+                        cls, cls_to_injection_context[cls],
+                        direct_init_pargs=[], direct_init_kwargs={})
+                    for cls in classes]
+        except errors.Error as e:
+            if self._use_short_stack_traces:
+                raise e
+            else:
+                raise
+        finally:
+            batch_cache.close()
+
+    def call(self, fn, *direct_pargs, **direct_kwargs):
+        """Calls the given function, injecting its args.
+
+        The args passed directly are passed on to fn, and fn's other args
+        are injected, as if fn were a provider function.  What's needed to
+        inject fn's args is worked out on the first call and reused by later
+        calls, for as long as fn exists (or, for a bound method, its
+        function, so that it's reused for the method of any instance).
+
+        Args:
+          fn: a function or method
+          direct_pargs: the positional args to pass directly to fn
+          direct_kwargs: the keyword args to pass directly to fn
+        Returns:
+          whatever fn returns
+        Raises:
+          Error: fn's args are not injectable
+        """
+        support.verify_callable(fn, 'fn')
+        if self._is_closed:
+            raise errors.ClosedObjectGraphError(
+                locations.get_back_frame_loc())
+        # Each access to a method creates a new bound method, so plans are
+        # cached by the method's function, which all of them share.
+        plan_key = getattr(fn, '__func__', fn)
+        try:
+            call_plan = self._fn_to_call_plan.get(plan_key)
+        except TypeError:
+            # fn can't be weakly referenced.
+            call_plan = self._new_call_plan(fn)
+        else:
+            if call_plan is None:
+                call_plan = self._new_call_plan(fn)
+                self._fn_to_call_plan[plan_key] = call_plan
+        return self._call(call_plan, fn, direct_pargs, direct_kwargs)
+
+    def wrap(self, fn):
+        """Returns a function that calls the given function with injection.
+
+        Calling the returned function is like calling call() with fn, but
+        faster still, since it keeps what's needed to inject fn's args even
+        if fn itself isn't kept.  It's meant for functions called over and
+        over, like request handlers.
+
+        Args:
+          fn: a function or method
+        Returns:
+          a function taking the args to pass directly to fn, and returning
+              whatever fn returns
+        """
+        support.verify_callable(fn, 'fn')
+        call_plan = self._new_call_plan(fn)
+        def CallWithInjection(*direct_pargs, **direct_kwargs):
+            if self._is_closed:
+                raise errors.ClosedObjectGraphError(
+                    locations.get_back_frame_loc())
+            return self._call(call_plan, fn, direct_pargs, direct_kwargs)
+        return CallWithInjection
+
+    def _new_call_plan(self, fn):
+        return object_providers.CallPlan(
+            self._obj_provider, fn, self._injection_context_factory)
+
+    def _call(self, call_plan, fn, direct_pargs, direct_kwargs):
+        try:
+            return call_plan.call(fn, direct_pargs, direct_kwargs)
+        except errors.Error as e:
+            if self._use_short_stack_traces:
+                raise e
+            else:
+                raise
+
+    def child(self, classes=None, binding_specs=None, id_to_scope=None):
+        """Creates a child object graph.
+
+        The child graph can provide everything this graph can, using the
+        same singletons, plus whatever its own classes and binding specs
+        bind.  Its own bindings take precedence over this graph's, but only
+        when providing through the child: what this graph binds is always
+        provided with this graph's bindings, so that the child never changes
+        what this graph provides.  The child has its own instances of the
+        built-in scopes, and the custom scopes in id_to_scope; other custom
+        scopes are shared with this graph, though what the child provides
+        with its own bindings is memoized in them separately from what this
+        graph provides.  Closing the child only closes the instances in its
+        own scopes.
+
+        Creating a child only costs as much as processing its own classes
+        and binding specs.
+
+        Args:
+          classes: the classes for which to create implicit bindings in the
+              child; if None (the default), then no classes
+          binding_specs: the BindingSpec subclasses to get the child's
+              bindings and provider methods from; if None (the default), then
+              no binding specs
+          id_to_scope: a map from scope ID to the concrete Scope
+              implementation instance for that scope, for the child's own
+              custom scopes; if None (the default), then none
+        Returns:
+          an ObjectGraph
+        Raises:
+          Error: the child object graph is not creatable as specified
+        """
+        try:
+            if classes is not None:
+                support.verify_class_types(classes, 'classes')
+            if binding_specs is not None:
+                support.verify_subclasses(
+                    binding_specs, bindings.BindingSpec, 'binding_specs')
+            return self._child_factory.new_child(
+                self._obj_provider, self._bindable_scopes, self._closer,
+                classes, binding_specs, id_to_scope)
+        except errors.Error as e:
+            if self._use_short_stack_traces:
+                raise e
+            else:
+                raise
+
+    def override(self, binding_specs):
+        """Creates an overlay object graph, with some bindings replaced.
+
+        The overlay graph provides everything this graph can, except that
+        the bindings from binding_specs replace this graph's bindings for
+        the same binding keys, everywhere they're injected.  Singletons that
+        this graph already provided are shared with the overlay, unless they
+        were provided using a replaced binding (directly or indirectly), in
+        which case the overlay provides them anew, even if this graph only
+        provides them after the overlay is created.  The overlay never
+        changes what this graph provides.  Like a child graph (see
+        child()), the overlay has its own instances of the built-in scopes
+        and shares this graph's custom scopes, and closing it only closes
+        what it provided itself.  What the overlay provides in custom
+        scopes is memoized separately from what this graph provides, so
+        only singletons are shared.
+
+        This is meant for tests, e.g., to replace one binding with a fake
+        without creating a whole new object graph:
+
+            with obj_graph.override([FakeClockBindingSpec()]) as test_graph:
+                ...
+
+        Args:
+          binding_specs: the BindingSpec subclasses to get the replacement
+              bindings and provider methods from
+        Returns:
+          an ObjectGraph
+        Raises:
+          Error: the overlay object graph is not creatable as specified
+        """
+        try:
+            support.verify_subclasses(
+                binding_specs, bindings.BindingSpec, 'binding_specs')
+            return self._child_factory.new_overlay(
+                self._obj_provider, self._bindable_scopes,
+                self._dependency_index, self._closer, binding_specs)
+        except errors.Error as e:
+            if self._use_short_stack_traces:
+                raise e
+            else:
+                raise
+
+    def prepare_for_fork(self, classes=None, fork_unsafe_arg_names=None,
+                         freeze_gc=True):
+        """Readies this object graph to be shared by forked child processes.
+
+        Instances of the given classes (and everything they depend on) are
+        provided now, in the parent process, so that children inherit them
+        instead of each building them.  After a fork, each child process calls
+        reinitialize_after_fork() (automatically, where os.register_at_fork()
+        is available).
+
+        Args:
+          classes: the classes of which to provide instances before forking;
+              if None (the default), then no classes
+          fork_unsafe_arg_names: the arg names whose singletons must not be
+              shared across processes (e.g., sockets or thread pools); if None
+              (the default), then no arg names
+          freeze_gc: whether to call gc.freeze() (where available), so that
+              garbage collections in child processes don't write to, and
+              therefore copy, the memory pages holding the parent's objects
+        Raises:
+          Error: an instance of one of the classes is not providable
+        """
+        if classes is not None:
+            support.verify_class_types(classes, 'classes')
+        if fork_unsafe_arg_names is not None:
+            support.verify_string_types(
+                fork_unsafe_arg_names, 'fork_unsafe_arg_names')
+        for cls in classes or []:
+            self.provide(cls)
+        self._fork_unsafe_binding_keys = [
+            binding_keys.new(arg_name)
+            for arg_name in fork_unsafe_arg_names or []]
+        if (not self._is_registered_at_fork and
+                hasattr(os, 'register_at_fork')):
+            self_ref = weakref.ref(self)
+            def ReinitializeInChild():
+                obj_graph = self_ref()
+                if obj_graph is not None:
+                    obj_graph.reinitialize_after_fork()
+            os.register_at_fork(after_in_child=ReinitializeInChild)
+            self._is_registered_at_fork = True
+        if freeze_gc and hasattr(gc, 'freeze'):
+            gc.collect()
+            gc.freeze()
+
+    def reinitialize_after_fork(self):
+        """Makes this object graph safe to use in a newly forked process.
+
+        Scope locks are recreated, since a thread holding one at fork time
+        doesn't exist in the child.  Singletons for the fork-unsafe arg names
+        given to prepare_for_fork(), and every singleton that was provided
+        using them, are discarded, to be provided anew on next use.
+
+        This is called automatically in child processes where
+        os.register_at_fork() is available.
+        """
+        self._dependency_index.reset_after_fork()
+        for scope in self._bindable_scopes.get_all_scopes():
+            if hasattr(scope, 'reset_after_fork'):
+                scope.reset_after_fork()
+        if self._fork_unsafe_binding_keys:
+            self._drop_with_dependents(self._fork_unsafe_binding_keys)
+
+    def invalidate(self, arg_name, annotated_with=None):
+        """Discards the memoized instances for an arg name, and dependents.
+
+        The instances memoized for the arg name (and annotation), and every
+        instance that was provided using them, directly or indirectly, are
+        discarded from all scopes, to be provided anew on next use.
+        Everything else stays memoized.  This is meant for hot-reloading,
+        e.g., singletons holding configuration or credentials.  Discarded
+        instances are not closed, since whatever they were injected into may
+        still be using them (though request, thread and tenant scopes still
+        close them when the request, thread or tenant ends).  Custom scopes
+        only discard instances if they define drop(binding_keys).
+
+        Args:
+          arg_name: the arg name
+          annotated_with: the annotation, or None for no annotation
+        Returns:
+          the sorted names of the other args whose instances were discarded
+              because they depend on arg_name
+        """
+        support.verify_string_type(arg_name, 'arg_name')
+        binding_key = binding_keys.new(arg_name, annotated_with)
+        return _get_public_arg_names(
+            self._drop_with_dependents([binding_key]) - {binding_key})
+
+    def get_dependent_arg_names(self, arg_name, annotated_with=None):
+        """Returns what was provided using an arg name, directly or not.
+
+        Only dependencies of instances that have actually been provided are
+        known.
+
+        Args:
+          arg_name: the arg name
+          annotated_with: the annotation, or None for no annotation
+        Returns:
+          the sorted names of the args whose instances were provided using
+              the instance for arg_name, directly or indirectly
+        """
+        support.verify_string_type(arg_name, 'arg_name')
+        binding_key = binding_keys.new(arg_name, annotated_with)
+        return _get_public_arg_names(
+            self._get_with_dependents([binding_key]) - {binding_key})
+
+    def _get_with_dependents(self, binding_keys_to_drop):
+        singleton_scope = self._bindable_scopes.get_scope(scoping.SINGLETON)
+        stale_binding_keys = set(binding_keys_to_drop)
+        stale_binding_keys |= singleton_scope.get_aliased_binding_keys(
+            binding_keys_to_drop)
+        stale_binding_keys |= self._dependency_index.get_transitive_dependents(
+            stale_binding_keys)
+        return stale_binding_keys
+
+    def _drop_with_dependents(self, binding_keys_to_drop):
+        stale_binding_keys = self._get_with_dependents(binding_keys_to_drop)
+        for scope in self._bindable_scopes.get_all_scopes():
+            if hasattr(scope, 'drop'):
+                scope.drop(stale_binding_keys)
+        return stale_binding_keys
+
+    def freeze(self, allow_new_singletons=False):
+        """Freezes the singletons that have been provided so far.
+
+        This is meant for once a program has warmed up, i.e., has provided
+        everything in singleton scope that it'll need.  Unless
+        allow_new_singletons is True, providing anything in singleton scope
+        that hasn't been provided yet then raises an error, rather than
+        constructing it while serving.  Singletons that were provided before
+        freezing may still be provided again after being dropped, e.g., by
+        invalidate() or reinitialize_after_fork().
+
+        Args:
+          allow_new_singletons: whether to allow providing singletons that
+              haven't been provided yet
+        """
+        for scope in self._bindable_scopes.get_all_scopes():
+            if hasattr(scope, 'freeze'):
+                scope.freeze(allow_new_singletons)
+
+    def get_lock_metrics(self):
+        """Returns statistics about taking scopes' locks.
+
+        Only scopes that record lock metrics contribute: the built-in
+        singleton scopes, if the graph was created with
+        record_lock_metrics=True, and custom scopes with a
+        get_lock_metrics() method, like a CacheScope created with
+        record_lock_metrics=True.
+
+        Returns:
+          a dict mapping each BindingKey provided with a scope's lock to its
+              LockMetrics
+        """
+        binding_key_to_metrics = {}
+        for scope in self._bindable_scopes.get_all_scopes():
+            if hasattr(scope, 'get_lock_metrics'):
+                binding_key_to_metrics.update(scope.get_lock_metrics())
+        return binding_key_to_metrics
+
+    def request(self):
+        """Returns a context manager for handling a request.
+
+        Within the with-block, instances in request scope (REQUEST) are
+        memoized for that request only, including in threads and asyncio
+        tasks that inherit the current context.  When the with-block exits,
+        they are closed (see close()) and forgotten.
+
+        Returns:
+          a context manager
+        """
+        return _RequestBlock(
+            self._bindable_scopes.get_scope(scoping.REQUEST), self._closer)
+
+    def get_thread_initializer(self, classes):
+        """Returns a function that readies a new thread to use this graph.
+
+        The returned function provides instances of the given classes, so
+        that their dependencies in thread scope (THREAD) are created up
+        front in each thread that calls it.  It is meant to be passed as the
+        initializer arg of concurrent.futures.ThreadPoolExecutor.
+
+        Args:
+          classes: the classes of which to provide instances
+        Returns:
+          a function taking no args
+        """
+        support.verify_class_types(classes, 'classes')
+        classes = list(classes)
+        def InitializeThread():
+            for cls in classes:
+                self.provide(cls)
+        return InitializeThread
+
+    def register_close_hook(self, cls, close_fn):
+        """Registers how to close instances of a class.
+
+        Instances of cls (or of its subclasses) will be closed by calling
+        close_fn with them, instead of calling their close() methods.  This
+        is also how to have instances closed that provider functions return,
+        which aren't closed otherwise, since they may be shared with
+        something else.  Hooks registered later take precedence.
+
+        Args:
+          cls: a class
+          close_fn: a function taking an instance of cls; for aclose(), it
+              may return an awaitable
+        """
+        support.verify_class_type(cls, 'cls')
+        support.verify_callable(close_fn, 'close_fn')
+        self._closer.register_close_hook(cls, close_fn)
+
+    def close(self):
+        """Tears down the instances memoized in this object graph's scopes.
+
+        Each instance is closed before everything that it depends on, using
+        the close hook registered for its class, else, if the object graph
+        created it from its class, its close() method.  Instances bound with
+        to_instance, and instances returned by provider functions, are left
+        alone unless a close hook applies, since the object graph didn't
+        create them.  __exit__() methods are never called, since the object
+        graph never entered the instances.  All
+        references to the instances are released, and this object graph can
+        no longer provide anything.  Closing a closed object graph does
+        nothing.
+
+        Raises:
+          Exception: the first exception that closing an instance raised,
+              after trying to close all the others
+        """
+        if self._is_closed:
+            return
+        self._is_closed = True
+        self._closer.close_all(self._pop_all_instances())
+
+    def aclose(self):
+        """Tears down instances like close(), for async resources.
+
+        aclose() methods are preferred to close() methods, and whatever
+        awaitable closing an instance returns is
+        awaited before closing the next instance.  Requires Python 3.5+.
+
+        Returns:
+          an awaitable
+        """
+        from . import async_closing
+        if self._is_closed:
+            return async_closing.return_when_awaited(None)
+        self._is_closed = True
+        return async_closing.aclose_all(
+            self._closer, self._pop_all_instances())
+
+    def _pop_all_instances(self):
+        instances = closing.pop_all_scope_instances(
+            self._bindable_scopes.get_all_scopes(),
+            last_scope=self._bindable_scopes.get_scope(scoping.SINGLETON),
+            dependency_index=self._dependency_index)
+        self._dependency_index.clear()
+        return instances
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __aenter__(self):
+        from . import async_closing
+        return async_closing.return_when_awaited(self)
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        return self.aclose()
+
+
+class _ChildObjectGraphFactory(object):
+    """Creates child object graphs with their parent's options."""
+
+    def __init__(self, only_use_explicit_bindings, allow_injecting_none,
+                 configure_method_name, dependencies_method_name,
+                 get_arg_names_from_class_name,
+                 get_arg_names_from_provider_fn_name,
+                 injection_context_factory, is_injectable_fn,
+                 use_short_stack_traces):
+        self._only_use_explicit_bindings = only_use_explicit_bindings
+        self._allow_injecting_none = allow_injecting_none
+        self._configure_method_name = configure_method_name
+        self._dependencies_method_name = dependencies_method_name
+        self._get_arg_names_from_class_name = get_arg_names_from_class_name
+        self._get_arg_names_from_provider_fn_name = (
+            get_arg_names_from_provider_fn_name)
+        self._injection_context_factory = injection_context_factory
+        self._is_injectable_fn = is_injectable_fn
+        self._use_short_stack_traces = use_short_stack_traces
+
+    def new_child(self, parent_obj_provider, parent_bindable_scopes,
+                  parent_closer, classes, binding_specs, id_to_scope):
+        bindable_scopes = parent_bindable_scopes.new_child(id_to_scope)
+        classes = classes or []
+        if self._only_use_explicit_bindings:
+            implicit_class_bindings = []
+        else:
+            implicit_class_bindings = bindings.get_implicit_class_bindings(
+                classes, self._get_arg_names_from_class_name)
+        explicit_bindings = bindings.get_explicit_class_bindings(
+            classes, self._get_arg_names_from_class_name)
+        required_bindings = _collect_binding_spec_bindings(
+            binding_specs, explicit_bindings,
+            bindable_scopes.get_scope_ids(), self._configure_method_name,
+            self._dependencies_method_name,
+            self._get_arg_names_from_provider_fn_name, discovery_cache=None)
+        binding_key_to_binding, collided_binding_key_to_bindings = (
+            bindings.get_overall_binding_key_to_binding_maps(
+                [implicit_class_bindings, explicit_bindings]))
+        binding_mapping = bindings.BindingMapping(
+            binding_key_to_binding, collided_binding_key_to_bindings,
+            parent=parent_obj_provider.get_binding_mapping())
+        binding_mapping.verify_requirements(required_bindings.get())
+        dependency_index = dependencies_lib.DependencyIndex()
+        closer = parent_closer.new_child(
+            externally_owned_instances=[
+                binding.target for binding in explicit_bindings
+                if binding.target_kind == bindings.TO_INSTANCE])
+        obj_provider = object_providers.ObjectProvider(
+            binding_mapping, bindable_scopes, self._allow_injecting_none,
+            dependency_index, parent_obj_provider, closer)
+        return ObjectGraph(
+            obj_provider, self._injection_context_factory,
+            self._is_injectable_fn, self._use_short_stack_traces,
+            bindable_scopes, dependency_index, closer, self)
+
+    def new_overlay(self, parent_obj_provider, parent_bindable_scopes,
+                    parent_dependency_index, parent_closer, binding_specs):
+        explicit_bindings = []
+        required_bindings = _collect_binding_spec_bindings(
+            binding_specs, explicit_bindings,
+            parent_bindable_scopes.get_scope_ids(),
+            self._configure_method_name, self._dependencies_method_name,
+            self._get_arg_names_from_provider_fn_name, discovery_cache=None)
+        binding_key_to_binding, collided_binding_key_to_bindings = (
+            bindings.get_overall_binding_key_to_binding_maps(
+                [explicit_bindings]))
+        binding_mapping = bindings.BindingMapping(
+            binding_key_to_binding, collided_binding_key_to_bindings,
+            parent=parent_obj_provider.get_binding_mapping())
+        binding_mapping.verify_requirements(required_bindings.get())
+        replaced_binding_keys = set(
+            binding.binding_key for binding in explicit_bindings)
+        bindable_scopes = parent_bindable_scopes.new_overlay(
+            replaced_binding_keys, parent_dependency_index)
+        # The overlay shares singletons provided by the parent, so it must
+        # know what they depend on to invalidate them.
+        dependency_index = dependencies_lib.DependencyIndex(
+            parent=parent_dependency_index)
+        # What the overlay creates may be memoized in the parent's scopes,
+        # so it must count as created when the parent is closed.
+        closer = parent_closer.new_child(
+            externally_owned_instances=[
+                binding.target for binding in explicit_bindings
+                if binding.target_kind == bindings.TO_INSTANCE])
+        obj_provider = object_providers.ObjectProvider(
+            binding_mapping, bindable_scopes, self._allow_injecting_none,
+            dependency_index, closer=closer)
+        return ObjectGraph(
+            obj_provider, self._injection_context_factory,
+            self._is_injectable_fn, self._use_short_stack_traces,
+            bindable_scopes, dependency_index, closer, self)
+
+
+class _RequestBlock(object):
+
+    def __init__(self, request_scope, closer):
+        self._request_scope = request_scope
+        self._closer = closer
+        self._token = None
+
+    def __enter__(self):
+        self._token = self._request_scope.enter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._closer.close_all(self._request_scope.exit(self._token))
+
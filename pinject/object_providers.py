@@ -14,50 +14,175 @@ limitations under the License.
 """
 
 
+import functools
+
 from . import support
 from . import arg_binding_keys
+from . import bindings
 from . import decorators
+from . import dependencies
 from . import errors
+from . import provider_indirections
+from . import scoping
+
+
+_NOT_CACHED = object()
 
 
 class ObjectProvider(object):
 
-    def __init__(self, binding_mapping, bindable_scopes, allow_injecting_none):
+    def __init__(self, binding_mapping, bindable_scopes, allow_injecting_none,
+                 dependency_index=None, parent_obj_provider=None,
+                 closer=None):
         self._binding_mapping = binding_mapping
         self._bindable_scopes = bindable_scopes
         self._allow_injecting_none = allow_injecting_none
+        if dependency_index is None:
+            dependency_index = dependencies.DependencyIndex()
+        self._dependency_index = dependency_index
+        # A child object graph's provider falls back to its parent's for
+        # what the child doesn't bind itself.
+        self._parent_obj_provider = parent_obj_provider
+        # Records what's created, so that it's closed when the graph is.
+        self._closer = closer
+
+    def get_binding_mapping(self):
+        return self._binding_mapping
+
+    def get_binding(self, binding_key, injection_site_fn):
+        return self._binding_mapping.get(binding_key, injection_site_fn)
+
+    def is_bound(self, binding_key):
+        return self._binding_mapping.is_bound(binding_key)
+
+    def get_bound_arg_binding_keys(self, arg_binding_keys):
+        """Returns the arg binding keys except unbound optional ones."""
+        return [abk for abk in arg_binding_keys
+                if not abk.is_optional or self.is_bound(abk.binding_key)]
+
+    def is_providable_class(self, cls):
+        """Returns whether what's needed to provide cls is all bound.
+
+        This doesn't raise errors for missing bindings.  Provider functions
+        that are injected aren't looked into, since what they provide is
+        provided only when they're called.
+
+        Args:
+          cls: a class
+        Returns:
+          True iff every arg that providing cls would transitively inject
+              (other than unbound optional args) has a binding
+        """
+        if not support.is_constructor_defined(cls):
+            return True
+        return self._are_args_bound(cls.__init__, set())
+
+    def _are_args_bound(self, fn, visited_binding_keys):
+        for arg_binding_key in self.get_bound_arg_binding_keys(
+                decorators.get_injectable_arg_binding_keys(fn, [], {})):
+            binding_key = arg_binding_key.binding_key
+            if not self.is_bound(binding_key):
+                return False
+            if (arg_binding_key.provider_indirection is
+                    provider_indirections.NO_INDIRECTION and
+                    not self._is_target_bound(
+                        binding_key, fn, visited_binding_keys)):
+                return False
+        return True
+
+    def _is_target_bound(self, binding_key, injection_site_fn,
+                         visited_binding_keys):
+        if (self._parent_obj_provider is not None and
+                not self._binding_mapping.contains(binding_key)):
+            return self._parent_obj_provider._is_target_bound(
+                binding_key, injection_site_fn, visited_binding_keys)
+        if binding_key in visited_binding_keys:
+            return True
+        visited_binding_keys.add(binding_key)
+        binding = self._binding_mapping.get(binding_key, injection_site_fn)
+        if binding.target_kind == bindings.TO_PROVIDER_FN:
+            return self._are_args_bound(binding.target, visited_binding_keys)
+        elif binding.target_kind == bindings.TO_CLASS:
+            cls = binding.target
+        elif binding.target_kind == bindings.TO_SOURCE_CLASS:
+            cls = binding.target.get_class()
+        else:
+            return True
+        return (not support.is_constructor_defined(cls) or
+                self._are_args_bound(cls.__init__, visited_binding_keys))
+
+    def get_scope(self, binding_key, injection_site_fn):
+        if (self._parent_obj_provider is not None and
+                not self._binding_mapping.contains(binding_key)):
+            return self._parent_obj_provider.get_scope(
+                binding_key, injection_site_fn)
+        return self._bindable_scopes.get_sub_scope(
+            self._binding_mapping.get(binding_key, injection_site_fn))
+
+    def is_injecting_none_allowed(self):
+        return self._allow_injecting_none
 
     def provide_from_arg_binding_key(
             self, injection_site_fn, arg_binding_key, injection_context):
         binding_key = arg_binding_key.binding_key
-        binding = self._binding_mapping.get(
-            binding_key, injection_context.get_injection_site_desc())
-        scope = self._bindable_scopes.get_sub_scope(binding)
-        def Provide(*pargs, **kwargs):
-            # TODO(kurts): probably capture back frame's file:line for
-            # DirectlyPassingInjectedArgsError.
-            child_injection_context = injection_context.get_child(
-                injection_site_fn, binding)
-            provided = scope.provide(
-                binding_key,
-                lambda: binding.proviser_fn(child_injection_context, self,
-                                            pargs, kwargs))
-            if (provided is None) and not self._allow_injecting_none:
-                raise errors.InjectingNoneDisallowedError(
-                    binding.get_binding_target_desc_fn())
-            return provided
+        if (self._parent_obj_provider is not None and
+                not self._binding_mapping.contains(binding_key)):
+            # What the parent binds is provided entirely by the parent, so
+            # that the child's bindings never affect the parent's instances.
+            return self._parent_obj_provider.provide_from_arg_binding_key(
+                injection_site_fn, arg_binding_key, injection_context)
         provider_indirection = arg_binding_key.provider_indirection
-        try:
-            provided = provider_indirection.StripIndirectionIfNeeded(Provide)
-        except TypeError:
-            # TODO(kurts): it feels like there may be other TypeErrors that
-            # occur.  Instead, decorators.get_injectable_arg_binding_keys()
-            # should probably do all appropriate validation?
-            raise errors.OnlyInstantiableViaProviderFunctionError(
-                injection_site_fn, arg_binding_key,
-                binding.get_binding_target_desc_fn())
+        batch_cache = injection_context.get_batch_cache()
+        if (batch_cache is not None and
+                provider_indirection is provider_indirections.NO_INDIRECTION):
+            binding_and_provided = batch_cache.get(binding_key)
+            if binding_and_provided is not None:
+                binding, provided = binding_and_provided
+                # This checks the same as providing anew would.
+                injection_context.get_child(injection_site_fn, binding)
+                self.record_dependency(binding_key, injection_context)
+                return provided
+        provider = self._new_provider(
+            injection_site_fn, binding_key, injection_context)
+        provided = provide_with_indirection(
+            provider, injection_site_fn, arg_binding_key)
+        if (batch_cache is not None and
+                provider_indirection is provider_indirections.NO_INDIRECTION and
+                scoping.is_built_in_memoizing_scope(provider.get_scope())):
+            batch_cache.set(binding_key, provider.get_binding(), provided)
         return provided
 
+    def new_provider(self, injection_site_fn, binding_key, injection_context):
+        """Creates a Provider for a binding key, here or in a parent graph.
+
+        Args:
+          injection_site_fn: the function being injected into
+          binding_key: a BindingKey
+          injection_context: the injection context of injection_site_fn
+        Returns:
+          a new Provider
+        """
+        if (self._parent_obj_provider is not None and
+                not self._binding_mapping.contains(binding_key)):
+            return self._parent_obj_provider.new_provider(
+                injection_site_fn, binding_key, injection_context)
+        return self._new_provider(
+            injection_site_fn, binding_key, injection_context)
+
+    def _new_provider(self, injection_site_fn, binding_key, injection_context):
+        binding = self._binding_mapping.get(
+            binding_key, injection_context.get_injection_site_fn())
+        scope = self._bindable_scopes.get_sub_scope(binding)
+        return Provider(
+            self, injection_site_fn, binding, scope, injection_context,
+            self._dependency_index, self._allow_injecting_none)
+
+    def record_dependency(self, binding_key, injection_context):
+        """Records binding_key as a dependency of what's being provided."""
+        dependent_binding_key = injection_context.get_binding_key()
+        if dependent_binding_key is not None:
+            self._dependency_index.record(binding_key, dependent_binding_key)
+
     def provide_class(self, cls, injection_context,
                       direct_init_pargs, direct_init_kwargs):
         if support.is_constructor_defined(cls):
@@ -67,7 +192,14 @@ class ObjectProvider(object):
         else:
             init_pargs = direct_init_pargs
             init_kwargs = direct_init_kwargs
-        return cls(*init_pargs, **init_kwargs)
+        return self.new_instance(cls, init_pargs, init_kwargs)
+
+    def new_instance(self, cls, init_pargs, init_kwargs):
+        """Creates an instance of cls, recording that it was created here."""
+        instance = cls(*init_pargs, **init_kwargs)
+        if self._closer is not None:
+            self._closer.record_created(instance)
+        return instance
 
     def call_with_injection(self, provider_fn, injection_context,
                             direct_pargs, direct_kwargs):
@@ -78,15 +210,313 @@ class ObjectProvider(object):
     def get_injection_pargs_kwargs(self, fn, injection_context,
                                    direct_pargs, direct_kwargs):
         di_kwargs = arg_binding_keys.create_kwargs(
-            decorators.get_injectable_arg_binding_keys(
-                fn, direct_pargs, direct_kwargs),
+            self.get_bound_arg_binding_keys(
+                decorators.get_injectable_arg_binding_keys(
+                    fn, direct_pargs, direct_kwargs)),
             lambda abk: self.provide_from_arg_binding_key(
                 fn, abk, injection_context))
-        duplicated_args = set(di_kwargs.keys()) & set(direct_kwargs.keys())
-        if duplicated_args:
-            raise errors.DirectlyPassingInjectedArgsError(
-                duplicated_args, injection_context.get_injection_site_desc(),
-                fn)
-        all_kwargs = dict(di_kwargs)
+        return _merge_direct_kwargs(
+            fn, injection_context, di_kwargs, direct_pargs, direct_kwargs)
+
+
+def _merge_direct_kwargs(fn, injection_context, di_kwargs, direct_pargs,
+                         direct_kwargs):
+    duplicated_args = set(di_kwargs.keys()) & set(direct_kwargs.keys())
+    if duplicated_args:
+        raise errors.DirectlyPassingInjectedArgsError(
+            duplicated_args, injection_context.get_injection_site_fn(), fn)
+    all_kwargs = dict(di_kwargs)
+    all_kwargs.update(direct_kwargs)
+    return direct_pargs, all_kwargs
+
+
+def provide_with_indirection(provider, injection_site_fn, arg_binding_key,
+                             batch_instances=None):
+    """Returns what to inject for an arg: the provider, or what it provides.
+
+    Args:
+      provider: a Provider for the arg's binding
+      injection_site_fn: the function being injected into
+      arg_binding_key: the ArgBindingKey of the arg
+      batch_instances: a dict shared by a batch of instances (see
+          Provider.provide_for_batch()), or None if not providing a batch
+    Returns:
+      provider if the arg is a provide_* arg, else what it provides
+    """
+    try:
+        if (batch_instances is not None and
+                arg_binding_key.provider_indirection is
+                provider_indirections.NO_INDIRECTION):
+            return provider.provide_for_batch(batch_instances)
+        return arg_binding_key.provider_indirection.StripIndirectionIfNeeded(
+            provider)
+    except TypeError:
+        # TODO(kurts): it feels like there may be other TypeErrors that
+        # occur.  Instead, decorators.get_injectable_arg_binding_keys()
+        # should probably do all appropriate validation?
+        raise errors.OnlyInstantiableViaProviderFunctionError(
+            injection_site_fn, arg_binding_key, provider.get_binding())
+
+
+class Provider(object):
+    """Provides instances for a binding, when injected for a provide_* arg.
+
+    Calling a Provider provides an instance, passing the args given to it
+    directly to the bound initializer or provider function (which only
+    affects what's memoized in scopes defining provide_with_direct_args()).
+    What is needed to provide an instance (a _ProvisionPlan) is worked out
+    on the first call, and reused by later calls.  Calling it with no args
+    for an instance already memoized by its scope just gets the instance
+    from the scope.
+    """
+
+    def __init__(self, obj_provider, injection_site_fn, binding, scope,
+                 injection_context, dependency_index, allow_injecting_none):
+        self._obj_provider = obj_provider
+        self._injection_site_fn = injection_site_fn
+        self._binding = binding
+        self._binding_key = binding.binding_key
+        self._scope = scope
+        # Scopes that memoize per set of direct args (e.g., CacheScope)
+        # define provide_with_direct_args().
+        self._provide_with_direct_args = getattr(
+            scope, 'provide_with_direct_args', None)
+        # Scopes that can look up memoized instances without providing them
+        # (e.g., SingletonScope) define get_memoized().
+        self._get_memoized = getattr(scope, 'get_memoized', None)
+        self._injection_context = injection_context
+        self._dependent_binding_key = injection_context.get_binding_key()
+        self._dependency_index = dependency_index
+        self._allow_injecting_none = allow_injecting_none
+        # These are only created when first needed: creating them raises an
+        # error for cyclic injection, which only matters if this is called.
+        self._child_injection_context = None
+        self._plan = None
+
+    def get_binding(self):
+        return self._binding
+
+    def get_scope(self):
+        return self._scope
+
+    def __call__(self, *pargs, **kwargs):
+        # TODO(kurts): probably capture back frame's file:line for
+        # DirectlyPassingInjectedArgsError.
+        if self._get_memoized is not None and not pargs and not kwargs:
+            provided = self._get_memoized(self._binding_key, _NOT_CACHED)
+            if provided is not _NOT_CACHED:
+                # This checks scopes and cycles, just the first time.
+                self._get_child_injection_context()
+                self._record_dependency()
+                return provided
+        return self._provide(self._get_plan(), pargs, kwargs)
+
+    def many(self, num_instances, *pargs, **kwargs):
+        """Provides several instances at once.
+
+        This is faster than calling this provider repeatedly, since what
+        the instances are provided with (directly or indirectly) that is
+        memoized in singleton scopes is only provided once, for all the
+        instances.
+
+        Args:
+          num_instances: the number of instances to provide
+          pargs: the positional args to pass directly for each instance
+          kwargs: the keyword args to pass directly for each instance
+        Returns:
+          a list of num_instances instances, which are distinct unless the
+              binding is in a memoizing scope
+        """
+        plan = self._get_plan()
+        batch_instances = {}
+        return [self._provide(plan, pargs, kwargs, batch_instances)
+                for _ in range(num_instances)]
+
+    def provide_for_batch(self, batch_instances):
+        """Provides an instance for one of a batch of instances.
+
+        Args:
+          batch_instances: a dict shared by the batch, mapping the Providers
+              of instances memoized by built-in scopes to their instances
+        Returns:
+          the provided instance
+        """
+        provided = batch_instances.get(self, _NOT_CACHED)
+        if provided is not _NOT_CACHED:
+            return provided
+        if scoping.is_built_in_memoizing_scope(self._scope):
+            provided = self()
+            batch_instances[self] = provided
+            return provided
+        return self._provide(self._get_plan(), (), {}, batch_instances)
+
+    def _get_child_injection_context(self):
+        if self._child_injection_context is None:
+            self._child_injection_context = self._injection_context.get_child(
+                self._injection_site_fn, self._binding)
+        return self._child_injection_context
+
+    def _get_plan(self):
+        if self._plan is None:
+            self._plan = _ProvisionPlan(
+                self._obj_provider, self._binding,
+                self._get_child_injection_context())
+        return self._plan
+
+    def _record_dependency(self):
+        if self._dependent_binding_key is not None:
+            self._dependency_index.record(
+                self._binding_key, self._dependent_binding_key)
+
+    def _provide(self, plan, pargs, kwargs, batch_instances=None):
+        self._record_dependency()
+        default_provider_fn = lambda: plan.provide(
+            pargs, kwargs, batch_instances)
+        if self._provide_with_direct_args is not None and (pargs or kwargs):
+            provided = self._provide_with_direct_args(
+                self._binding_key, pargs, kwargs, default_provider_fn)
+        else:
+            provided = self._scope.provide(
+                self._binding_key, default_provider_fn)
+        if (provided is None) and not self._allow_injecting_none:
+            raise errors.InjectingNoneDisallowedError(self._binding)
+        return provided
+
+
+class _ProvisionPlan(object):
+    """What's worked out once to provide instances for a binding.
+
+    The initializer or provider function to call, and a Provider for each of
+    its injected args, are looked up when the plan is created, so that
+    providing an instance only calls them.  When providing a batch of
+    instances, the instances memoized by built-in scopes, for injected args
+    at any depth, are only provided for the first instance.
+    """
+
+    def __init__(self, obj_provider, binding, child_injection_context):
+        self._obj_provider = obj_provider
+        self._binding = binding
+        self._child_injection_context = child_injection_context
+        self._cls = None
+        self._fn = None
+        if binding.target_kind == bindings.TO_PROVIDER_FN:
+            self._fn = binding.target
+        elif binding.target_kind == bindings.TO_CLASS:
+            self._cls = binding.target
+        elif binding.target_kind == bindings.TO_SOURCE_CLASS:
+            self._cls = binding.target.get_class()
+        if (self._cls is not None and
+                support.is_constructor_defined(self._cls)):
+            self._fn = self._cls.__init__
+        self._arg_binding_keys_and_providers = []
+        if self._fn is not None:
+            for arg_binding_key in obj_provider.get_bound_arg_binding_keys(
+                    decorators.get_injectable_arg_binding_keys(
+                        self._fn, direct_pargs=[], direct_kwargs={})):
+                self._arg_binding_keys_and_providers.append(
+                    (arg_binding_key, obj_provider.new_provider(
+                        self._fn, arg_binding_key.binding_key,
+                        child_injection_context)))
+
+    def provide(self, pargs, kwargs, batch_instances=None):
+        """Provides an instance.
+
+        Args:
+          pargs: the positional args to pass directly
+          kwargs: the keyword args to pass directly
+          batch_instances: a dict shared by a batch of instances, mapping
+              the Providers of instances memoized by built-in scopes to
+              their instances, or None if not providing a batch
+        Returns:
+          the provided instance
+        """
+        if self._cls is None and self._fn is None:
+            # E.g., for bindings to instances.
+            return self._binding.proviser_fn(
+                self._child_injection_context, self._obj_provider, pargs,
+                kwargs)
+        if self._fn is not None:
+            di_kwargs = {}
+            for arg_binding_key, provider in (
+                    self._arg_binding_keys_and_providers):
+                di_kwargs[arg_binding_key._arg_name] = (
+                    provide_with_indirection(
+                        provider, self._fn, arg_binding_key,
+                        batch_instances))
+            pargs, kwargs = _merge_direct_kwargs(
+                self._fn, self._child_injection_context, di_kwargs, pargs,
+                kwargs)
+        if self._cls is not None:
+            return self._obj_provider.new_instance(self._cls, pargs, kwargs)
+        return self._fn(*pargs, **kwargs)
+
+
+class CallPlan(object):
+    """Calls a function with injection, reusing what's worked out each time.
+
+    The args that are passed directly aren't injected.  For each combination
+    of direct args, the args to inject, and the scopes that memoize them, are
+    worked out on the first call.  Later calls get instances already
+    memoized by those scopes straight from them.
+
+    The function is passed to each call rather than kept, so that a plan
+    cached per function doesn't keep the function (or, for a bound method,
+    its instance) alive.
+    """
+
+    def __init__(self, obj_provider, fn, injection_context_factory):
+        self._obj_provider = obj_provider
+        self._injection_context_factory = injection_context_factory
+        self._arg_names = decorators.get_arg_names(fn)
+        self._arg_binding_keys = decorators.get_injectable_arg_binding_keys(
+            fn, direct_pargs=[], direct_kwargs={})
+        self._direct_arg_names_to_injected_arg_binding_keys = {}
+        self._arg_binding_key_to_memoized_fn = {}
+
+    def call(self, fn, direct_pargs, direct_kwargs):
+        all_kwargs = arg_binding_keys.create_kwargs(
+            self._get_injected_arg_binding_keys(
+                len(direct_pargs), frozenset(direct_kwargs.keys())),
+            functools.partial(self._provide, fn))
         all_kwargs.update(direct_kwargs)
-        return direct_pargs, all_kwargs
+        return fn(*direct_pargs, **all_kwargs)
+
+    def _get_injected_arg_binding_keys(self, num_direct_pargs,
+                                       direct_kwarg_names):
+        direct_arg_names = (num_direct_pargs, direct_kwarg_names)
+        injected_arg_binding_keys = (
+            self._direct_arg_names_to_injected_arg_binding_keys.get(
+                direct_arg_names))
+        if injected_arg_binding_keys is None:
+            direct_kwarg_names = direct_kwarg_names.union(
+                self._arg_names[:num_direct_pargs])
+            injected_arg_binding_keys = (
+                self._obj_provider.get_bound_arg_binding_keys(
+                    [abk for abk in self._arg_binding_keys
+                     if not abk.can_apply_to_one_of_arg_names(
+                         direct_kwarg_names)]))
+            self._direct_arg_names_to_injected_arg_binding_keys[
+                direct_arg_names] = injected_arg_binding_keys
+        return injected_arg_binding_keys
+
+    def _provide(self, fn, arg_binding_key):
+        get_memoized_fn = self._arg_binding_key_to_memoized_fn.get(
+            arg_binding_key, _NOT_CACHED)
+        if get_memoized_fn is _NOT_CACHED:
+            get_memoized_fn = self._get_memoized_fn(fn, arg_binding_key)
+            self._arg_binding_key_to_memoized_fn[arg_binding_key] = (
+                get_memoized_fn)
+        if get_memoized_fn is not None:
+            provided = get_memoized_fn(arg_binding_key.binding_key,
+                                       _NOT_CACHED)
+            if provided is not _NOT_CACHED:
+                return provided
+        return self._obj_provider.provide_from_arg_binding_key(
+            fn, arg_binding_key, self._injection_context_factory.new(fn))
+
+    def _get_memoized_fn(self, fn, arg_binding_key):
+        if (arg_binding_key.provider_indirection is not
+                provider_indirections.NO_INDIRECTION):
+            return None
+        scope = self._obj_provider.get_scope(arg_binding_key.binding_key, fn)
+        return getattr(scope, 'get_memoized', None)
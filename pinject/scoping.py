@@ -14,8 +14,17 @@ limitations under the License.
 """
 
 
+import collections
 import threading
+import time
+import weakref
 
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+from . import binding_keys as binding_keys_lib
 from . import errors
 
 
@@ -31,8 +40,26 @@ class _PrototypeScopeId(object):
 PROTOTYPE = _PrototypeScopeId()
 
 
+class _RequestScopeId(object):
+    def __str__(self):
+        return 'request scope'
+REQUEST = _RequestScopeId()
+
+
+class _ThreadScopeId(object):
+    def __str__(self):
+        return 'thread scope'
+THREAD = _ThreadScopeId()
+
+
+class _WeakSingletonScopeId(object):
+    def __str__(self):
+        return 'weak singleton scope'
+WEAK_SINGLETON = _WeakSingletonScopeId()
+
+
 DEFAULT_SCOPE = SINGLETON
-_BUILTIN_SCOPES = [SINGLETON, PROTOTYPE]
+_BUILTIN_SCOPES = [SINGLETON, PROTOTYPE, REQUEST, THREAD, WEAK_SINGLETON]
 
 
 class Scope(object):
@@ -47,23 +74,1535 @@ class PrototypeScope(object):
         return default_provider_fn()
 
 
-class SingletonScope(object):
+_NOT_MEMOIZED = object()
+
+
+# The upper bounds of the buckets of LockMetrics.wait_histogram; the last
+# bucket counts the waits longer than all of these.
+LOCK_WAIT_HISTOGRAM_BOUNDS_SECS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+
+
+class LockMetrics(object):
+    """Statistics about taking a scope's lock for one binding key."""
+
+    def __init__(self, num_acquisitions, total_wait_secs, max_wait_secs,
+                 wait_histogram, total_hold_secs, max_hold_secs):
+        self.num_acquisitions = num_acquisitions
+        self.total_wait_secs = total_wait_secs
+        self.max_wait_secs = max_wait_secs
+        # wait_histogram[i] counts the waits of at most
+        # LOCK_WAIT_HISTOGRAM_BOUNDS_SECS[i] (and more than the bound
+        # before it); the last count is of the longer waits.
+        self.wait_histogram = wait_histogram
+        self.total_hold_secs = total_hold_secs
+        self.max_hold_secs = max_hold_secs
+
+    def __repr__(self):
+        return (
+            '<LockMetrics num_acquisitions={0} total_wait_secs={1:.6f}'
+            ' max_wait_secs={2:.6f} wait_histogram={3}'
+            ' total_hold_secs={4:.6f} max_hold_secs={5:.6f}>'.format(
+                self.num_acquisitions, self.total_wait_secs,
+                self.max_wait_secs, list(self.wait_histogram),
+                self.total_hold_secs, self.max_hold_secs))
+
+
+class _LockMetricsRecorder(object):
 
     def __init__(self):
+        self._lock = threading.Lock()
+        self._binding_key_to_metrics = {}
+
+    def record(self, binding_key, wait_secs, hold_secs):
+        with self._lock:
+            metrics = self._binding_key_to_metrics.get(binding_key)
+            if metrics is None:
+                metrics = LockMetrics(
+                    0, 0.0, 0.0,
+                    [0] * (len(LOCK_WAIT_HISTOGRAM_BOUNDS_SECS) + 1),
+                    0.0, 0.0)
+                self._binding_key_to_metrics[binding_key] = metrics
+            metrics.num_acquisitions += 1
+            metrics.total_wait_secs += wait_secs
+            metrics.max_wait_secs = max(metrics.max_wait_secs, wait_secs)
+            metrics.wait_histogram[_get_wait_bucket(wait_secs)] += 1
+            metrics.total_hold_secs += hold_secs
+            metrics.max_hold_secs = max(metrics.max_hold_secs, hold_secs)
+
+    def get_metrics(self):
+        with self._lock:
+            return {binding_key: LockMetrics(
+                        metrics.num_acquisitions, metrics.total_wait_secs,
+                        metrics.max_wait_secs, tuple(metrics.wait_histogram),
+                        metrics.total_hold_secs, metrics.max_hold_secs)
+                    for binding_key, metrics
+                    in self._binding_key_to_metrics.items()}
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+
+def _get_wait_bucket(wait_secs):
+    for bucket, bound_secs in enumerate(LOCK_WAIT_HISTOGRAM_BOUNDS_SECS):
+        if wait_secs <= bound_secs:
+            return bucket
+    return len(LOCK_WAIT_HISTOGRAM_BOUNDS_SECS)
+
+
+def _new_lock_metrics_recorder(record_lock_metrics):
+    return _LockMetricsRecorder() if record_lock_metrics else None
+
+
+class _Providing(object):
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.done = threading.Event()
+        # Set if the instance is dropped while being provided, so that it
+        # isn't memoized.
+        self.is_stale = False
+
+
+class _PerKeyProvider(object):
+    """Provides the instances for different binding keys concurrently.
+
+    Only one thread at a time provides the instance for a binding key, and
+    other threads needing that instance wait for it, but threads needing
+    instances for other binding keys aren't held up.  The lock only guards
+    the bookkeeping, and is never held while providing.
+    """
+
+    def __init__(self, lock, lock_metrics_recorder):
+        self._lock = lock
+        self._lock_metrics_recorder = lock_metrics_recorder
+        self._binding_key_to_providing = {}
+        self._thread_to_awaited_binding_key = {}
+
+    def provide(self, binding_key, default_provider_fn, get_memoized_fn,
+                memoize_fn):
+        """Provides an instance, unless another thread already is.
+
+        Args:
+          binding_key: a BindingKey
+          default_provider_fn: a function taking no args and returning an
+              instance
+          get_memoized_fn: a function taking a BindingKey and returning the
+              instance memoized for it, or _NOT_MEMOIZED; called with the
+              lock held
+          memoize_fn: a function taking a BindingKey and an instance, and
+              memoizing the instance; called with the lock held
+        Returns:
+          the instance memoized for binding_key, or else a new one
+        """
+        start_time = self._get_time_if_recording()
+        thread = threading.current_thread()
+        while True:
+            with self._lock:
+                instance = get_memoized_fn(binding_key)
+                if instance is not _NOT_MEMOIZED:
+                    self._record(binding_key, start_time, None, None)
+                    return instance
+                providing = self._binding_key_to_providing.get(binding_key)
+                if providing is None:
+                    providing = _Providing(thread)
+                    self._binding_key_to_providing[binding_key] = providing
+                    break
+                if self._would_deadlock(providing, thread):
+                    # Only cyclic dependencies get here, and providing
+                    # anyway lets the injection context report the cycle.
+                    return default_provider_fn()
+                self._thread_to_awaited_binding_key[thread] = binding_key
+            try:
+                providing.done.wait()
+            finally:
+                with self._lock:
+                    del self._thread_to_awaited_binding_key[thread]
+        claimed_time = self._get_time_if_recording()
+        try:
+            instance = default_provider_fn()
+            with self._lock:
+                if not providing.is_stale:
+                    memoize_fn(binding_key, instance)
+            return instance
+        finally:
+            with self._lock:
+                del self._binding_key_to_providing[binding_key]
+            providing.done.set()
+            self._record(binding_key, start_time, claimed_time,
+                         self._get_time_if_recording())
+
+    def _would_deadlock(self, providing, thread):
+        # Follows which thread waits for which, starting from the thread
+        # providing what this thread would wait for.
+        while providing is not None:
+            if providing.thread is thread:
+                return True
+            awaited_binding_key = self._thread_to_awaited_binding_key.get(
+                providing.thread)
+            if awaited_binding_key is None:
+                return False
+            providing = self._binding_key_to_providing.get(awaited_binding_key)
+        return False
+
+    def mark_stale(self, binding_keys=None):
+        """Keeps instances being provided from being memoized.
+
+        Must be called with the lock held.
+
+        Args:
+          binding_keys: a set of BindingKey, or None for all binding keys
+        """
+        for binding_key, providing in self._binding_key_to_providing.items():
+            if (binding_keys is None or
+                    binding_key.without_direct_args() in binding_keys):
+                providing.is_stale = True
+
+    def _get_time_if_recording(self):
+        if self._lock_metrics_recorder is None:
+            return None
+        return _get_time()
+
+    def _record(self, binding_key, start_time, claimed_time, end_time):
+        if self._lock_metrics_recorder is None:
+            return
+        if claimed_time is None:
+            claimed_time = end_time = _get_time()
+        self._lock_metrics_recorder.record(
+            binding_key, claimed_time - start_time, end_time - claimed_time)
+
+
+class SingletonScope(object):
+
+    def __init__(self, record_lock_metrics=False):
+        """Initializer.
+
+        Args:
+          record_lock_metrics: whether to record how long providing each
+              binding key waits for, and holds, the scope's lock; see
+              get_lock_metrics()
+        """
         self._binding_key_to_instance = {}
-        self._providing_binding_keys = set()
-        # The lock is re-entrant so that default_provider_fn can provide
-        # something else in singleton scope.
-        self._rlock = threading.RLock()
+        # Dependencies finish being provided before what depends on them, so
+        # this is in dependency order.
+        self._binding_keys_in_creation_order = []
+        self._lock = threading.Lock()
+        # Once frozen, only these binding keys may be provided anew.
+        self._frozen_binding_keys = None
+        self._lock_metrics_recorder = _new_lock_metrics_recorder(
+            record_lock_metrics)
+        self._per_key_provider = _PerKeyProvider(
+            self._lock, self._lock_metrics_recorder)
 
     def provide(self, binding_key, default_provider_fn):
-        with self._rlock:
-            try:
-                return self._binding_key_to_instance[binding_key]
-            except KeyError:
-                instance = default_provider_fn()
-                self._binding_key_to_instance[binding_key] = instance
-                return instance
+        # Instances are only memoized once fully provided, so a memoized
+        # instance can be read without the lock.
+        instance = self._binding_key_to_instance.get(
+            binding_key, _NOT_MEMOIZED)
+        if instance is not _NOT_MEMOIZED:
+            return instance
+        frozen_binding_keys = self._frozen_binding_keys
+        if (frozen_binding_keys is not None and
+                binding_key not in frozen_binding_keys):
+            raise errors.FrozenObjectGraphError(binding_key)
+        return self._per_key_provider.provide(
+            binding_key, default_provider_fn, self._get_memoized_locked,
+            self._memoize_locked)
+
+    def _get_memoized_locked(self, binding_key):
+        return self._binding_key_to_instance.get(binding_key, _NOT_MEMOIZED)
+
+    def _memoize_locked(self, binding_key, instance):
+        self._binding_key_to_instance[binding_key] = instance
+        self._binding_keys_in_creation_order.append(binding_key)
+
+    def freeze(self, allow_new_instances):
+        """Stops instances from being provided for new binding keys.
+
+        Memoized instances are always read without locking.  Freezing with
+        allow_new_instances=False makes providing an instance for any binding
+        key that nothing is memoized for now raise an error.  Instances
+        memoized now may still be provided again after being dropped (e.g.,
+        after forking).
+
+        Args:
+          allow_new_instances: whether instances may still be provided for
+              binding keys that nothing is memoized for now
+        """
+        with self._lock:
+            if allow_new_instances:
+                self._frozen_binding_keys = None
+            else:
+                self._frozen_binding_keys = frozenset(
+                    self._binding_key_to_instance)
+
+    def get_memoized(self, binding_key, default=None):
+        """Returns the instance memoized for a binding key, without providing.
+
+        Args:
+          binding_key: a BindingKey
+          default: what to return if nothing is memoized for binding_key
+        Returns:
+          the memoized instance, or default
+        """
+        return self._binding_key_to_instance.get(binding_key, default)
+
+    def get_aliased_binding_keys(self, binding_keys):
+        """Returns the binding keys whose instances are among the given keys'.
+
+        The same instance can be memoized under several binding keys, e.g.,
+        when two arg names are bound to the same class.
+
+        Args:
+          binding_keys: a sequence of BindingKey
+        Returns:
+          the set of all binding keys memoizing the same instance as any of
+              binding_keys, including those of binding_keys that are memoized
+        """
+        with self._lock:
+            instance_ids = set(
+                id(self._binding_key_to_instance[binding_key])
+                for binding_key in binding_keys
+                if binding_key in self._binding_key_to_instance)
+            return set(
+                binding_key for binding_key, instance in
+                self._binding_key_to_instance.items()
+                if id(instance) in instance_ids)
+
+    def drop(self, binding_keys):
+        """Forgets the instances memoized for the given binding keys.
+
+        The instances will be provided anew the next time they're needed.
+
+        Args:
+          binding_keys: a sequence of BindingKey, possibly including some for
+              which nothing is memoized
+        """
+        binding_keys = set(binding_keys)
+        with self._lock:
+            self._per_key_provider.mark_stale(binding_keys)
+            for binding_key in binding_keys:
+                self._binding_key_to_instance.pop(binding_key, None)
+            self._binding_keys_in_creation_order = [
+                binding_key
+                for binding_key in self._binding_keys_in_creation_order
+                if binding_key in self._binding_key_to_instance]
+
+    def pop_instances(self):
+        """Forgets all memoized instances.
+
+        Returns:
+          the distinct instances that were memoized, in reverse creation
+              order, so that each comes before everything it depends on
+        """
+        return _get_instances(self.pop_binding_keys_and_instances())
+
+    def pop_binding_keys_and_instances(self):
+        """Forgets all memoized instances, like pop_instances().
+
+        Returns:
+          a list of (BindingKey, instance) pairs, for the instances that
+              pop_instances() would return, in the same order
+        """
+        with self._lock:
+            self._per_key_provider.mark_stale()
+            binding_keys_and_instances = _get_distinct_in_reverse(
+                [(binding_key, self._binding_key_to_instance[binding_key])
+                 for binding_key in self._binding_keys_in_creation_order])
+            self._binding_key_to_instance = {}
+            self._binding_keys_in_creation_order = []
+            return binding_keys_and_instances
+
+    def get_lock_metrics(self):
+        """Returns statistics about taking the scope's lock.
+
+        Each binding key has its own lock, in effect, which is only taken
+        to provide an instance that isn't memoized, so these show
+        contention when instances are first provided.  The wait is for
+        another thread providing the same instance, if any, and the hold is
+        the time spent providing the instance.
+
+        Returns:
+          a dict mapping the BindingKey of each binding key provided with
+              the lock to its LockMetrics, or an empty dict if the scope
+              doesn't record lock metrics
+        """
+        if self._lock_metrics_recorder is None:
+            return {}
+        return self._lock_metrics_recorder.get_metrics()
+
+    def reset_after_fork(self):
+        # The lock may have been held by another thread at fork time, and
+        # that thread doesn't exist in the child.
+        self._lock = threading.Lock()
+        if self._lock_metrics_recorder is not None:
+            self._lock_metrics_recorder.reset_after_fork()
+        # Whatever other threads were providing will never be provided.
+        self._per_key_provider = _PerKeyProvider(
+            self._lock, self._lock_metrics_recorder)
+
+
+class OverlaySingletonScope(object):
+    """Shares a parent singleton scope's instances, except for stale ones.
+
+    The instances for replaced binding keys, and the instances that the
+    parent provided with them (directly or indirectly), are stale.  Which
+    instances are stale is worked out again whenever the parent's
+    dependency index changes, so that stale instances that the parent
+    provides after the overlay is created aren't shared either.
+    Instances for stale binding keys, and for binding keys that the parent
+    scope hasn't memoized yet, are memoized separately, so that the parent
+    scope never holds instances created with an overlay's bindings.
+    Dropping binding keys makes them stale too.
+    """
+
+    def __init__(self, parent_scope, replaced_binding_keys,
+                 parent_dependency_index):
+        """Initializer.
+
+        Args:
+          parent_scope: a SingletonScope
+          replaced_binding_keys: the binding keys whose instances in
+              parent_scope, and the instances provided with them, must not
+              be shared
+          parent_dependency_index: the DependencyIndex recording what
+              parent_scope's instances were provided with
+        """
+        self._parent_scope = parent_scope
+        self._parent_dependency_index = parent_dependency_index
+        self._replaced_binding_keys = frozenset(replaced_binding_keys)
+        # This is replaced, never changed, so that it's read without a lock:
+        # the parent dependency index version that the stale binding keys
+        # were worked out for, and the stale binding keys.
+        self._version_and_stale_binding_keys = (None, frozenset())
+        self._stale_lock = threading.Lock()
+        self._own_scope = SingletonScope()
+
+    def provide(self, binding_key, default_provider_fn):
+        instance = self._own_scope.get_memoized(binding_key, _NOT_MEMOIZED)
+        if instance is _NOT_MEMOIZED:
+            instance = self._get_shared(binding_key)
+        if instance is not _NOT_MEMOIZED:
+            return instance
+        return self._own_scope.provide(binding_key, default_provider_fn)
+
+    def get_memoized(self, binding_key, default=None):
+        instance = self._own_scope.get_memoized(binding_key, _NOT_MEMOIZED)
+        if instance is _NOT_MEMOIZED:
+            instance = self._get_shared(binding_key)
+        return default if instance is _NOT_MEMOIZED else instance
+
+    def _get_shared(self, binding_key):
+        # The parent records what an instance depends on before memoizing
+        # it, so this looks it up before checking whether it's stale.
+        instance = self._parent_scope.get_memoized(binding_key, _NOT_MEMOIZED)
+        if (instance is _NOT_MEMOIZED or
+                binding_key in self._get_stale_binding_keys()):
+            return _NOT_MEMOIZED
+        return instance
+
+    def _get_stale_binding_keys(self):
+        version = self._parent_dependency_index.get_version()
+        stale_version, stale_binding_keys = (
+            self._version_and_stale_binding_keys)
+        if stale_version == version:
+            return stale_binding_keys
+        with self._stale_lock:
+            stale_binding_keys = (
+                self._replaced_binding_keys |
+                self._parent_scope.get_aliased_binding_keys(
+                    self._replaced_binding_keys))
+            stale_binding_keys |= (
+                self._parent_dependency_index.get_transitive_dependents(
+                    stale_binding_keys))
+            stale_binding_keys = frozenset(stale_binding_keys)
+            self._version_and_stale_binding_keys = (
+                version, stale_binding_keys)
+        return stale_binding_keys
+
+    def get_aliased_binding_keys(self, binding_keys):
+        return self._own_scope.get_aliased_binding_keys(binding_keys)
+
+    def freeze(self, allow_new_instances):
+        self._own_scope.freeze(allow_new_instances)
+
+    def drop(self, binding_keys):
+        # The parent's instances stay memoized in the parent, but are no
+        # longer shared.
+        with self._stale_lock:
+            self._replaced_binding_keys = self._replaced_binding_keys.union(
+                binding_keys)
+            self._version_and_stale_binding_keys = (None, frozenset())
+        self._own_scope.drop(binding_keys)
+
+    def pop_instances(self):
+        return self._own_scope.pop_instances()
+
+    def pop_binding_keys_and_instances(self):
+        return self._own_scope.pop_binding_keys_and_instances()
+
+    def reset_after_fork(self):
+        self._stale_lock = threading.Lock()
+        self._own_scope.reset_after_fork()
+
+
+class WeakSingletonScope(object):
+    """Shares an instance for as long as something else references it.
+
+    Instances are only weakly referenced, so once nothing else references
+    an instance, it is released, and the next time it's needed, it's
+    provided anew.  Providing an instance that's still referenced takes no
+    locks.
+    """
+
+    def __init__(self, record_lock_metrics=False):
+        """Initializer.
+
+        Args:
+          record_lock_metrics: whether to record how long providing each
+              binding key waits for, and holds, the scope's lock; see
+              get_lock_metrics()
+        """
+        self._binding_key_to_ref = {}
+        self._lock = threading.Lock()
+        self._lock_metrics_recorder = _new_lock_metrics_recorder(
+            record_lock_metrics)
+        self._per_key_provider = _PerKeyProvider(
+            self._lock, self._lock_metrics_recorder)
+
+    def provide(self, binding_key, default_provider_fn):
+        instance = self._get_live_instance(binding_key)
+        if instance is not None:
+            return instance
+        return self._per_key_provider.provide(
+            binding_key, default_provider_fn, self._get_memoized_locked,
+            self._memoize_locked)
+
+    def _get_memoized_locked(self, binding_key):
+        instance = self._get_live_instance(binding_key)
+        return _NOT_MEMOIZED if instance is None else instance
+
+    def _memoize_locked(self, binding_key, instance):
+        try:
+            # Dead references are left in place until replaced: there's at
+            # most one per binding key.
+            self._binding_key_to_ref[binding_key] = weakref.ref(instance)
+        except TypeError:
+            raise errors.UnweakrefableInstanceError(
+                binding_key, type(instance))
+
+    def _get_live_instance(self, binding_key):
+        ref = self._binding_key_to_ref.get(binding_key)
+        if ref is None:
+            return None
+        return ref()
+
+    def drop(self, binding_keys):
+        """Forgets the instances memoized for the given binding keys.
+
+        Args:
+          binding_keys: a sequence of BindingKey, possibly including some for
+              which nothing is memoized
+        """
+        binding_keys = set(binding_keys)
+        with self._lock:
+            self._per_key_provider.mark_stale(binding_keys)
+            for binding_key in binding_keys:
+                self._binding_key_to_ref.pop(binding_key, None)
+
+    def pop_instances(self):
+        """Forgets all memoized instances.
+
+        Returns:
+          the distinct instances that are still referenced elsewhere
+        """
+        return _get_instances(self.pop_binding_keys_and_instances())
+
+    def pop_binding_keys_and_instances(self):
+        """Forgets all memoized instances, like pop_instances().
+
+        Returns:
+          a list of (BindingKey, instance) pairs, for the instances that
+              pop_instances() would return, in the same order
+        """
+        with self._lock:
+            self._per_key_provider.mark_stale()
+            binding_keys_and_refs = list(self._binding_key_to_ref.items())
+            self._binding_key_to_ref = {}
+        return _get_distinct_in_reverse(
+            [(binding_key, instance) for binding_key, instance in (
+                (binding_key, ref()) for binding_key, ref
+                in binding_keys_and_refs)
+             if instance is not None])
+
+    def get_lock_metrics(self):
+        """Returns statistics about taking the scope's lock.
+
+        Each binding key has its own lock, in effect, which is only taken
+        to provide an instance that isn't still referenced, so these show
+        contention when instances are provided anew.  The wait is for
+        another thread providing the same instance, if any, and the hold is
+        the time spent providing the instance.
+
+        Returns:
+          a dict mapping the BindingKey of each binding key provided with
+              the lock to its LockMetrics, or an empty dict if the scope
+              doesn't record lock metrics
+        """
+        if self._lock_metrics_recorder is None:
+            return {}
+        return self._lock_metrics_recorder.get_metrics()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        if self._lock_metrics_recorder is not None:
+            self._lock_metrics_recorder.reset_after_fork()
+        self._per_key_provider = _PerKeyProvider(
+            self._lock, self._lock_metrics_recorder)
+
+
+class _Request(object):
+
+    def __init__(self):
+        self.binding_key_to_instance = {}
+        self.binding_keys_and_instances_in_creation_order = []
+        self.lock = threading.Lock()
+        self.per_key_provider = _PerKeyProvider(
+            self.lock, lock_metrics_recorder=None)
+
+    def get_memoized_locked(self, binding_key):
+        return self.binding_key_to_instance.get(binding_key, _NOT_MEMOIZED)
+
+    def memoize_locked(self, binding_key, instance):
+        self.binding_key_to_instance[binding_key] = instance
+        self.binding_keys_and_instances_in_creation_order.append(
+            (binding_key, instance))
+
+    def drop(self, binding_keys):
+        with self.lock:
+            self.per_key_provider.mark_stale(binding_keys)
+            for binding_key in binding_keys:
+                self.binding_key_to_instance.pop(binding_key, None)
+
+    def reset_after_fork(self):
+        self.lock = threading.Lock()
+        self.per_key_provider = _PerKeyProvider(
+            self.lock, lock_metrics_recorder=None)
+
+
+class _ThreadLocalVar(object):
+    """A stand-in for contextvars.ContextVar, where that doesn't exist."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, default=None):
+        return getattr(self._local, 'value', default)
+
+    def set(self, value):
+        token = self.get()
+        self._local.value = value
+        return token
+
+    def reset(self, token):
+        self._local.value = token
+
+
+def _new_context_var(name):
+    if contextvars is not None:
+        return contextvars.ContextVar(name, default=None)
+    return _ThreadLocalVar()
+
+
+class RequestScope(object):
+    """Memoizes instances for the duration of a request.
+
+    The current request is held in a context variable, so it follows both
+    threads and asyncio tasks (where contextvars is unavailable, it is only
+    thread-local).  Requests may be nested.
+    """
+
+    def __init__(self):
+        self._current_request = _new_context_var('pinject_request')
+        self._active_requests = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def enter(self):
+        """Starts a request in the current context.
+
+        Returns:
+          a token to pass to exit()
+        """
+        request = _Request()
+        with self._lock:
+            self._active_requests.add(request)
+        return self._current_request.set(request)
+
+    def exit(self, token):
+        """Ends the request started by the enter() that returned token.
+
+        Args:
+          token: what enter() returned
+        Returns:
+          the instances memoized during the request, in reverse creation
+              order, so that each comes before everything it depends on
+        """
+        request = self._current_request.get()
+        self._current_request.reset(token)
+        with self._lock:
+            self._active_requests.discard(request)
+        with request.lock:
+            return _get_instances(_get_distinct_in_reverse(
+                request.binding_keys_and_instances_in_creation_order))
+
+    def is_in_request(self):
+        return self._current_request.get() is not None
+
+    def provide(self, binding_key, default_provider_fn):
+        request = self._current_request.get()
+        if request is None:
+            raise errors.NoActiveRequestError(binding_key)
+        instance = request.binding_key_to_instance.get(
+            binding_key, _NOT_MEMOIZED)
+        if instance is not _NOT_MEMOIZED:
+            return instance
+        return request.per_key_provider.provide(
+            binding_key, default_provider_fn, request.get_memoized_locked,
+            request.memoize_locked)
+
+    def drop(self, binding_keys):
+        """Forgets the instances memoized for binding keys in all requests.
+
+        The instances will be provided anew the next time they're needed,
+        but are still closed when their requests exit.
+
+        Args:
+          binding_keys: a sequence of BindingKey, possibly including some for
+              which nothing is memoized
+        """
+        binding_keys = set(binding_keys)
+        with self._lock:
+            requests = list(self._active_requests)
+        for request in requests:
+            request.drop(binding_keys)
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        with self._lock:
+            requests = list(self._active_requests)
+        for request in requests:
+            request.reset_after_fork()
+
+
+class _ThreadInstances(object):
+
+    def __init__(self):
+        self.binding_key_to_instance = {}
+        self.binding_keys_and_instances_in_creation_order = []
+        self.close_all_fn = None
+        # This changes whenever instances are dropped, so that an instance
+        # being provided meanwhile isn't memoized.
+        self.num_drops = 0
+
+    def memoize(self, binding_key, instance, num_drops):
+        # An instance provided while instances were dropped is still closed
+        # when the thread exits, but isn't memoized.
+        if self.num_drops == num_drops:
+            self.binding_key_to_instance[binding_key] = instance
+        self.binding_keys_and_instances_in_creation_order.append(
+            (binding_key, instance))
+
+    def drop(self, binding_keys):
+        self.num_drops += 1
+        for binding_key in binding_keys:
+            self.binding_key_to_instance.pop(binding_key, None)
+
+    def pop_binding_keys_and_instances(self):
+        binding_keys_and_instances = _get_distinct_in_reverse(
+            self.binding_keys_and_instances_in_creation_order)
+        self.binding_key_to_instance = {}
+        self.binding_keys_and_instances_in_creation_order = []
+        return binding_keys_and_instances
+
+    def __del__(self):
+        # This runs when the thread owning these instances exits, since its
+        # thread-local storage is then released.
+        if (self.close_all_fn is not None and
+                self.binding_keys_and_instances_in_creation_order):
+            self.close_all_fn(
+                _get_instances(self.pop_binding_keys_and_instances()))
+
+
+class ThreadScope(object):
+    """Memoizes a separate instance for each thread.
+
+    Providing an already memoized instance takes no locks.  When a thread
+    exits, the instances memoized for it are closed (if a closer was set)
+    and released.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._close_all_fn = None
+        self._all_thread_instances = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def set_closer(self, closer):
+        self._close_all_fn = closer.close_all
+        with self._lock:
+            for thread_instances in self._all_thread_instances:
+                thread_instances.close_all_fn = closer.close_all
+
+    def provide(self, binding_key, default_provider_fn):
+        thread_instances = getattr(self._local, 'instances', None)
+        if thread_instances is None:
+            thread_instances = _ThreadInstances()
+            thread_instances.close_all_fn = self._close_all_fn
+            self._local.instances = thread_instances
+            with self._lock:
+                self._all_thread_instances.add(thread_instances)
+        try:
+            return thread_instances.binding_key_to_instance[binding_key]
+        except KeyError:
+            num_drops = thread_instances.num_drops
+            instance = default_provider_fn()
+            thread_instances.memoize(binding_key, instance, num_drops)
+            return instance
+
+    def drop(self, binding_keys):
+        """Forgets the instances memoized for binding keys in all threads.
+
+        The instances will be provided anew the next time they're needed,
+        but are still closed when their threads exit.
+
+        Args:
+          binding_keys: a sequence of BindingKey, possibly including some for
+              which nothing is memoized
+        """
+        binding_keys = set(binding_keys)
+        with self._lock:
+            for thread_instances in self._all_thread_instances:
+                thread_instances.drop(binding_keys)
+
+    def pop_instances(self):
+        """Forgets the instances memoized for all threads.
+
+        This should only be called once the threads are done using them.
+
+        Returns:
+          the distinct instances that were memoized, in reverse creation
+              order within each thread
+        """
+        return _get_instances(self.pop_binding_keys_and_instances())
+
+    def pop_binding_keys_and_instances(self):
+        """Forgets the instances for all threads, like pop_instances().
+
+        Returns:
+          a list of (BindingKey, instance) pairs, for the instances that
+              pop_instances() would return, in the same order
+        """
+        with self._lock:
+            all_thread_instances = list(self._all_thread_instances)
+        binding_keys_and_instances = []
+        for thread_instances in all_thread_instances:
+            binding_keys_and_instances.extend(
+                thread_instances.pop_binding_keys_and_instances())
+        return binding_keys_and_instances
+
+
+class PoolMetrics(object):
+    """Statistics about one pool of a PoolScope."""
+
+    def __init__(self, in_use, idle, num_waits, total_wait_secs,
+                 max_wait_secs, num_timeouts):
+        self.in_use = in_use
+        self.idle = idle
+        self.num_waits = num_waits
+        self.total_wait_secs = total_wait_secs
+        self.max_wait_secs = max_wait_secs
+        self.num_timeouts = num_timeouts
+
+    def __repr__(self):
+        return (
+            '<PoolMetrics in_use={0} idle={1} num_waits={2}'
+            ' total_wait_secs={3:.6f} max_wait_secs={4:.6f}'
+            ' num_timeouts={5}>'.format(
+                self.in_use, self.idle, self.num_waits, self.total_wait_secs,
+                self.max_wait_secs, self.num_timeouts))
+
+
+class _Pool(object):
+
+    def __init__(self, binding_key, max_size, timeout_secs):
+        self._binding_key = binding_key
+        self._max_size = max_size
+        self._timeout_secs = timeout_secs
+        self._idle_instances = []
+        self._num_in_use = 0
+        self._num_waits = 0
+        self._total_wait_secs = 0.0
+        self._max_wait_secs = 0.0
+        self._num_timeouts = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, default_provider_fn):
+        with self._condition:
+            if (not self._idle_instances and
+                    self._num_in_use + len(self._idle_instances) >=
+                    self._max_size):
+                self._wait_for_instance()
+            self._num_in_use += 1
+            if self._idle_instances:
+                return self._idle_instances.pop()
+        # Creating the instance happens outside the lock, so that other
+        # threads can return instances meanwhile.
+        try:
+            return default_provider_fn()
+        except BaseException:
+            with self._condition:
+                self._num_in_use -= 1
+                self._condition.notify()
+            raise
+
+    def _wait_for_instance(self):
+        start_time = time.time()
+        if self._timeout_secs is not None:
+            deadline = start_time + self._timeout_secs
+        while (not self._idle_instances and
+               self._num_in_use >= self._max_size):
+            if self._timeout_secs is None:
+                self._condition.wait()
+                continue
+            remaining_secs = deadline - time.time()
+            if remaining_secs <= 0:
+                self._num_timeouts += 1
+                raise errors.PoolTimeoutError(
+                    self._binding_key, self._max_size, self._timeout_secs)
+            self._condition.wait(remaining_secs)
+        wait_secs = time.time() - start_time
+        self._num_waits += 1
+        self._total_wait_secs += wait_secs
+        self._max_wait_secs = max(self._max_wait_secs, wait_secs)
+
+    def release(self, instance):
+        with self._condition:
+            self._num_in_use -= 1
+            self._idle_instances.append(instance)
+            self._condition.notify()
+
+    def pop_idle_binding_keys_and_instances(self):
+        with self._condition:
+            idle_instances = self._idle_instances
+            self._idle_instances = []
+            return [(self._binding_key, instance)
+                    for instance in idle_instances]
+
+    def get_metrics(self):
+        with self._condition:
+            return PoolMetrics(
+                self._num_in_use, len(self._idle_instances), self._num_waits,
+                self._total_wait_secs, self._max_wait_secs,
+                self._num_timeouts)
+
+
+class _Lease(object):
+
+    def __init__(self, current_lease):
+        self._current_lease = current_lease
+        self._token = None
+        self.binding_key_to_instance = {}
+        self.pools_and_instances = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self._token = self._current_lease.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._current_lease.reset(self._token)
+        with self.lock:
+            pools_and_instances = self.pools_and_instances
+            self.pools_and_instances = []
+            self.binding_key_to_instance = {}
+        for pool, instance in reversed(pools_and_instances):
+            pool.release(instance)
+
+
+class PoolScope(object):
+    """Lends out instances from bounded pools, one pool per binding key.
+
+    Instances can only be provided within a lease, i.e., within a
+    lease() with-block, and are returned to their pools when the block
+    exits.  Within a lease, the same instance is provided for a binding key
+    each time.  Up to max_size instances are created for each binding key,
+    as they're needed; when all of them are in use, providing waits for one
+    to be returned.
+    """
+
+    def __init__(self, max_size, timeout_secs=None):
+        """Initializer.
+
+        Args:
+          max_size: the maximum number of instances for each binding key
+          timeout_secs: how long to wait for an instance to be returned
+              before raising PoolTimeoutError; if None (the default), then
+              wait indefinitely
+        """
+        self._max_size = max_size
+        self._timeout_secs = timeout_secs
+        self._binding_key_to_pool = {}
+        self._lock = threading.Lock()
+        self._current_lease = _new_context_var('pinject_pool_lease')
+
+    def lease(self):
+        """Returns a context manager within which instances are leased."""
+        return _Lease(self._current_lease)
+
+    def provide(self, binding_key, default_provider_fn):
+        lease = self._current_lease.get()
+        if lease is None:
+            raise errors.NoActivePoolLeaseError(binding_key)
+        try:
+            return lease.binding_key_to_instance[binding_key]
+        except KeyError:
+            pass
+        pool = self._get_pool(binding_key)
+        instance = pool.acquire(default_provider_fn)
+        with lease.lock:
+            lease.binding_key_to_instance[binding_key] = instance
+            lease.pools_and_instances.append((pool, instance))
+        return instance
+
+    def _get_pool(self, binding_key):
+        try:
+            return self._binding_key_to_pool[binding_key]
+        except KeyError:
+            with self._lock:
+                if binding_key not in self._binding_key_to_pool:
+                    self._binding_key_to_pool[binding_key] = _Pool(
+                        binding_key, self._max_size, self._timeout_secs)
+                return self._binding_key_to_pool[binding_key]
+
+    def get_metrics(self):
+        """Returns statistics about the pools.
+
+        Returns:
+          a dict mapping the BindingKey of each pool to its PoolMetrics
+        """
+        with self._lock:
+            binding_key_to_pool = dict(self._binding_key_to_pool)
+        return {binding_key: pool.get_metrics()
+                for binding_key, pool in binding_key_to_pool.items()}
+
+    def pop_instances(self):
+        """Forgets the idle instances in all pools.
+
+        Instances in use are not affected; they go back to their pools when
+        their leases end.
+
+        Returns:
+          the idle instances
+        """
+        return _get_instances(self.pop_binding_keys_and_instances())
+
+    def pop_binding_keys_and_instances(self):
+        """Forgets the idle instances in all pools, like pop_instances().
+
+        Returns:
+          a list of (BindingKey, instance) pairs, for the instances that
+              pop_instances() would return, in the same order
+        """
+        with self._lock:
+            pools = list(self._binding_key_to_pool.values())
+        binding_keys_and_instances = []
+        for pool in pools:
+            binding_keys_and_instances.extend(
+                pool.pop_idle_binding_keys_and_instances())
+        return binding_keys_and_instances
+
+
+def _get_time():
+    # time.monotonic() isn't affected by system clock changes, but doesn't
+    # exist in Python 2.
+    return getattr(time, 'monotonic', time.time)()
+
+
+class _CacheEntry(object):
+
+    def __init__(self, instance, creation_num, creation_time, weight):
+        self.instance = instance
+        self.creation_num = creation_num
+        self.creation_time = creation_time
+        self.weight = weight
+
+
+class CacheScope(object):
+    """Memoizes instances per binding key and direct args, within limits.
+
+    This sits between SINGLETON and PROTOTYPE: instances are reused, but
+    only up to max_entries of them are kept, each for up to max_age_secs,
+    and only while their total weight is at most max_weight.  The least
+    recently used instances are evicted first.  Evicted instances are
+    simply forgotten, not closed, since whatever they were injected into
+    may still be using them.
+
+    When an instance is provided through a provider function that is
+    passed direct args (e.g., provide_client(region='eu')), a separate
+    instance is memoized for each distinct set of args.  If any of the args
+    is unhashable, the instance is provided anew without being memoized.
+    """
+
+    def __init__(self, max_entries=None, max_age_secs=None, max_weight=None,
+                 get_weight_fn=None, record_lock_metrics=False):
+        """Initializer.
+
+        Args:
+          max_entries: the maximum number of instances to keep, or None
+              for no limit
+          max_age_secs: how long after its creation to keep an instance, or
+              None for no limit
+          max_weight: the maximum total weight of the instances to keep, or
+              None for no limit
+          get_weight_fn: a function taking a provided instance and returning
+              its weight (e.g., its approximate size in bytes); if None
+              (the default), each instance weighs 1
+          record_lock_metrics: whether to record how long providing each
+              binding key waits for, and holds, the scope's lock; see
+              get_lock_metrics()
+        """
+        self._max_entries = max_entries
+        self._max_age_secs = max_age_secs
+        self._max_weight = max_weight
+        if get_weight_fn is None:
+            get_weight_fn = lambda instance: 1
+        self._get_weight_fn = get_weight_fn
+        # Ordered from least to most recently used.
+        self._key_to_entry = collections.OrderedDict()
+        self._total_weight = 0
+        self._num_creations = 0
+        self._lock = threading.Lock()
+        self._lock_metrics_recorder = _new_lock_metrics_recorder(
+            record_lock_metrics)
+        self._per_key_provider = _PerKeyProvider(
+            self._lock, self._lock_metrics_recorder)
+
+    def provide(self, binding_key, default_provider_fn):
+        return self._per_key_provider.provide(
+            binding_key, default_provider_fn, self._get_memoized_locked,
+            self._memoize_locked)
+
+    def provide_with_direct_args(self, binding_key, direct_pargs,
+                                 direct_kwargs, default_provider_fn):
+        """Provides an instance, memoized for the binding key and direct args.
+
+        Args:
+          binding_key: a BindingKey
+          direct_pargs: the positional args passed to the provider function
+          direct_kwargs: the keyword args passed to the provider function
+          default_provider_fn: a function taking no args, returning a new
+              instance
+        Returns:
+          a memoized or new instance
+        """
+        direct_args_binding_key = binding_keys_lib.new_with_direct_args(
+            binding_key, direct_pargs, direct_kwargs)
+        if direct_args_binding_key is None:
+            return default_provider_fn()
+        return self.provide(direct_args_binding_key, default_provider_fn)
+
+    def _get_memoized_locked(self, binding_key):
+        entry = self._key_to_entry.pop(binding_key, None)
+        if entry is None:
+            return _NOT_MEMOIZED
+        if self._is_expired(entry):
+            self._total_weight -= entry.weight
+            return _NOT_MEMOIZED
+        # Reinserting the entry marks it as most recently used.
+        self._key_to_entry[binding_key] = entry
+        return entry.instance
+
+    def _memoize_locked(self, binding_key, instance):
+        self._num_creations += 1
+        entry = _CacheEntry(instance, self._num_creations, _get_time(),
+                            self._get_weight_fn(instance))
+        self._key_to_entry[binding_key] = entry
+        self._total_weight += entry.weight
+        self._evict()
+
+    def _is_expired(self, entry):
+        return (self._max_age_secs is not None and
+                _get_time() - entry.creation_time > self._max_age_secs)
+
+    def _evict(self):
+        while self._key_to_entry:
+            lru_key = next(iter(self._key_to_entry))
+            lru_entry = self._key_to_entry[lru_key]
+            if not (self._is_expired(lru_entry) or
+                    (self._max_entries is not None and
+                     len(self._key_to_entry) > self._max_entries) or
+                    (self._max_weight is not None and
+                     self._total_weight > self._max_weight)):
+                break
+            del self._key_to_entry[lru_key]
+            self._total_weight -= lru_entry.weight
+
+    def get_num_entries(self):
+        with self._lock:
+            return len(self._key_to_entry)
+
+    def drop(self, binding_keys):
+        """Forgets the instances memoized for the given binding keys.
+
+        Args:
+          binding_keys: a sequence of BindingKey, possibly including some for
+              which nothing is memoized
+        """
+        binding_keys = set(binding_keys)
+        with self._lock:
+            self._per_key_provider.mark_stale(binding_keys)
+            for binding_key in list(self._key_to_entry):
+                if binding_key.without_direct_args() in binding_keys:
+                    self._total_weight -= self._key_to_entry.pop(
+                        binding_key).weight
+
+    def pop_instances(self):
+        """Forgets all memoized instances.
+
+        Returns:
+          the distinct instances that were memoized, in reverse creation
+              order, so that each comes before everything it depends on
+        """
+        return _get_instances(self.pop_binding_keys_and_instances())
+
+    def pop_binding_keys_and_instances(self):
+        """Forgets all memoized instances, like pop_instances().
+
+        Returns:
+          a list of (BindingKey, instance) pairs, for the instances that
+              pop_instances() would return, in the same order; the binding
+              keys don't include any direct args
+        """
+        with self._lock:
+            self._per_key_provider.mark_stale()
+            keys_and_entries = sorted(
+                self._key_to_entry.items(),
+                key=lambda key_and_entry: key_and_entry[1].creation_num)
+            self._key_to_entry = collections.OrderedDict()
+            self._total_weight = 0
+            return _get_distinct_in_reverse(
+                [(binding_key.without_direct_args(), entry.instance)
+                 for binding_key, entry in keys_and_entries])
+
+    def get_lock_metrics(self):
+        """Returns statistics about taking the scope's lock.
+
+        The lock is briefly taken to provide every instance, memoized or
+        not, but isn't held while providing.  The wait is for the lock and
+        for another thread providing the same instance, if any, and the hold
+        is the time spent providing the instance (zero if it was memoized).
+
+        Returns:
+          a dict mapping the BindingKey of each binding key provided with
+              the lock to its LockMetrics, or an empty dict if the scope
+              doesn't record lock metrics
+        """
+        if self._lock_metrics_recorder is None:
+            return {}
+        return self._lock_metrics_recorder.get_metrics()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        if self._lock_metrics_recorder is not None:
+            self._lock_metrics_recorder.reset_after_fork()
+        self._per_key_provider = _PerKeyProvider(
+            self._lock, self._lock_metrics_recorder)
+
+
+class _Partition(object):
+
+    def __init__(self):
+        self.binding_key_to_instance = {}
+        self.binding_keys_and_instances_in_creation_order = []
+        self.weight = 0
+        # The part of weight included in the scope's total weight, which is
+        # updated separately, with the scope's lock held.
+        self.counted_weight = 0
+        self.num_active_blocks = 0
+        # Whether the partition has been removed from its scope.  Instances
+        # provided in it since are closed when its last block exits.
+        self.is_evicted = False
+        self.lock = threading.Lock()
+        self.per_key_provider = _PerKeyProvider(
+            self.lock, lock_metrics_recorder=None)
+
+    def get_memoized_locked(self, binding_key):
+        return self.binding_key_to_instance.get(binding_key, _NOT_MEMOIZED)
+
+    def drop(self, binding_keys):
+        with self.lock:
+            self.per_key_provider.mark_stale(binding_keys)
+            for binding_key in binding_keys:
+                self.binding_key_to_instance.pop(binding_key, None)
+
+    def reset_after_fork(self):
+        self.lock = threading.Lock()
+        self.per_key_provider = _PerKeyProvider(
+            self.lock, lock_metrics_recorder=None)
+
+
+class _TenantBlock(object):
+
+    def __init__(self, tenant_scope, tenant_key):
+        self._tenant_scope = tenant_scope
+        self._tenant_key = tenant_key
+        self._partition = None
+        self._token = None
+
+    def __enter__(self):
+        self._partition, evicted_instances = self._tenant_scope._enter(
+            self._tenant_key)
+        self._token = self._tenant_scope._current_partition.set(
+            self._partition)
+        try:
+            self._tenant_scope._close_all(evicted_instances)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._tenant_scope._current_partition.reset(self._token)
+        self._tenant_scope._close_all(
+            self._tenant_scope._exit(self._partition))
+
+
+class TenantScope(object):
+    """Memoizes singletons separately for each tenant.
+
+    Instances can only be provided within a tenant() with-block, and are
+    memoized in that tenant's partition.  The current tenant is held in a
+    context variable, like the current request in RequestScope.  Each
+    partition has its own lock, so tenants don't contend with each other.
+
+    When there are more than max_tenants partitions, or the total weight of
+    all instances exceeds max_weight, whole partitions are evicted, least
+    recently used first, and their instances are closed (if a closer was
+    set).  Partitions whose tenant() with-blocks are active are never
+    evicted.
+    """
+
+    def __init__(self, max_tenants=None, max_weight=None, get_weight_fn=None):
+        """Initializer.
+
+        Args:
+          max_tenants: the maximum number of partitions to keep, or None for
+              no limit
+          max_weight: the maximum total weight of the instances in all
+              partitions, or None for no limit
+          get_weight_fn: a function taking a provided instance and returning
+              its weight (e.g., its approximate size in bytes); if None
+              (the default), each instance weighs 1
+        """
+        self._max_tenants = max_tenants
+        self._max_weight = max_weight
+        if get_weight_fn is None:
+            get_weight_fn = lambda instance: 1
+        self._get_weight_fn = get_weight_fn
+        # Ordered from least to most recently used.
+        self._tenant_key_to_partition = collections.OrderedDict()
+        self._total_weight = 0
+        self._lock = threading.Lock()
+        self._current_partition = _new_context_var('pinject_tenant')
+        self._close_all_fn = None
+
+    def set_closer(self, closer):
+        self._close_all_fn = closer.close_all
+
+    def tenant(self, tenant_key):
+        """Returns a context manager within which to provide for a tenant.
+
+        Args:
+          tenant_key: a hashable identifying the tenant
+        """
+        return _TenantBlock(self, tenant_key)
+
+    def provide(self, binding_key, default_provider_fn):
+        partition = self._current_partition.get()
+        if partition is None:
+            raise errors.NoActiveTenantError(binding_key)
+        instance = partition.binding_key_to_instance.get(
+            binding_key, _NOT_MEMOIZED)
+        if instance is not _NOT_MEMOIZED:
+            return instance
+        weights = []
+        def MemoizeLocked(binding_key, instance):
+            weight = self._get_weight_fn(instance)
+            partition.binding_key_to_instance[binding_key] = instance
+            partition.binding_keys_and_instances_in_creation_order.append(
+                (binding_key, instance))
+            partition.weight += weight
+            weights.append(weight)
+        instance = partition.per_key_provider.provide(
+            binding_key, default_provider_fn, partition.get_memoized_locked,
+            MemoizeLocked)
+        if weights:
+            # The total weight is updated after releasing the partition's
+            # lock, since the scope's lock is taken before partitions' locks.
+            with self._lock:
+                if partition.is_evicted:
+                    return instance
+                partition.counted_weight += weights[0]
+                self._total_weight += weights[0]
+                evicted_instances = self._pop_evicted_instances()
+            self._close_all(evicted_instances)
+        return instance
+
+    def _enter(self, tenant_key):
+        with self._lock:
+            partition = self._tenant_key_to_partition.pop(tenant_key, None)
+            if partition is None:
+                partition = _Partition()
+            partition.num_active_blocks += 1
+            # Reinserting the partition marks it as most recently used.
+            self._tenant_key_to_partition[tenant_key] = partition
+            return partition, self._pop_evicted_instances()
+
+    def _exit(self, partition):
+        with self._lock:
+            partition.num_active_blocks -= 1
+            evicted_instances = self._pop_evicted_instances()
+            if partition.is_evicted and not partition.num_active_blocks:
+                evicted_instances.extend(_get_instances(
+                    self._pop_partition(partition)))
+            return evicted_instances
+
+    def _pop_evicted_instances(self):
+        # This must be called with self._lock held.
+        evicted_instances = []
+        for tenant_key, partition in list(
+                self._tenant_key_to_partition.items()):
+            if not ((self._max_tenants is not None and
+                     len(self._tenant_key_to_partition) > self._max_tenants) or
+                    (self._max_weight is not None and
+                     self._total_weight > self._max_weight)):
+                break
+            if partition.num_active_blocks:
+                continue
+            del self._tenant_key_to_partition[tenant_key]
+            evicted_instances.extend(_get_instances(
+                self._pop_partition(partition)))
+        return evicted_instances
+
+    def _pop_partition(self, partition):
+        # This must be called with self._lock held, once partition has been
+        # removed from self._tenant_key_to_partition.
+        partition.is_evicted = True
+        self._total_weight -= partition.counted_weight
+        partition.counted_weight = 0
+        with partition.lock:
+            partition.per_key_provider.mark_stale()
+            binding_keys_and_instances = _get_distinct_in_reverse(
+                partition.binding_keys_and_instances_in_creation_order)
+            partition.binding_key_to_instance = {}
+            partition.binding_keys_and_instances_in_creation_order = []
+            partition.weight = 0
+            return binding_keys_and_instances
+
+    def _close_all(self, instances):
+        if instances and self._close_all_fn is not None:
+            self._close_all_fn(instances)
+
+    def evict(self, tenant_key):
+        """Closes and forgets the instances memoized for a tenant.
+
+        This should only be called once the tenant is done using them, e.g.,
+        when offboarding the tenant.  Anything provided for the tenant in
+        tenant() with-blocks that were already active is closed when the
+        last of them exits.
+
+        Args:
+          tenant_key: a hashable identifying the tenant
+        """
+        with self._lock:
+            partition = self._tenant_key_to_partition.pop(tenant_key, None)
+            if partition is None:
+                return
+            instances = _get_instances(
+                self._pop_partition(partition))
+        self._close_all(instances)
+
+    def drop(self, binding_keys):
+        """Forgets the instances memoized for binding keys for all tenants.
+
+        The instances will be provided anew the next time they're needed,
+        but are still closed, and still count towards their tenants'
+        weights, until their partitions are evicted.
+
+        Args:
+          binding_keys: a sequence of BindingKey, possibly including some for
+              which nothing is memoized
+        """
+        binding_keys = set(binding_keys)
+        with self._lock:
+            for partition in self._tenant_key_to_partition.values():
+                partition.drop(binding_keys)
+
+    def get_tenant_weights(self):
+        """Returns the total weight of the instances memoized per tenant.
+
+        Returns:
+          a dict mapping each tenant key to the total weight of the
+              instances in its partition
+        """
+        with self._lock:
+            return {tenant_key: partition.weight for tenant_key, partition
+                    in self._tenant_key_to_partition.items()}
+
+    def pop_instances(self):
+        """Forgets the instances memoized for all tenants.
+
+        Returns:
+          the distinct instances that were memoized, in reverse creation
+              order within each partition
+        """
+        return _get_instances(self.pop_binding_keys_and_instances())
+
+    def pop_binding_keys_and_instances(self):
+        """Forgets the instances for all tenants, like pop_instances().
+
+        Returns:
+          a list of (BindingKey, instance) pairs, for the instances that
+              pop_instances() would return, in the same order
+        """
+        with self._lock:
+            partitions = list(self._tenant_key_to_partition.values())
+            self._tenant_key_to_partition = collections.OrderedDict()
+            binding_keys_and_instances = []
+            for partition in partitions:
+                binding_keys_and_instances.extend(
+                    self._pop_partition(partition))
+            return binding_keys_and_instances
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        for partition in self._tenant_key_to_partition.values():
+            partition.reset_after_fork()
+
+
+def _get_distinct_in_reverse(binding_keys_and_instances):
+    # The same instance can be memoized under several binding keys.
+    distinct_binding_keys_and_instances = []
+    instance_ids = set()
+    for binding_key, instance in reversed(binding_keys_and_instances):
+        if id(instance) not in instance_ids:
+            instance_ids.add(id(instance))
+            distinct_binding_keys_and_instances.append(
+                (binding_key, instance))
+    return distinct_binding_keys_and_instances
+
+
+def _get_instances(binding_keys_and_instances):
+    return [instance for _, instance in binding_keys_and_instances]
 
 
 class _UnscopedScopeId(object):
@@ -72,7 +1611,25 @@ class _UnscopedScopeId(object):
 UNSCOPED = _UnscopedScopeId()
 
 
-def get_id_to_scope_with_defaults(id_to_scope=None):
+def is_built_in_memoizing_scope(scope):
+    """Returns whether scope is a built-in scope memoizing for the graph.
+
+    Instances provided in these scopes stay memoized until dropped, so a
+    batch of instances may share them without providing them again.
+    Custom scopes may not memoize, or may evict what they memoize at any
+    time.
+
+    Args:
+      scope: a scope
+    Returns:
+      True iff scope is a singleton or weak singleton scope
+    """
+    return isinstance(
+        scope, (SingletonScope, OverlaySingletonScope, WeakSingletonScope))
+
+
+def get_id_to_scope_with_defaults(id_to_scope=None,
+                                  record_lock_metrics=False):
     if id_to_scope is not None:
         for scope_id in _BUILTIN_SCOPES:
             if scope_id in id_to_scope:
@@ -81,15 +1638,115 @@ def get_id_to_scope_with_defaults(id_to_scope=None):
     else:
         id_to_scope = {}
     id_to_scope[PROTOTYPE] = PrototypeScope()
-    id_to_scope[SINGLETON] = SingletonScope()
+    id_to_scope[SINGLETON] = SingletonScope(record_lock_metrics)
+    id_to_scope[REQUEST] = RequestScope()
+    id_to_scope[THREAD] = ThreadScope()
+    id_to_scope[WEAK_SINGLETON] = WeakSingletonScope(record_lock_metrics)
     return id_to_scope
 
 
+class _QualifyingScope(object):
+    """Provides a graph's instances in a scope shared with its parent graph.
+
+    What a child object graph provides with its own bindings is memoized in
+    the shared scope under binding keys qualified by the child, so that it's
+    never provided in place of what the parent provides for the same keys.
+    """
+
+    def __init__(self, scope, qualifier):
+        self._scope = scope
+        self._qualifier = qualifier
+        if hasattr(scope, 'provide_with_direct_args'):
+            self.provide_with_direct_args = self._provide_with_direct_args
+
+    def provide(self, binding_key, default_provider_fn):
+        return self._scope.provide(
+            binding_keys_lib.new_qualified(binding_key, self._qualifier),
+            default_provider_fn)
+
+    def _provide_with_direct_args(self, binding_key, direct_pargs,
+                                  direct_kwargs, default_provider_fn):
+        return self._scope.provide_with_direct_args(
+            binding_keys_lib.new_qualified(binding_key, self._qualifier),
+            direct_pargs, direct_kwargs, default_provider_fn)
+
+
 # TODO(kurts): either make this class pull its weight, or delete it.
 class BindableScopes(object):
 
-    def __init__(self, id_to_scope):
+    def __init__(self, id_to_scope, parent=None):
         self._id_to_scope = id_to_scope
+        self._parent = parent
+        # The parent's scopes, wrapped to memoize this graph's instances
+        # separately.  Keys are qualified by a token rather than by self,
+        # so that the parent's scopes don't keep this graph's scopes alive.
+        self._id_to_qualifying_scope = {}
+        self._qualifier = object()
 
     def get_sub_scope(self, binding):
-        return self._id_to_scope[binding.scope_id]
+        """Returns the scope to provide a binding's instances in.
+
+        For a child's binding in a scope it shares with its parent, the
+        instances are memoized separately from the parent's.
+        """
+        scope_id = binding.scope_id
+        if self._parent is None or scope_id in self._id_to_scope:
+            return self._id_to_scope[scope_id]
+        scope = self._id_to_qualifying_scope.get(scope_id)
+        if scope is None:
+            scope = self._id_to_qualifying_scope.setdefault(
+                scope_id, _QualifyingScope(
+                    self._parent.get_scope(scope_id), self._qualifier))
+        return scope
+
+    def get_scope(self, scope_id):
+        if self._parent is not None and scope_id not in self._id_to_scope:
+            return self._parent.get_scope(scope_id)
+        return self._id_to_scope[scope_id]
+
+    def get_scope_ids(self):
+        scope_ids = set(self._id_to_scope.keys())
+        if self._parent is not None:
+            scope_ids |= self._parent.get_scope_ids()
+        return scope_ids
+
+    def get_all_scopes(self):
+        """Returns the scopes that these bindable scopes own.
+
+        A child's scopes don't include the custom scopes that it shares with
+        its parent.
+        """
+        return list(self._id_to_scope.values())
+
+    def new_child(self, id_to_scope=None):
+        """Creates bindable scopes for a child object graph.
+
+        Args:
+          id_to_scope: a map from scope ID to the concrete Scope
+              implementation instance for the child's own custom scopes, or
+              None
+        Returns:
+          a BindableScopes with new instances of the built-in scopes, plus
+              id_to_scope, falling back to these scopes for other scope IDs
+        """
+        return BindableScopes(
+            get_id_to_scope_with_defaults(id_to_scope), parent=self)
+
+    def new_overlay(self, replaced_binding_keys, dependency_index):
+        """Creates bindable scopes for an overlay object graph.
+
+        Args:
+          replaced_binding_keys: the binding keys that the overlay binds
+              anew
+          dependency_index: the DependencyIndex recording what these
+              scopes' singletons were provided with
+        Returns:
+          a BindableScopes like those from new_child(), except that its
+              singleton scope shares these scopes' singletons other than
+              those provided with replaced_binding_keys
+        """
+        id_to_scope = get_id_to_scope_with_defaults()
+        id_to_scope[SINGLETON] = OverlaySingletonScope(
+            self.get_scope(SINGLETON), replaced_binding_keys,
+            dependency_index)
+        return BindableScopes(id_to_scope, parent=self)
@@ -16,6 +16,7 @@ limitations under the License.
 
 import six
 import inspect
+import weakref
 
 from . import errors
 
@@ -39,13 +40,74 @@ def is_string(arg_value):
     return isinstance(arg_value, six.string_types)
 
 
-def is_constructor_defined(cls):
+_NOT_CACHED = object()
+_introspection_caches = []
+
+
+class IntrospectionCache(object):
+    """Remembers what was found out by introspecting functions or classes.
+
+    What's remembered is forgotten when the function or class is garbage
+    collected.  Things that can't be weakly referenced are introspected
+    every time.
+    """
+
+    def __init__(self, name, introspect_fn):
+        self._name = name
+        self._introspect_fn = introspect_fn
+        self._thing_to_result = weakref.WeakKeyDictionary()
+        # These are approximate if updated concurrently, which is OK for
+        # statistics.
+        self._num_hits = 0
+        self._num_misses = 0
+        _introspection_caches.append(self)
+
+    def get(self, thing):
+        try:
+            result = self._thing_to_result.get(thing, _NOT_CACHED)
+        except TypeError:
+            self._num_misses += 1
+            return self._introspect_fn(thing)
+        if result is _NOT_CACHED:
+            self._num_misses += 1
+            result = self._introspect_fn(thing)
+            self._thing_to_result[thing] = result
+        else:
+            self._num_hits += 1
+        return result
+
+    def get_name(self):
+        return self._name
+
+    def get_stats(self):
+        return self._num_hits, self._num_misses
+
+
+def get_introspection_stats():
+    """Returns how well introspection caching is working.
+
+    Returns:
+      a map from introspection cache name to a (num_hits, num_misses) pair
+    """
+    return {cache.get_name(): cache.get_stats()
+            for cache in _introspection_caches}
+
+
+def _is_constructor_defined(cls):
     if six.PY3:
         return inspect.isfunction(cls.__init__)
     return inspect.ismethod(cls.__init__)
 
 
-def get_method_args(fn):
+_constructor_defined_cache = IntrospectionCache(
+    'is_constructor_defined', _is_constructor_defined)
+
+
+def is_constructor_defined(cls):
+    return _constructor_defined_cache.get(cls)
+
+
+def _get_method_args(fn):
     if six.PY3:
         spec = inspect.getfullargspec(fn)
         return spec.args, spec.varargs, spec.varkw, spec.defaults
@@ -53,6 +115,18 @@ def get_method_args(fn):
     return arg_names, varargs, keywords, defaults
 
 
+_method_args_cache = IntrospectionCache('get_method_args', _get_method_args)
+
+
+def get_method_args(fn):
+    """Returns the arg names, varargs name, keywords name and defaults of fn.
+
+    The returned arg names are shared between calls, so must not be modified.
+    """
+    # A bound method's args are those of its function, including self.
+    return _method_args_cache.get(getattr(fn, '__func__', fn))
+
+
 def verify_callable(fn, arg_name):
     if not callable(fn):
         raise errors.WrongArgTypeError(arg_name, 'callable', type(fn).__name__)
@@ -81,10 +155,18 @@ def verify_class_types(seq, arg_name):
     _verify_types(inspect.isclass, seq, arg_name, 'class')
 
 
+def verify_string_types(seq, arg_name):
+    _verify_types(is_string, seq, arg_name, 'string')
+
+
 def verify_class_type(elt, arg_name):
     _verify_type(inspect.isclass, elt, arg_name, 'class')
 
 
+def verify_string_type(elt, arg_name):
+    _verify_type(is_string, elt, arg_name, 'string')
+
+
 def _assert_sequence(seq, arg_name, type_name):
     if not is_sequence(seq):
         raise errors.WrongArgTypeError(
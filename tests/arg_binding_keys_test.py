@@ -88,6 +88,12 @@ class ArgBindingKeyTest(unittest.TestCase):
         # Strings will be equal, since indirection isn't part of the string.
         self.assertEqual(str(arg_binding_key_one), str(arg_binding_key_two))
 
+    def test_unequal_if_not_same_optionality(self):
+        arg_binding_key_one = arg_binding_keys.new('an-arg-name')
+        arg_binding_key_two = arg_binding_keys.new(
+            'an-arg-name', is_optional=True)
+        self.assertNotEqual(arg_binding_key_one, arg_binding_key_two)
+
     def test_can_apply_to_one_of_arg_names(self):
         arg_binding_key = arg_binding_keys.new(
             'an-arg-name', 'unused-binding-key')
@@ -166,6 +172,11 @@ class NewArgBindingKeyTest(unittest.TestCase):
             'the arg named "an-arg-name" annotated with "an-annotation"',
             str(arg_binding_key))
 
+    def test_is_not_optional_by_default(self):
+        self.assertFalse(arg_binding_keys.new('an-arg-name').is_optional)
+        self.assertTrue(arg_binding_keys.new(
+            'an-arg-name', is_optional=True).is_optional)
+
     def test_as_provider_fn(self):
         arg_binding_key = arg_binding_keys.new('provide_foo')
         self.assertEqual('the arg named "provide_foo" unannotated',
@@ -36,6 +36,11 @@ class BindingKeyTest(unittest.TestCase):
             'the binding name "an-arg-name" (annotated with "an-annotation")',
             str(binding_key))
 
+    def test_get_arg_name(self):
+        binding_key = binding_keys.BindingKey(
+            'an-arg-name', annotations.Annotation('an-annotation'))
+        self.assertEqual('an-arg-name', binding_key.get_arg_name())
+
     def test_annotation_as_adjective(self):
         binding_key = binding_keys.BindingKey(
             'an-arg-name', annotations.Annotation('an-annotation'))
@@ -82,3 +87,84 @@ class NewBindingKeyTest(unittest.TestCase):
         self.assertEqual(
             'the binding name "an-arg-name" (annotated with "an-annotation")',
             str(binding_key))
+
+
+class NewWithDirectArgsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.binding_key = binding_keys.new('an-arg-name')
+
+    def test_returns_same_binding_key_without_direct_args(self):
+        self.assertIs(self.binding_key, binding_keys.new_with_direct_args(
+            self.binding_key, (), {}))
+
+    def test_str_includes_direct_args(self):
+        binding_key = binding_keys.new_with_direct_args(
+            self.binding_key, ('a',), {'b': 'c'})
+        self.assertEqual(
+            'the binding name "an-arg-name" (unannotated) with direct pargs'
+            " ('a',) and kwargs {'b': 'c'}", str(binding_key))
+
+    def test_equal_if_same_direct_args(self):
+        binding_key_one = binding_keys.new_with_direct_args(
+            self.binding_key, ('a',), {'b': 'c'})
+        binding_key_two = binding_keys.new_with_direct_args(
+            self.binding_key, ('a',), {'b': 'c'})
+        self.assertEqual(binding_key_one, binding_key_two)
+        self.assertEqual(hash(binding_key_one), hash(binding_key_two))
+
+    def test_unequal_if_not_same_direct_args(self):
+        binding_key_one = binding_keys.new_with_direct_args(
+            self.binding_key, (), {'b': 'c'})
+        binding_key_two = binding_keys.new_with_direct_args(
+            self.binding_key, (), {'b': 'd'})
+        self.assertNotEqual(binding_key_one, binding_key_two)
+        self.assertNotEqual(self.binding_key, binding_key_one)
+        self.assertNotEqual(binding_key_one, self.binding_key)
+
+    def test_unequal_if_direct_args_equal_but_of_different_types(self):
+        binding_key_one = binding_keys.new_with_direct_args(
+            self.binding_key, (1,), {'b': (1,)})
+        binding_key_true = binding_keys.new_with_direct_args(
+            self.binding_key, (True,), {'b': (1,)})
+        binding_key_float = binding_keys.new_with_direct_args(
+            self.binding_key, (1,), {'b': (1.0,)})
+        self.assertNotEqual(binding_key_one, binding_key_true)
+        self.assertNotEqual(binding_key_one, binding_key_float)
+
+    def test_without_direct_args_returns_original_binding_key(self):
+        binding_key = binding_keys.new_with_direct_args(
+            self.binding_key, ('a',), {})
+        self.assertEqual(self.binding_key, binding_key.without_direct_args())
+
+    def test_returns_none_if_direct_args_unhashable(self):
+        self.assertIsNone(binding_keys.new_with_direct_args(
+            self.binding_key, (['a'],), {}))
+
+
+class NewQualifiedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.binding_key = binding_keys.new('an-arg-name')
+        self.qualifier = object()
+
+    def test_str_is_same_as_original(self):
+        self.assertEqual(str(self.binding_key), str(
+            binding_keys.new_qualified(self.binding_key, self.qualifier)))
+
+    def test_equal_if_same_qualifier(self):
+        binding_key_one = binding_keys.new_qualified(
+            self.binding_key, self.qualifier)
+        binding_key_two = binding_keys.new_qualified(
+            binding_keys.new('an-arg-name'), self.qualifier)
+        self.assertEqual(binding_key_one, binding_key_two)
+        self.assertEqual(hash(binding_key_one), hash(binding_key_two))
+
+    def test_unequal_if_not_same_qualifier(self):
+        binding_key_one = binding_keys.new_qualified(
+            self.binding_key, self.qualifier)
+        binding_key_two = binding_keys.new_qualified(
+            self.binding_key, object())
+        self.assertNotEqual(binding_key_one, binding_key_two)
+        self.assertNotEqual(self.binding_key, binding_key_one)
+        self.assertNotEqual(binding_key_one, self.binding_key)
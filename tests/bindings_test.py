@@ -14,13 +14,18 @@ limitations under the License.
 """
 
 
+import os
+import shutil
+import tempfile
 import threading
 import unittest
 
 from pinject import bindings as bindings_lib
 from pinject import binding_keys
 from pinject import decorators
+from pinject import discovery_cache
 from pinject import errors
+from pinject import finding
 from pinject import injection_contexts
 from pinject import required_bindings
 from pinject import scoping
@@ -151,19 +156,51 @@ class GetOverallBindingKeyToBindingMapsTest(unittest.TestCase):
 
 class BindingMappingTest(unittest.TestCase):
 
+    def test_contains_bound_and_collided_binding_keys(self):
+        binding_mapping = bindings_lib.BindingMapping(
+            {'a-binding-key': 'a-binding'},
+            {'collided-binding-key': ['binding-one', 'binding-two']})
+        self.assertTrue(binding_mapping.contains('a-binding-key'))
+        self.assertTrue(binding_mapping.contains('collided-binding-key'))
+        self.assertFalse(binding_mapping.contains('unknown-binding-key'))
+
+    def test_is_bound_includes_parent(self):
+        parent = bindings_lib.BindingMapping(
+            {'b-binding-key': 'b-binding'},
+            {'collided-binding-key': ['binding-one', 'binding-two']})
+        binding_mapping = bindings_lib.BindingMapping(
+            {'a-binding-key': 'a-binding'}, {}, parent=parent)
+        self.assertTrue(binding_mapping.is_bound('a-binding-key'))
+        self.assertTrue(binding_mapping.is_bound('b-binding-key'))
+        self.assertTrue(binding_mapping.is_bound('collided-binding-key'))
+        self.assertFalse(binding_mapping.is_bound('unknown-binding-key'))
+
     def test_success(self):
         binding_mapping = bindings_lib.BindingMapping(
             {'a-binding-key': 'a-binding'}, {})
         self.assertEqual(
             'a-binding',
-            binding_mapping.get('a-binding-key', 'injection-site-desc'))
+            binding_mapping.get('a-binding-key', 'injection-site-fn'))
+
+    def test_falls_back_to_parent(self):
+        parent = bindings_lib.BindingMapping(
+            {'a-binding-key': 'a-binding', 'b-binding-key': 'b-binding'}, {})
+        binding_mapping = bindings_lib.BindingMapping(
+            {'a-binding-key': 'other-binding'}, {}, parent=parent)
+        self.assertEqual(
+            'other-binding',
+            binding_mapping.get('a-binding-key', 'injection-site-fn'))
+        self.assertEqual(
+            'b-binding',
+            binding_mapping.get('b-binding-key', 'injection-site-fn'))
+        self.assertFalse(binding_mapping.contains('b-binding-key'))
 
     def test_unknown_binding_raises_error(self):
         binding_mapping = bindings_lib.BindingMapping(
             {'a-binding-key': 'a-binding'}, {})
         self.assertRaises(errors.NothingInjectableForArgError,
                           binding_mapping.get,
-                          'unknown-binding-key', 'injection-site-desc')
+                          'unknown-binding-key', 'injection-site-fn')
 
     def test_colliding_bindings_raises_error(self):
         binding_key = binding_keys.new('unused')
@@ -172,7 +209,7 @@ class BindingMappingTest(unittest.TestCase):
         binding_mapping = bindings_lib.BindingMapping(
             {}, {'colliding-binding-key': [binding_one, binding_two]})
         self.assertRaises(errors.AmbiguousArgNameError, binding_mapping.get,
-                          'colliding-binding-key', 'injection-site-desc')
+                          'colliding-binding-key', 'injection-site-fn')
 
     def test_verifying_ok_bindings_passes(self):
         binding_mapping = bindings_lib.BindingMapping(
@@ -323,6 +360,27 @@ class GetProviderBindingsTest(unittest.TestCase):
                           bindings_lib.get_provider_bindings,
                           SomeBindingSpec(), known_scope_ids=[])
 
+    def test_caches_and_uses_provider_fn_names_in_discovery_cache(self):
+        class SomeBindingSpec(bindings_lib.BindingSpec):
+            def provide_foo(self):
+                return 'a-foo'
+            def not_a_provider(self):
+                pass
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache = discovery_cache.DiscoveryCache(
+                os.path.join(temp_dir, 'cache.json'))
+            bindings_lib.get_provider_bindings(
+                SomeBindingSpec(), scoping._BUILTIN_SCOPES,
+                discovery_cache=cache)
+            [implicit_binding] = bindings_lib.get_provider_bindings(
+                SomeBindingSpec(), scoping._BUILTIN_SCOPES,
+                discovery_cache=cache)
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual(binding_keys.new('foo'),
+                         implicit_binding.binding_key)
+
 
 class GetImplicitClassBindingsTest(unittest.TestCase):
 
@@ -366,6 +424,60 @@ class GetImplicitClassBindingsTest(unittest.TestCase):
                          implicit_binding.binding_key)
 
 
+class SourceClassForTest(object):
+    pass
+
+
+class GetSourceClassBindingsTest(unittest.TestCase):
+
+    def new_source_class(self, is_explicitly_injectable=False,
+                         is_binding_spec=False):
+        return finding.SourceClass(
+            __name__, 'SourceClassForTest', 'some/path.py', 42,
+            is_explicitly_injectable, is_binding_spec)
+
+    def test_returns_no_bindings_for_no_input(self):
+        self.assertEqual(
+            ([], []), bindings_lib.get_source_class_bindings([], False))
+
+    def test_returns_implicit_binding_for_source_class(self):
+        [implicit_binding], explicit_bindings = (
+            bindings_lib.get_source_class_bindings(
+                [self.new_source_class()], False))
+        self.assertEqual([], explicit_bindings)
+        self.assertEqual(binding_keys.new('source_class_for_test'),
+                         implicit_binding.binding_key)
+        self.assertEqual('a-provided-SourceClassForTest',
+                         call_provisor_fn(implicit_binding))
+
+    def test_returns_explicit_binding_for_explicitly_injectable_class(self):
+        implicit_bindings, [explicit_binding] = (
+            bindings_lib.get_source_class_bindings(
+                [self.new_source_class(is_explicitly_injectable=True)],
+                only_use_explicit_bindings=True))
+        self.assertEqual([], implicit_bindings)
+        self.assertEqual(bindings_lib.TO_SOURCE_CLASS,
+                         explicit_binding.target_kind)
+
+    def test_does_not_bind_binding_specs(self):
+        self.assertEqual(
+            ([], []), bindings_lib.get_source_class_bindings(
+                [self.new_source_class(is_explicitly_injectable=True,
+                                       is_binding_spec=True)], False))
+
+    def test_only_using_explicit_bindings_skips_other_classes(self):
+        self.assertEqual(
+            ([], []), bindings_lib.get_source_class_bindings(
+                [self.new_source_class()], only_use_explicit_bindings=True))
+
+    def test_uses_provided_fn_to_map_class_names_to_arg_names(self):
+        [implicit_binding], _ = bindings_lib.get_source_class_bindings(
+            [self.new_source_class()], False,
+            get_arg_names_from_class_name=lambda _: ['foo'])
+        self.assertEqual(binding_keys.new('foo'),
+                         implicit_binding.binding_key)
+
+
 class BinderTest(unittest.TestCase):
 
     def setUp(self):
@@ -384,6 +496,21 @@ class BinderTest(unittest.TestCase):
         # TODO(kurts): test the proviser fn after the dust settles on how
         # exactly to do class bindings.
 
+    def test_binding_to_class_records_target(self):
+        class SomeClass(object):
+            pass
+        self.binder.bind('an-arg-name', to_class=SomeClass)
+        [alias_binding] = [
+            b for b in self.collected_bindings
+            if b.binding_key == binding_keys.new('an-arg-name')]
+        self.assertEqual(bindings_lib.TO_PROVIDER_FN, alias_binding.target_kind)
+        self.assertTrue(
+            bindings_lib.is_class_alias_provider_fn(alias_binding.target))
+        [class_binding] = [
+            b for b in self.collected_bindings if b is not alias_binding]
+        self.assertEqual(bindings_lib.TO_CLASS, class_binding.target_kind)
+        self.assertIs(SomeClass, class_binding.target)
+
     def test_can_bind_to_instance(self):
         an_instance = object()
         self.binder.bind('an-arg-name', to_instance=an_instance)
@@ -391,6 +518,8 @@ class BinderTest(unittest.TestCase):
         self.assertEqual(binding_keys.new('an-arg-name'),
                          only_binding.binding_key)
         self.assertIs(an_instance, call_provisor_fn(only_binding))
+        self.assertEqual(bindings_lib.TO_INSTANCE, only_binding.target_kind)
+        self.assertIs(an_instance, only_binding.target)
 
     def test_can_bind_with_annotation(self):
         self.binder.bind('an-arg-name', annotated_with='an-annotation',
@@ -464,6 +593,16 @@ class GetProviderFnBindingsTest(unittest.TestCase):
             provide_foo, ['foo'])
         self.assertEqual('a-foo', call_provisor_fn(provider_fn_binding))
 
+    def test_records_provider_fn_as_target(self):
+        def provide_foo():
+            return 'a-foo'
+        [provider_fn_binding] = bindings_lib.get_provider_fn_bindings(
+            provide_foo, ['foo'])
+        self.assertEqual(bindings_lib.TO_PROVIDER_FN,
+                         provider_fn_binding.target_kind)
+        self.assertIs(provide_foo, provider_fn_binding.target)
+        self.assertFalse(bindings_lib.is_class_alias_provider_fn(provide_foo))
+
     # The rest of get_provider_fn_binding() is tested in
     # GetProviderFnDecorationsTest in conjection with @annotated_with() and
     # @in_scope().
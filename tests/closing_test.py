@@ -0,0 +1,200 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import unittest
+
+from pinject import binding_keys
+from pinject import closing
+from pinject import dependencies
+from pinject import scoping
+
+
+class Closable(object):
+
+    def __init__(self, name, closed_names):
+        self._name = name
+        self._closed_names = closed_names
+
+    def close(self):
+        self._closed_names.append(self._name)
+
+
+class ContextManager(object):
+
+    def __init__(self):
+        self.exit_args = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exit_args):
+        self.exit_args = exit_args
+
+
+class CloserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.closed_names = []
+        self.closer = closing.Closer()
+
+    def new_closable(self, name):
+        closable = Closable(name, self.closed_names)
+        self.closer.record_created(closable)
+        return closable
+
+    def test_calls_close_method_of_created_instance(self):
+        self.closer.close_all([self.new_closable('a')])
+        self.assertEqual(['a'], self.closed_names)
+
+    def test_does_not_call_close_method_of_instance_not_created(self):
+        self.closer.close_all([Closable('a', self.closed_names)])
+        self.assertEqual([], self.closed_names)
+
+    def test_does_not_call_exit_method(self):
+        context_manager = ContextManager()
+        self.closer.record_created(context_manager)
+        self.closer.close_all([context_manager])
+        self.assertIsNone(context_manager.exit_args)
+
+    def test_calls_close_hook_for_instance_not_created(self):
+        self.closer.register_close_hook(
+            Closable, lambda instance: self.closed_names.append('hook'))
+        self.closer.close_all([Closable('a', self.closed_names)])
+        self.assertEqual(['hook'], self.closed_names)
+
+    def test_closes_unhashable_created_instance(self):
+        class UnhashableClosable(Closable):
+            def __eq__(self, other):
+                return self is other
+            __hash__ = None
+        closable = UnhashableClosable('a', self.closed_names)
+        self.closer.record_created(closable)
+        self.closer.close_all([UnhashableClosable('b', self.closed_names),
+                               closable])
+        self.assertEqual(['a'], self.closed_names)
+
+    def test_does_not_close_instance_equal_to_created_instance(self):
+        class EqualClosable(Closable):
+            def __eq__(self, other):
+                return isinstance(other, EqualClosable)
+            def __hash__(self):
+                return 0
+        created_closable = EqualClosable('a', self.closed_names)
+        self.closer.record_created(created_closable)
+        self.closer.close_all([EqualClosable('b', self.closed_names)])
+        self.assertEqual([], self.closed_names)
+
+    def test_child_shares_created_instances(self):
+        closable = self.new_closable('a')
+        self.closer.new_child().close_all([closable])
+        self.assertEqual(['a'], self.closed_names)
+
+    def test_ignores_instances_without_close_methods(self):
+        self.closer.close_all([object(), 'a-string'])
+
+    def test_closes_in_given_order(self):
+        self.closer.close_all([self.new_closable('a'),
+                               self.new_closable('b')])
+        self.assertEqual(['a', 'b'], self.closed_names)
+
+    def test_registered_close_hook_takes_precedence(self):
+        closable = Closable('a', self.closed_names)
+        self.closer.register_close_hook(
+            Closable, lambda instance: self.closed_names.append('hook'))
+        self.closer.close_all([closable])
+        self.assertEqual(['hook'], self.closed_names)
+
+    def test_later_close_hook_takes_precedence(self):
+        self.closer.register_close_hook(
+            object, lambda instance: self.closed_names.append('object'))
+        self.closer.register_close_hook(
+            Closable, lambda instance: self.closed_names.append('closable'))
+        self.closer.close_all([Closable('a', self.closed_names)])
+        self.assertEqual(['closable'], self.closed_names)
+
+    def test_does_not_close_externally_owned_instances(self):
+        closable = Closable('a', self.closed_names)
+        closer = closing.Closer(externally_owned_instances=[closable])
+        closer.close_all([closable])
+        self.assertEqual([], self.closed_names)
+
+    def test_closes_all_then_raises_first_exception(self):
+        class FailingClosable(object):
+            def close(self):
+                raise ValueError('a-failure')
+        failing_closable = FailingClosable()
+        self.closer.record_created(failing_closable)
+        self.assertRaises(
+            ValueError, self.closer.close_all,
+            [failing_closable, self.new_closable('a')])
+        self.assertEqual(['a'], self.closed_names)
+
+
+class PopAllScopeInstancesTest(unittest.TestCase):
+
+    def test_pops_last_scope_instances_last(self):
+        class FakeScope(object):
+            def __init__(self, instances):
+                self._instances = instances
+            def pop_instances(self):
+                return self._instances
+        last_scope = FakeScope(['a', 'b'])
+        other_scope = FakeScope(['c'])
+        self.assertEqual(
+            ['c', 'a', 'b'], closing.pop_all_scope_instances(
+                [last_scope, other_scope, scoping.PrototypeScope()],
+                last_scope))
+
+    def test_returns_instances_in_several_scopes_once(self):
+        instance = object()
+        class FakeScope(object):
+            def pop_instances(self):
+                return [instance]
+        self.assertEqual(
+            [instance], closing.pop_all_scope_instances(
+                [FakeScope(), FakeScope()], FakeScope()))
+
+    def test_pops_dependents_first_across_scopes(self):
+        foo = binding_keys.new('foo')
+        bar = binding_keys.new('bar')
+        baz = binding_keys.new('baz')
+        dependency_index = dependencies.DependencyIndex()
+        dependency_index.record(foo, bar)
+        dependency_index.record(bar, baz)
+        class FakeScope(object):
+            def __init__(self, binding_keys_and_instances):
+                self._binding_keys_and_instances = binding_keys_and_instances
+            def pop_binding_keys_and_instances(self):
+                return self._binding_keys_and_instances
+        last_scope = FakeScope([(baz, 'a-baz')])
+        other_scope = FakeScope([(foo, 'a-foo')])
+        self.assertEqual(
+            ['a-baz', 'a-foo'], closing.pop_all_scope_instances(
+                [last_scope, other_scope], last_scope, dependency_index))
+
+    def test_orders_instances_without_binding_keys_by_scope(self):
+        foo = binding_keys.new('foo')
+        dependency_index = dependencies.DependencyIndex()
+        class FakeScope(object):
+            def pop_instances(self):
+                return ['an-instance']
+        class FakeKeyedScope(object):
+            def pop_binding_keys_and_instances(self):
+                return [(foo, 'a-foo')]
+        last_scope = FakeKeyedScope()
+        self.assertEqual(
+            ['an-instance', 'a-foo'], closing.pop_all_scope_instances(
+                [last_scope, FakeScope()], last_scope, dependency_index))
@@ -0,0 +1,316 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from pinject import bindings
+from pinject import compile as compile_lib
+from pinject import decorators
+from pinject import errors
+from pinject import object_graph
+from pinject import scoping
+
+
+# The compiled classes must be importable, so they're at module level.
+class Config(object):
+    pass
+
+
+class Database(object):
+    def __init__(self, config, url):
+        self.config = config
+        self.url = url
+
+
+class Request(object):
+    pass
+
+
+class Handler(object):
+    def __init__(self, database, request):
+        self.database = database
+        self.request = request
+
+
+class HandlerFactoryUser(object):
+    def __init__(self, provide_handler):
+        self.provide_handler = provide_handler
+
+
+class Greeter(object):
+    @decorators.inject(['config'])
+    def __init__(self, config, name):
+        self.config = config
+        self.name = name
+
+
+class GreeterUser(object):
+    def __init__(self, greeter):
+        self.greeter = greeter
+
+
+class GreeterFactoryUser(object):
+    def __init__(self, provide_greeter):
+        self.greeter = provide_greeter(name='a-name')
+
+
+class TwoGreetersUser(object):
+    def __init__(self, provide_greeter):
+        self.greeter_one = provide_greeter(name='one')
+        self.greeter_two = provide_greeter(name='two')
+
+
+class CycleA(object):
+    def __init__(self, cycle_b):
+        pass
+
+
+class CycleB(object):
+    def __init__(self, cycle_a):
+        pass
+
+
+class Service(object):
+    def __init__(self, backend, request_id):
+        self.backend = backend
+        self.request_id = request_id
+
+
+class ServiceBindingSpec(bindings.BindingSpec):
+
+    def configure(self, bind):
+        bind('url', to_instance='a-url')
+        bind('backend', to_class=Database)
+        bind('request', to_class=Request, in_scope=scoping.PROTOTYPE)
+
+    def provide_request_id(self, url):
+        return 'request-for-' + url
+
+
+class NoneBindingSpec(bindings.BindingSpec):
+
+    def configure(self, bind):
+        bind('url', to_instance='a-url')
+
+    def provide_config(self):
+        return None
+
+
+class ObjectInstanceBindingSpec(bindings.BindingSpec):
+
+    def configure(self, bind):
+        bind('url', to_instance=object())
+
+
+class BindingSpecWithInitArgs(bindings.BindingSpec):
+
+    def __init__(self, url):
+        self._url = url
+
+    def provide_url(self):
+        return self._url
+
+
+def _new_obj_graph(binding_specs, **kwargs):
+    return object_graph.new_object_graph(
+        modules=[sys.modules[__name__]], binding_specs=binding_specs,
+        **kwargs)
+
+
+def _exec_source(source):
+    module_vars = {}
+    exec(compile(source, '<compiled>', 'exec'), module_vars)
+    return module_vars
+
+
+class CompileObjectGraphTest(unittest.TestCase):
+
+    def test_provides_root_class_with_dependencies(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([ServiceBindingSpec()]), [Handler]))
+        handler = compiled['provide_handler']()
+        self.assertIsInstance(handler, Handler)
+        self.assertIsInstance(handler.database.config, Config)
+        self.assertEqual('a-url', handler.database.url)
+        self.assertIsInstance(handler.request, Request)
+
+    def test_provide_fn_dispatches_on_class(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([ServiceBindingSpec()]), [Handler, Service]))
+        self.assertIsInstance(compiled['provide'](Handler), Handler)
+        self.assertIsInstance(compiled['provide'](Service), Service)
+
+    def test_memoizes_singletons_but_not_prototypes(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([ServiceBindingSpec()]), [Handler]))
+        handler_one = compiled['provide_handler']()
+        handler_two = compiled['provide_handler']()
+        self.assertIsNot(handler_one, handler_two)
+        self.assertIs(handler_one.database, handler_two.database)
+        self.assertIsNot(handler_one.request, handler_two.request)
+
+    def test_memoizes_class_bound_to_arg_name_like_object_graph(self):
+        obj_graph = _new_obj_graph([ServiceBindingSpec()])
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            obj_graph, [Handler, Service]))
+        self.assertIs(compiled['provide_service']().backend,
+                      compiled['provide_service']().backend)
+        self.assertEqual(
+            obj_graph.provide(Handler).database is
+            obj_graph.provide(Service).backend,
+            compiled['provide_handler']().database is
+            compiled['provide_service']().backend)
+
+    def test_calls_provider_methods(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([ServiceBindingSpec()]), [Service]))
+        self.assertEqual('request-for-a-url',
+                         compiled['provide_service']().request_id)
+
+    def test_injects_provider_fns(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([ServiceBindingSpec()]), [HandlerFactoryUser]))
+        factory_user = compiled['provide_handler_factory_user']()
+        self.assertIsInstance(factory_user.provide_handler(), Handler)
+
+    def test_injects_provider_fns_taking_direct_args(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([ServiceBindingSpec()]), [GreeterFactoryUser]))
+        greeter = compiled['provide_greeter_factory_user']().greeter
+        self.assertEqual('a-name', greeter.name)
+        self.assertIsInstance(greeter.config, Config)
+
+    def test_memoizes_singletons_regardless_of_direct_args_like_object_graph(
+            self):
+        obj_graph = _new_obj_graph([ServiceBindingSpec()])
+        compiled = _exec_source(
+            compile_lib.compile_object_graph(obj_graph, [TwoGreetersUser]))
+        user = obj_graph.provide(TwoGreetersUser)
+        compiled_user = compiled['provide_two_greeters_user']()
+        self.assertEqual(
+            (user.greeter_one.name, user.greeter_two.name),
+            (compiled_user.greeter_one.name, compiled_user.greeter_two.name))
+        self.assertIs(compiled_user.greeter_one, compiled_user.greeter_two)
+
+    def test_matches_object_graph_wiring(self):
+        obj_graph = _new_obj_graph([ServiceBindingSpec()])
+        compiled = _exec_source(
+            compile_lib.compile_object_graph(obj_graph, [Service]))
+        service = obj_graph.provide(Service)
+        compiled_service = compiled['provide_service']()
+        self.assertEqual(service.request_id, compiled_service.request_id)
+        self.assertEqual(service.backend.url, compiled_service.backend.url)
+
+    def test_generates_same_source_each_time(self):
+        self.assertEqual(
+            compile_lib.compile_object_graph(
+                _new_obj_graph([ServiceBindingSpec()]), [Handler, Service]),
+            compile_lib.compile_object_graph(
+                _new_obj_graph([ServiceBindingSpec()]), [Handler, Service]))
+
+    def test_raises_error_if_injecting_none_when_disallowed(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([NoneBindingSpec()]), [Database]))
+        self.assertRaises(errors.InjectingNoneDisallowedError,
+                          compiled['provide_database'])
+
+    def test_injects_none_when_allowed(self):
+        compiled = _exec_source(compile_lib.compile_object_graph(
+            _new_obj_graph([NoneBindingSpec()], allow_injecting_none=True),
+            [Database]))
+        self.assertIsNone(compiled['provide_database']().config)
+
+    def test_raises_error_for_cyclic_injection(self):
+        self.assertRaises(
+            errors.CyclicInjectionError, compile_lib.compile_object_graph,
+            _new_obj_graph([ServiceBindingSpec()]), [CycleA])
+
+    def test_raises_error_for_missing_direct_args(self):
+        self.assertRaises(
+            errors.OnlyInstantiableViaProviderFunctionError,
+            compile_lib.compile_object_graph,
+            _new_obj_graph([ServiceBindingSpec()]), [GreeterUser])
+
+    def test_raises_error_for_non_literal_instance(self):
+        self.assertRaises(
+            errors.UncompilableError, compile_lib.compile_object_graph,
+            _new_obj_graph([ObjectInstanceBindingSpec()]), [Database])
+
+    def test_raises_error_for_binding_spec_with_init_args(self):
+        self.assertRaises(
+            errors.UncompilableError, compile_lib.compile_object_graph,
+            _new_obj_graph([BindingSpecWithInitArgs('a-url')]), [Database])
+
+    def test_raises_error_for_non_importable_class(self):
+        class SomeClass(object):
+            pass
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[SomeClass])
+        self.assertRaises(
+            errors.UncompilableError, compile_lib.compile_object_graph,
+            obj_graph, [SomeClass])
+
+    def test_raises_error_for_custom_scope(self):
+        class CustomScopeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('url', to_instance='a-url', in_scope='custom-scope')
+        obj_graph = _new_obj_graph(
+            [CustomScopeBindingSpec()],
+            id_to_scope={'custom-scope': scoping.PrototypeScope()})
+        self.assertRaises(
+            errors.UncompilableError, compile_lib.compile_object_graph,
+            obj_graph, [Database])
+
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.temp_dir, 'wiring.py')
+        self.args = [
+            '--class', '{0}:Handler'.format(__name__),
+            '--binding-spec', '{0}:ServiceBindingSpec'.format(__name__),
+            '--module', __name__]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_writes_compiled_module(self):
+        self.assertEqual(
+            0, compile_lib.main(self.args + ['--output', self.output_path]))
+        with open(self.output_path) as output_file:
+            compiled = _exec_source(output_file.read())
+        self.assertIsInstance(compiled['provide_handler'](), Handler)
+
+    def test_check_passes_if_up_to_date(self):
+        compile_lib.main(self.args + ['--output', self.output_path])
+        self.assertEqual(
+            0, compile_lib.main(self.args + ['--check', self.output_path]))
+
+    def test_check_fails_if_out_of_date(self):
+        compile_lib.main(self.args + ['--output', self.output_path])
+        with open(self.output_path, 'a') as output_file:
+            output_file.write('# edited\n')
+        self.assertEqual(
+            1, compile_lib.main(self.args + ['--check', self.output_path]))
+
+    def test_check_fails_if_missing(self):
+        self.assertEqual(
+            1, compile_lib.main(self.args + ['--check', self.output_path]))
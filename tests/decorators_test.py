@@ -50,6 +50,34 @@ class AnnotateArgTest(unittest.TestCase):
                              some_function, decorators._ARG_BINDING_KEYS_ATTR)])
 
 
+class OptionalArgTest(unittest.TestCase):
+
+    def test_adds_optional_binding_in_pinject_decorated_fn(self):
+        @decorators.optional_arg('foo', 'an-annotation')
+        def some_function(foo=None):
+            return foo
+        self.assertEqual(
+            [arg_binding_keys.new('foo', 'an-annotation', is_optional=True)],
+            getattr(some_function, decorators._ARG_BINDING_KEYS_ATTR))
+
+    def test_raises_error_if_arg_has_no_default(self):
+        def do_bad_optional_arg():
+            @decorators.optional_arg('foo')
+            def some_function(foo, bar=None):
+                return foo
+        self.assertRaises(errors.OptionalArgWithoutDefaultError,
+                          do_bad_optional_arg)
+
+    def test_raises_error_if_arg_also_annotated(self):
+        def do_bad_optional_arg():
+            @decorators.optional_arg('foo')
+            @decorators.annotate_arg('foo', 'an-annotation')
+            def some_function(foo=None):
+                return foo
+        self.assertRaises(errors.MultipleAnnotationsForSameArgError,
+                          do_bad_optional_arg)
+
+
 class InjectTest(unittest.TestCase):
 
     def test_can_set_injectable_arg_names(self):
@@ -340,3 +368,35 @@ class GetInjectableArgBindingKeysTest(unittest.TestCase):
         self.assert_fn_has_injectable_arg_binding_keys(
             fn, [arg_binding_keys.new('foo', 'an-annotation'),
                  arg_binding_keys.new('bar')])
+
+
+class GetRequiredDirectArgNamesTest(unittest.TestCase):
+
+    def test_undecorated_fn_returns_nothing(self):
+        self.assertEqual(
+            [], decorators.get_required_direct_arg_names(lambda foo: None))
+
+    def test_returns_non_injectable_args_without_defaults(self):
+        class SomeClass(object):
+            @decorators.inject(['foo'])
+            def __init__(self, foo, bar, baz='a-baz'):
+                pass
+        self.assertEqual(
+            ['bar'], decorators.get_required_direct_arg_names(
+                SomeClass.__init__))
+
+
+class GetArgNamesTest(unittest.TestCase):
+
+    def test_returns_arg_names_of_undecorated_fn(self):
+        self.assertEqual(
+            ['foo', 'bar'], decorators.get_arg_names(lambda foo, bar=1: None))
+
+    def test_returns_arg_names_of_decorated_method_without_self(self):
+        class SomeClass(object):
+            @decorators.inject(['foo'])
+            def __init__(self, foo, bar, baz='a-baz'):
+                pass
+        self.assertEqual(
+            ['foo', 'bar', 'baz'],
+            decorators.get_arg_names(SomeClass.__init__))
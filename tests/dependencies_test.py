@@ -0,0 +1,108 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import unittest
+
+from pinject import binding_keys
+from pinject import dependencies
+
+
+class DependencyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dependency_index = dependencies.DependencyIndex()
+        self.foo = binding_keys.new('foo')
+        self.bar = binding_keys.new('bar')
+        self.baz = binding_keys.new('baz')
+
+    def test_no_dependents_if_nothing_recorded(self):
+        self.assertEqual(
+            set(), self.dependency_index.get_transitive_dependents([self.foo]))
+
+    def test_gets_direct_dependents(self):
+        self.dependency_index.record(self.foo, self.bar)
+        self.assertEqual(
+            {self.bar},
+            self.dependency_index.get_transitive_dependents([self.foo]))
+
+    def test_gets_only_direct_dependents_of_one_binding_key(self):
+        self.dependency_index.record(self.foo, self.bar)
+        self.dependency_index.record(self.bar, self.baz)
+        self.assertEqual(
+            {self.bar}, self.dependency_index.get_direct_dependents(self.foo))
+
+    def test_gets_transitive_dependents(self):
+        self.dependency_index.record(self.foo, self.bar)
+        self.dependency_index.record(self.bar, self.baz)
+        self.assertEqual(
+            {self.bar, self.baz},
+            self.dependency_index.get_transitive_dependents([self.foo]))
+
+    def test_does_not_get_dependencies(self):
+        self.dependency_index.record(self.foo, self.bar)
+        self.assertEqual(
+            set(), self.dependency_index.get_transitive_dependents([self.bar]))
+
+    def test_records_same_dependency_idempotently(self):
+        self.dependency_index.record(self.foo, self.bar)
+        self.dependency_index.record(self.foo, self.bar)
+        self.assertEqual(
+            {self.bar},
+            self.dependency_index.get_transitive_dependents([self.foo]))
+
+    def test_version_changes_when_dependencies_recorded(self):
+        version = self.dependency_index.get_version()
+        self.dependency_index.record(self.foo, self.bar)
+        recorded_version = self.dependency_index.get_version()
+        self.assertNotEqual(version, recorded_version)
+        self.dependency_index.record(self.foo, self.bar)
+        self.assertEqual(
+            recorded_version, self.dependency_index.get_version())
+        self.dependency_index.clear()
+        self.assertNotEqual(
+            recorded_version, self.dependency_index.get_version())
+
+    def test_version_changes_when_dependencies_recorded_in_parent(self):
+        child_dependency_index = dependencies.DependencyIndex(
+            parent=self.dependency_index)
+        version = child_dependency_index.get_version()
+        self.dependency_index.record(self.foo, self.bar)
+        self.assertNotEqual(version, child_dependency_index.get_version())
+
+    def test_clear_forgets_dependencies(self):
+        self.dependency_index.record(self.foo, self.bar)
+        self.dependency_index.clear()
+        self.assertEqual(
+            set(), self.dependency_index.get_transitive_dependents([self.foo]))
+
+    def test_records_after_reset_after_fork(self):
+        self.dependency_index.reset_after_fork()
+        self.dependency_index.record(self.foo, self.bar)
+        self.assertEqual(
+            {self.bar},
+            self.dependency_index.get_transitive_dependents([self.foo]))
+
+    def test_gets_dependents_recorded_in_parent(self):
+        child_dependency_index = dependencies.DependencyIndex(
+            parent=self.dependency_index)
+        self.dependency_index.record(self.foo, self.bar)
+        child_dependency_index.record(self.bar, self.baz)
+        self.assertEqual(
+            {self.bar, self.baz},
+            child_dependency_index.get_transitive_dependents([self.foo]))
+        self.assertEqual(
+            {self.bar},
+            self.dependency_index.get_transitive_dependents([self.foo]))
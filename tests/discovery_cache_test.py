@@ -0,0 +1,234 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+import mock
+
+from pinject import bindings
+from pinject import discovery_cache
+from pinject import providing
+
+
+class SomeBindingSpec(bindings.BindingSpec):
+
+    def provide_foo(self):
+        return 'a-foo'
+
+    def not_a_provider(self):
+        pass
+
+
+def get_foo_arg_names(class_name):
+    return ['foo']
+
+
+def new_prefixing_fn(prefix):
+    def get_arg_names(class_name):
+        return [prefix + class_name.lower()]
+    return get_arg_names
+
+
+class DiscoveryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, 'discovery-cache.json')
+        self.module_path = os.path.join(self.temp_dir, 'some_module.py')
+        with open(self.module_path, 'w') as module_file:
+            module_file.write('class SomeClass(object):\n    pass\n')
+        class SomeClass(object):
+            pass
+        self.some_class = SomeClass
+        self.module = types.ModuleType('some_module')
+        self.module.__file__ = self.module_path
+        self.module.SomeClass = SomeClass
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_nothing_cached_initially(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertIsNone(cache.get_classes_in_module(self.module))
+
+    def test_gets_cached_classes_in_module_after_saving(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        cache.save()
+        reloaded_cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertEqual({self.some_class},
+                         reloaded_cache.get_classes_in_module(self.module))
+
+    def test_invalidates_classes_if_source_file_changes(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        cache.save()
+        with open(self.module_path, 'a') as module_file:
+            module_file.write('class OtherClass(object):\n    pass\n')
+        reloaded_cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertIsNone(reloaded_cache.get_classes_in_module(self.module))
+
+    def test_invalidates_classes_if_module_members_change(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        self.module.OtherClass = object
+        self.assertIsNone(cache.get_classes_in_module(self.module))
+
+    def test_invalidates_classes_if_module_member_is_removed(self):
+        self.module.other = 'not-a-class'
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        del self.module.other
+        self.assertIsNone(cache.get_classes_in_module(self.module))
+
+    def test_caches_classes_separately_for_modules_with_same_name(self):
+        other_module = types.ModuleType('some_module')
+        other_module.OtherClass = type('OtherClass', (object,), {})
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        cache.set_class_member_names_in_module(other_module, ['OtherClass'])
+        self.assertEqual({self.some_class},
+                         cache.get_classes_in_module(self.module))
+        self.assertEqual({other_module.OtherClass},
+                         cache.get_classes_in_module(other_module))
+
+    def test_finds_cached_classes_without_inspecting_other_members(self):
+        self.module.other = 'not-a-class'
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        with mock.patch.object(inspect, 'isclass',
+                               wraps=inspect.isclass) as isclass:
+            self.assertEqual({self.some_class},
+                             cache.get_classes_in_module(self.module))
+            isclass.assert_called_once_with(self.some_class)
+
+    def test_invalidates_classes_if_cached_member_is_no_longer_class(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        self.module.SomeClass = 'not-a-class'
+        self.assertIsNone(cache.get_classes_in_module(self.module))
+
+    def test_ignores_corrupt_cache_file(self):
+        with open(self.cache_path, 'w') as cache_file:
+            cache_file.write('not json')
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertIsNone(cache.get_classes_in_module(self.module))
+
+    def test_ignores_unwritable_cache_file(self):
+        cache = discovery_cache.DiscoveryCache(
+            os.path.join(self.temp_dir, 'no-such-dir', 'cache.json'))
+        cache.set_class_member_names_in_module(self.module, ['SomeClass'])
+        cache.save()
+
+    def test_memoizes_arg_names_across_loads(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        memoized_fn = cache.get_memoized_arg_names_fn(get_foo_arg_names)
+        self.assertEqual(['foo'], memoized_fn('Foo'))
+        cache.save()
+        # Changing what's cached shows that it's what gets used.
+        with open(self.cache_path) as cache_file:
+            contents = json.load(cache_file)
+        [class_name_to_arg_names] = contents['class_arg_names'].values()
+        class_name_to_arg_names['Foo'] = ['cached-foo']
+        with open(self.cache_path, 'w') as cache_file:
+            json.dump(contents, cache_file)
+        reloaded_cache = discovery_cache.DiscoveryCache(self.cache_path)
+        memoized_fn = reloaded_cache.get_memoized_arg_names_fn(
+            get_foo_arg_names)
+        self.assertEqual(['cached-foo'], memoized_fn('Foo'))
+
+    def test_memoizes_closures_separately_per_closure_contents(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertEqual(['a_foo'], cache.get_memoized_arg_names_fn(
+            new_prefixing_fn('a_'))('Foo'))
+        self.assertEqual(['b_foo'], cache.get_memoized_arg_names_fn(
+            new_prefixing_fn('b_'))('Foo'))
+
+    def test_memoizes_fns_separately_per_default_arg_values(self):
+        def get_arg_names(class_name, prefix='a_'):
+            return [prefix + class_name.lower()]
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertEqual(
+            ['a_foo'], cache.get_memoized_arg_names_fn(get_arg_names)('Foo'))
+        get_arg_names.__defaults__ = ('b_',)
+        self.assertEqual(
+            ['b_foo'], cache.get_memoized_arg_names_fn(get_arg_names)('Foo'))
+
+    def test_does_not_memoize_fns_depending_on_mutable_values(self):
+        suffixes = ['_a']
+        def get_arg_names(class_name):
+            return [class_name.lower() + suffixes[0]]
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertIs(get_arg_names,
+                      cache.get_memoized_arg_names_fn(get_arg_names))
+
+    def test_does_not_memoize_non_function_naming_fns(self):
+        class GetArgNames(object):
+            def __call__(self, class_name):
+                return ['foo']
+        get_arg_names = GetArgNames()
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertIs(get_arg_names,
+                      cache.get_memoized_arg_names_fn(get_arg_names))
+
+    def test_gets_cached_provider_fn_names_after_saving(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_provider_fn_names(
+            SomeBindingSpec(),
+            providing.default_get_arg_names_from_provider_fn_name,
+            ['provide_foo'])
+        cache.save()
+        reloaded_cache = discovery_cache.DiscoveryCache(self.cache_path)
+        self.assertEqual(
+            ['provide_foo'],
+            reloaded_cache.get_provider_fn_names(
+                SomeBindingSpec(),
+                providing.default_get_arg_names_from_provider_fn_name))
+
+    def test_does_not_cache_provider_fn_names_of_class_without_source(self):
+        module = types.ModuleType('fileless_module')
+        exec('class FilelessBindingSpec(object):\n'
+             '    def provide_foo(self):\n'
+             '        pass\n', vars(module))
+        sys.modules['fileless_module'] = module
+        try:
+            binding_spec = module.FilelessBindingSpec()
+            cache = discovery_cache.DiscoveryCache(self.cache_path)
+            cache.set_provider_fn_names(
+                binding_spec,
+                providing.default_get_arg_names_from_provider_fn_name,
+                ['provide_foo'])
+            self.assertIsNone(cache.get_provider_fn_names(
+                binding_spec,
+                providing.default_get_arg_names_from_provider_fn_name))
+        finally:
+            del sys.modules['fileless_module']
+
+    def test_provider_fn_names_are_keyed_by_naming_fn(self):
+        cache = discovery_cache.DiscoveryCache(self.cache_path)
+        cache.set_provider_fn_names(
+            SomeBindingSpec(),
+            providing.default_get_arg_names_from_provider_fn_name,
+            ['provide_foo'])
+        self.assertIsNone(cache.get_provider_fn_names(
+            SomeBindingSpec(), lambda fn_name: [fn_name]))
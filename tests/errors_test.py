@@ -0,0 +1,86 @@
+"""Copyright 2013 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import unittest
+
+import mock
+
+from pinject import binding_keys
+from pinject import errors
+from pinject import locations
+
+
+class ErrorTest(unittest.TestCase):
+
+    def test_str_of_error_with_message(self):
+        self.assertEqual('a-message', str(errors.Error('a-message')))
+
+    def test_str_of_error_without_message(self):
+        self.assertEqual('', str(errors.Error()))
+
+    def test_args_of_error_with_message(self):
+        self.assertEqual(('a-message',), errors.Error('a-message').args)
+
+    def test_repr_of_error_with_message(self):
+        self.assertEqual("Error('a-message')", repr(errors.Error('a-message')))
+
+    def test_setting_args_sets_message(self):
+        error = errors.Error('a-message')
+        error.args = ('another-message',)
+        self.assertEqual('another-message', str(error))
+        self.assertEqual(('another-message',), error.args)
+
+
+class LazyMessageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.binding_key = binding_keys.new('foo')
+        def injection_site_fn(foo):
+            pass
+        self.injection_site_fn = injection_site_fn
+
+    def test_keeps_what_went_wrong_as_attributes(self):
+        error = errors.NothingInjectableForArgError(
+            self.binding_key, self.injection_site_fn)
+        self.assertEqual(self.binding_key, error.binding_key)
+        self.assertIs(self.injection_site_fn, error.injection_site_fn)
+
+    def test_does_not_format_message_until_converted_to_string(self):
+        with mock.patch.object(locations, 'get_name_and_loc') as (
+                get_name_and_loc):
+            get_name_and_loc.return_value = 'injection_site_fn at here'
+            error = errors.NothingInjectableForArgError(
+                self.binding_key, self.injection_site_fn)
+            self.assertFalse(get_name_and_loc.called)
+            self.assertEqual(
+                'when injecting injection_site_fn at here, nothing injectable'
+                ' for the binding name "foo" (unannotated)', str(error))
+            str(error)
+            get_name_and_loc.assert_called_once_with(self.injection_site_fn)
+
+    def test_args_and_repr_include_message(self):
+        with mock.patch.object(locations, 'get_name_and_loc') as (
+                get_name_and_loc):
+            get_name_and_loc.return_value = 'injection_site_fn at here'
+            error = errors.NothingInjectableForArgError(
+                self.binding_key, self.injection_site_fn)
+            msg = ('when injecting injection_site_fn at here, nothing'
+                   ' injectable for the binding name "foo" (unannotated)')
+            self.assertEqual((msg,), error.args)
+            self.assertEqual(
+                'NothingInjectableForArgError({0!r})'.format(msg),
+                repr(error))
+            get_name_and_loc.assert_called_once_with(self.injection_site_fn)
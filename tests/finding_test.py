@@ -16,9 +16,13 @@ limitations under the License.
 
 import inspect
 import mock
+import os
+import shutil
 import sys
+import tempfile
 import unittest
 
+from pinject import discovery_cache
 from pinject import finding
 
 
@@ -51,6 +55,23 @@ class FindClassesTest(unittest.TestCase):
             finding.find_classes(modules=finding.ALL_IMPORTED_MODULES,
                                  classes=None))
 
+    def test_finds_classes_using_discovery_cache(self):
+        this_module = sys.modules[FindClassesTest.__module__]
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache = discovery_cache.DiscoveryCache(
+                os.path.join(temp_dir, 'cache.json'))
+            finding.find_classes(modules=[this_module], classes=None,
+                                 discovery_cache=cache)
+            self.assertIn(FindClassesTest,
+                          cache.get_classes_in_module(this_module))
+            self.assertIn(
+                FindClassesTest,
+                finding.find_classes(modules=[this_module], classes=None,
+                                     discovery_cache=cache))
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_swig_cvar_nameerror(self):
         this_module = sys.modules[FindClassesTest.__module__]
         # This tests a special case exception that find_classes silences, which
@@ -89,3 +110,109 @@ class FindClassesTest(unittest.TestCase):
             mock_isclass.side_effect = foo_raises_nameerror
             with self.assertRaises(NameError):
                 finding.find_classes(modules=[this_module], classes=None)
+
+    def test_swig_cvar_nameerror_with_discovery_cache(self):
+        this_module = sys.modules[FindClassesTest.__module__]
+        isclass = inspect.isclass
+        def cvar_raises_nameerror(value):
+            if value == cvar:
+                raise NameError()
+            return isclass(value)
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache = discovery_cache.DiscoveryCache(
+                os.path.join(temp_dir, 'cache.json'))
+            with mock.patch.object(inspect, 'isclass') as mock_isclass:
+                mock_isclass.side_effect = cvar_raises_nameerror
+                for _ in range(2):
+                    self.assertIn(FindClassesTest, finding.find_classes(
+                        modules=[this_module], classes=None,
+                        discovery_cache=cache))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class FindSourceClassesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.package_root = tempfile.mkdtemp()
+        self.package_name = 'finding_test_pkg_{0}'.format(id(self))
+        package_dir = os.path.join(self.package_root, self.package_name)
+        os.mkdir(package_dir)
+        self.write_file(os.path.join(package_dir, '__init__.py'), '')
+        self.write_file(os.path.join(package_dir, 'some_module.py'), (
+            'import pinject\n'
+            'class SomeClass(object):\n'
+            '    class NestedClass(object):\n'
+            '        pass\n'
+            'class InjectableClass(object):\n'
+            '    @pinject.inject()\n'
+            '    def __init__(self, foo):\n'
+            '        pass\n'
+            'class SomeBindingSpec(pinject.BindingSpec):\n'
+            '    pass\n'
+            'def some_function():\n'
+            '    class LocalClass(object):\n'
+            '        pass\n'))
+        self.write_file(os.path.join(package_dir, 'broken_module.py'),
+                        'class Broken(object:\n')
+        self.write_file(os.path.join(package_dir, 'not-a-module.py'),
+                        'class NotAModule(object):\n    pass\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.package_root)
+
+    def write_file(self, path, contents):
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def find_name_to_source_class(self, num_processes=1):
+        return {source_class.name: source_class
+                for source_class in finding.find_source_classes(
+                    [self.package_root], num_processes)}
+
+    def test_finds_top_level_classes_in_source_files(self):
+        self.assertEqual(
+            set(['SomeClass', 'InjectableClass', 'SomeBindingSpec']),
+            set(self.find_name_to_source_class().keys()))
+
+    def test_does_not_import_modules(self):
+        self.find_name_to_source_class()
+        self.assertNotIn(self.package_name + '.some_module', sys.modules)
+
+    def test_records_module_name_and_location(self):
+        some_class = self.find_name_to_source_class()['SomeClass']
+        self.assertEqual(self.package_name + '.some_module',
+                         some_class.module_name)
+        self.assertTrue(some_class.get_loc().endswith('some_module.py:2'))
+
+    def test_finds_explicitly_injectable_classes(self):
+        name_to_source_class = self.find_name_to_source_class()
+        self.assertTrue(
+            name_to_source_class['InjectableClass'].is_explicitly_injectable)
+        self.assertFalse(
+            name_to_source_class['SomeClass'].is_explicitly_injectable)
+
+    def test_finds_binding_specs(self):
+        name_to_source_class = self.find_name_to_source_class()
+        self.assertTrue(name_to_source_class['SomeBindingSpec'].is_binding_spec)
+        self.assertFalse(name_to_source_class['SomeClass'].is_binding_spec)
+
+    def test_parses_in_worker_processes(self):
+        self.assertEqual(
+            set(['SomeClass', 'InjectableClass', 'SomeBindingSpec']),
+            set(self.find_name_to_source_class(num_processes=2).keys()))
+
+    def test_get_class_imports_module(self):
+        some_class = self.find_name_to_source_class()['SomeClass']
+        sys.path.insert(0, self.package_root)
+        try:
+            cls = some_class.get_class()
+            self.assertEqual('SomeClass', cls.__name__)
+            self.assertIs(sys.modules[self.package_name + '.some_module'],
+                          sys.modules[cls.__module__])
+        finally:
+            sys.path.remove(self.package_root)
+            for module_name in list(sys.modules.keys()):
+                if module_name.startswith(self.package_name):
+                    del sys.modules[module_name]
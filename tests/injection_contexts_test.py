@@ -61,6 +61,35 @@ class InjectionContextTest(unittest.TestCase):
                 other_binding_key, 'unused-instance', 'unusable-scope',
                 lambda: 'unused-desc'))
 
+    def test_children_share_batch_cache(self):
+        batch_cache = injection_contexts.BatchCache()
+        child_injection_context = self.injection_context.with_batch_cache(
+            batch_cache).get_child(
+                _UNUSED_INJECTION_SITE_FN,
+                bindings.new_binding_to_instance(
+                    binding_keys.new('bar'), 'unused-instance', 'new-scope',
+                    lambda: 'unused-desc'))
+        self.assertIs(batch_cache, child_injection_context.get_batch_cache())
+        self.assertIsNone(self.injection_context.get_batch_cache())
+
+    def test_closed_batch_cache_is_not_used(self):
+        batch_cache = injection_contexts.BatchCache()
+        injection_context = self.injection_context.with_batch_cache(
+            batch_cache)
+        batch_cache.close()
+        self.assertIsNone(injection_context.get_batch_cache())
+
+    def test_get_binding_key_of_current_binding(self):
+        self.assertEqual(self.binding_key,
+                         self.injection_context.get_binding_key())
+
+    def test_get_binding_key_at_top_level_is_none(self):
+        injection_context_factory = injection_contexts.InjectionContextFactory(
+            lambda _1, _2: True)
+        injection_context = injection_context_factory.new(
+            _UNUSED_INJECTION_SITE_FN)
+        self.assertIsNone(injection_context.get_binding_key())
+
     def test_get_injection_site_desc(self):
         injection_context_factory = injection_contexts.InjectionContextFactory(
             lambda _1, _2: True)
@@ -70,3 +99,19 @@ class InjectionContextTest(unittest.TestCase):
         injection_site_desc = injection_context.get_injection_site_desc()
         self.assertIn('InjectionSite', injection_site_desc)
         self.assertIn('injection_contexts_test.py', injection_site_desc)
+
+
+class BatchCacheTest(unittest.TestCase):
+
+    def test_gets_what_was_set(self):
+        batch_cache = injection_contexts.BatchCache()
+        batch_cache.set('a-binding-key', 'a-binding', 'an-instance')
+        self.assertEqual(('a-binding', 'an-instance'),
+                         batch_cache.get('a-binding-key'))
+
+    def test_forgets_instances_when_closed(self):
+        batch_cache = injection_contexts.BatchCache()
+        batch_cache.set('a-binding-key', 'a-binding', 'an-instance')
+        batch_cache.close()
+        self.assertIsNone(batch_cache.get('a-binding-key'))
+        self.assertTrue(batch_cache.is_closed())
@@ -113,4 +113,34 @@ class GetBackFrameLocTest(unittest.TestCase):
     def test_correct_file_and_line(self):
         def get_loc():
             return locations.get_back_frame_loc()
-        self.assertIn('locations_test.py', get_loc())
+        self.assertIn('locations_test.py', str(get_loc()))
+
+    def test_unknown_location_when_not_capturing_call_sites(self):
+        def get_loc():
+            return locations.get_back_frame_loc()
+        locations.set_capturing_call_sites(False)
+        try:
+            self.assertEqual('unknown location', str(get_loc()))
+        finally:
+            locations.set_capturing_call_sites(True)
+
+
+class CallSiteTest(unittest.TestCase):
+
+    def setUp(self):
+        def some_function():
+            pass
+        self.code = some_function.__code__
+
+    def test_str(self):
+        self.assertEqual(
+            '{0}:42'.format(self.code.co_filename),
+            str(locations.CallSite(self.code, 42)))
+
+    def test_equal_if_same_code_and_line(self):
+        self.assertEqual(locations.CallSite(self.code, 42),
+                         locations.CallSite(self.code, 42))
+        self.assertEqual(hash(locations.CallSite(self.code, 42)),
+                         hash(locations.CallSite(self.code, 42)))
+        self.assertNotEqual(locations.CallSite(self.code, 42),
+                            locations.CallSite(self.code, 43))
@@ -14,12 +14,25 @@ limitations under the License.
 """
 
 
+import gc
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import weakref
+
+import mock
 
 from pinject import bindings
 from pinject import decorators
 from pinject import errors
+from pinject import finding
 from pinject import object_graph
+from pinject import object_providers
 from pinject import scoping
 
 
@@ -228,6 +241,73 @@ class NewObjectGraphTest(unittest.TestCase):
                           binding_specs=[SomeBindingSpec()])
 
 
+    def test_creates_object_graph_using_discovery_cache(self):
+        class SomeClass(object):
+            def __init__(self, foo):
+                self.foo = foo
+        class SomeBindingSpec(bindings.BindingSpec):
+            def provide_foo(self):
+                return 'a-foo'
+        temp_dir = tempfile.mkdtemp()
+        cache_path = os.path.join(temp_dir, 'cache.json')
+        try:
+            for _ in range(2):
+                obj_graph = object_graph.new_object_graph(
+                    modules=None, classes=[SomeClass],
+                    binding_specs=[SomeBindingSpec()],
+                    discovery_cache_path=cache_path)
+                self.assertEqual('a-foo', obj_graph.provide(SomeClass).foo)
+            self.assertTrue(os.path.exists(cache_path))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_creates_object_graph_from_unimported_package_roots(self):
+        class SomeClass(object):
+            def __init__(self, lazy_class):
+                self.lazy_class = lazy_class
+        package_root = tempfile.mkdtemp()
+        module_name = 'object_graph_test_lazy_{0}'.format(id(self))
+        with open(os.path.join(package_root, module_name + '.py'),
+                  'w') as module_file:
+            module_file.write('class LazyClass(object):\n    pass\n')
+        sys.path.insert(0, package_root)
+        try:
+            obj_graph = object_graph.new_object_graph(
+                modules=None, classes=[SomeClass],
+                package_roots=[package_root])
+            self.assertNotIn(module_name, sys.modules)
+            lazy_class = obj_graph.provide(SomeClass).lazy_class
+            self.assertEqual('LazyClass', lazy_class.__class__.__name__)
+            self.assertIn(module_name, sys.modules)
+        finally:
+            sys.path.remove(package_root)
+            sys.modules.pop(module_name, None)
+            shutil.rmtree(package_root)
+
+    def test_parses_package_roots_in_this_process_by_default(self):
+        package_root = tempfile.mkdtemp()
+        for module_name in ['one', 'two']:
+            with open(os.path.join(package_root, module_name + '.py'),
+                      'w') as module_file:
+                module_file.write('class {0}(object):\n    pass\n'.format(
+                    module_name.title()))
+        try:
+            with mock.patch.object(finding.multiprocessing, 'Pool',
+                                   side_effect=AssertionError):
+                object_graph.new_object_graph(
+                    modules=None, package_roots=[package_root])
+        finally:
+            shutil.rmtree(package_root)
+
+    def test_parses_package_roots_with_given_num_processes(self):
+        with mock.patch.object(finding, 'find_source_classes',
+                               return_value=[]) as find_source_classes:
+            object_graph.new_object_graph(
+                modules=None, package_roots=['/unused'],
+                num_parsing_processes=4)
+        find_source_classes.assert_called_once_with(['/unused'], 4)
+
+
 class PareToPresentArgsTest(unittest.TestCase):
 
     def test_removes_only_args_not_present(self):
@@ -726,3 +806,1493 @@ class ObjectGraphProvideTest(unittest.TestCase):
         obj_graph = object_graph.new_object_graph(
             modules=None, classes=[SomeClass])
         self.assertRaises(errors.WrongArgTypeError, obj_graph.provide, 42)
+
+
+class ObjectGraphPrepareForForkTest(unittest.TestCase):
+
+    def setUp(self):
+        class Pool(object):
+            pass
+        class Config(object):
+            pass
+        class Service(object):
+            def __init__(self, pool, config):
+                self.pool = pool
+                self.config = config
+        self.service_class = Service
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Pool, Config, Service])
+
+    def test_provides_given_classes_before_forking(self):
+        provided = []
+        class SomeClass(object):
+            def __init__(self):
+                provided.append(self)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[SomeClass])
+        obj_graph.prepare_for_fork(classes=[SomeClass], freeze_gc=False)
+        self.assertEqual(1, len(provided))
+
+    def test_reinitializing_rebuilds_fork_unsafe_singletons_and_dependents(self):
+        class Pool(object):
+            pass
+        class Config(object):
+            pass
+        class Service(object):
+            def __init__(self, pool, config):
+                self.pool = pool
+                self.config = config
+        class SomeClass(object):
+            def __init__(self, service, config):
+                self.service = service
+                self.config = config
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Pool, Config, Service, SomeClass])
+        obj_graph.prepare_for_fork(classes=[SomeClass],
+                                   fork_unsafe_arg_names=['pool'],
+                                   freeze_gc=False)
+        parent_some_class = obj_graph.provide(SomeClass)
+        obj_graph.reinitialize_after_fork()
+        child_some_class = obj_graph.provide(SomeClass)
+        self.assertIsNot(parent_some_class.service, child_some_class.service)
+        self.assertIsNot(parent_some_class.service.pool,
+                         child_some_class.service.pool)
+        self.assertIs(parent_some_class.config, child_some_class.config)
+        self.assertIs(parent_some_class.service.config,
+                      child_some_class.service.config)
+
+    def test_reinitializing_rebuilds_fork_unsafe_singletons_bound_to_class(self):
+        class Pool(object):
+            pass
+        class SomeClass(object):
+            def __init__(self, pool):
+                self.pool = pool
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('pool', to_class=Pool)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[SomeClass],
+            binding_specs=[SomeBindingSpec()])
+        obj_graph.prepare_for_fork(classes=[SomeClass],
+                                   fork_unsafe_arg_names=['pool'],
+                                   freeze_gc=False)
+        parent_pool = obj_graph.provide(SomeClass).pool
+        obj_graph.reinitialize_after_fork()
+        self.assertIsNot(parent_pool, obj_graph.provide(SomeClass).pool)
+
+    def test_reinitializing_without_fork_unsafe_arg_names_keeps_singletons(self):
+        self.obj_graph.prepare_for_fork(
+            classes=[self.service_class], freeze_gc=False)
+        parent_service = self.obj_graph.provide(self.service_class)
+        self.obj_graph.reinitialize_after_fork()
+        self.assertIs(parent_service.pool,
+                      self.obj_graph.provide(self.service_class).pool)
+
+    def test_raises_exception_if_fork_unsafe_arg_names_is_wrong_type(self):
+        self.assertRaises(errors.WrongArgTypeError,
+                          self.obj_graph.prepare_for_fork,
+                          fork_unsafe_arg_names=42)
+
+    @unittest.skipUnless(hasattr(os, 'register_at_fork'),
+                         'requires os.register_at_fork()')
+    def test_reinitializes_in_forked_child(self):
+        self.obj_graph.prepare_for_fork(
+            classes=[self.service_class], fork_unsafe_arg_names=['pool'],
+            freeze_gc=False)
+        parent_service = self.obj_graph.provide(self.service_class)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                child_service = self.obj_graph.provide(self.service_class)
+                rebuilt = (child_service.pool is not parent_service.pool and
+                           child_service.config is parent_service.config)
+                os.write(write_fd, b'1' if rebuilt else b'0')
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        self.assertEqual(b'1', result)
+
+
+class ObjectGraphCloseTest(unittest.TestCase):
+
+    def setUp(self):
+        closed_names = []
+        self.closed_names = closed_names
+        class Pool(object):
+            def close(self):
+                closed_names.append('pool')
+        class Service(object):
+            def __init__(self, pool):
+                self.pool = pool
+            def close(self):
+                closed_names.append('service')
+        class Server(object):
+            def __init__(self, service):
+                self.service = service
+        self.service_class = Service
+        self.server_class = Server
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Pool, Service, Server])
+
+    def test_closes_instances_in_reverse_dependency_order(self):
+        self.obj_graph.provide(self.server_class)
+        self.obj_graph.close()
+        self.assertEqual(['service', 'pool'], self.closed_names)
+
+    def test_closes_only_provided_instances(self):
+        self.obj_graph.close()
+        self.assertEqual([], self.closed_names)
+
+    def test_closing_twice_closes_once(self):
+        self.obj_graph.provide(self.server_class)
+        self.obj_graph.close()
+        self.obj_graph.close()
+        self.assertEqual(['service', 'pool'], self.closed_names)
+
+    def test_cannot_provide_after_closing(self):
+        self.obj_graph.close()
+        self.assertRaises(errors.ClosedObjectGraphError,
+                          self.obj_graph.provide, self.server_class)
+
+    def test_closes_when_used_as_context_manager(self):
+        with self.obj_graph as obj_graph:
+            obj_graph.provide(self.server_class)
+        self.assertEqual(['service', 'pool'], self.closed_names)
+
+    def test_uses_registered_close_hook(self):
+        self.obj_graph.register_close_hook(
+            self.service_class,
+            lambda service: self.closed_names.append('service-hook'))
+        self.obj_graph.provide(self.server_class)
+        self.obj_graph.close()
+        self.assertEqual(['service-hook', 'pool'], self.closed_names)
+
+    def test_does_not_close_instances_bound_with_to_instance(self):
+        closed_names = self.closed_names
+        class Connection(object):
+            def close(self):
+                closed_names.append('connection')
+        class SomeClass(object):
+            def __init__(self, connection):
+                pass
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('connection', to_instance=Connection())
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[SomeClass],
+            binding_specs=[SomeBindingSpec()])
+        obj_graph.provide(SomeClass)
+        obj_graph.close()
+        self.assertEqual([], closed_names)
+
+    def test_does_not_close_instances_returned_by_provider_fns(self):
+        closed_names = self.closed_names
+        class Connection(object):
+            def close(self):
+                closed_names.append('connection')
+        shared_connection = Connection()
+        class SomeClass(object):
+            def __init__(self, connection, lock):
+                pass
+        class SomeBindingSpec(bindings.BindingSpec):
+            def provide_connection(self):
+                return shared_connection
+            def provide_lock(self):
+                return threading.Lock()
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[SomeClass],
+            binding_specs=[SomeBindingSpec()])
+        obj_graph.provide(SomeClass)
+        obj_graph.close()
+        self.assertEqual([], closed_names)
+
+    def test_closes_instances_returned_by_provider_fns_with_hook(self):
+        closed_names = self.closed_names
+        class Connection(object):
+            pass
+        class SomeClass(object):
+            def __init__(self, connection):
+                pass
+        class SomeBindingSpec(bindings.BindingSpec):
+            def provide_connection(self):
+                return Connection()
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[SomeClass],
+            binding_specs=[SomeBindingSpec()])
+        obj_graph.register_close_hook(
+            Connection, lambda connection: closed_names.append('connection'))
+        obj_graph.provide(SomeClass)
+        obj_graph.close()
+        self.assertEqual(['connection'], closed_names)
+
+    def test_closes_remaining_instances_if_closing_one_fails(self):
+        class Failing(object):
+            def __init__(self, pool):
+                pass
+            def close(self):
+                raise ValueError('a-failure')
+        class SomeClass(object):
+            def __init__(self, failing):
+                pass
+        closed_names = self.closed_names
+        class Pool(object):
+            def close(self):
+                closed_names.append('pool')
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Pool, Failing, SomeClass])
+        obj_graph.provide(SomeClass)
+        self.assertRaises(ValueError, obj_graph.close)
+        self.assertEqual(['pool'], closed_names)
+
+    def test_closes_remaining_instances_if_one_is_unhashable(self):
+        closed_names = self.closed_names
+        class Connection(object):
+            def close(self):
+                closed_names.append('connection')
+        class Point(object):
+            def __eq__(self, other):
+                return isinstance(other, Point)
+            __hash__ = None
+        class SomeClass(object):
+            def __init__(self, connection, point):
+                pass
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Connection, Point, SomeClass])
+        obj_graph.provide(SomeClass)
+        obj_graph.close()
+        self.assertEqual(['connection'], closed_names)
+
+    def test_closes_instances_in_dependency_order_across_scopes(self):
+        closed_names = self.closed_names
+        class Pool(object):
+            def close(self):
+                closed_names.append('pool')
+        class Repo(object):
+            def __init__(self, pool):
+                self.pool = pool
+            def close(self):
+                closed_names.append('repo')
+        class Server(object):
+            def __init__(self, repo):
+                self.repo = repo
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('pool', to_class=Pool, in_scope=scoping.WEAK_SINGLETON)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Repo, Server],
+            binding_specs=[SomeBindingSpec()])
+        obj_graph.provide(Server)
+        obj_graph.close()
+        self.assertEqual(['repo', 'pool'], closed_names)
+
+    @unittest.skipIf(sys.version_info < (3, 5), 'requires async syntax')
+    def test_aclose_awaits_async_close_methods(self):
+        import asyncio
+        closed_names = self.closed_names
+        class AsyncConnection(object):
+            def aclose(self):
+                closed_names.append('connection')
+                return asyncio.sleep(0)
+        class SomeClass(object):
+            def __init__(self, async_connection):
+                pass
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[AsyncConnection, SomeClass])
+        obj_graph.provide(SomeClass)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(obj_graph.aclose())
+        finally:
+            loop.close()
+        self.assertEqual(['connection'], closed_names)
+        self.assertRaises(errors.ClosedObjectGraphError,
+                          obj_graph.provide, SomeClass)
+
+
+class ObjectGraphRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        closed_names = []
+        self.closed_names = closed_names
+        class Session(object):
+            def close(self):
+                closed_names.append('session')
+        class Handler(object):
+            def __init__(self, session):
+                self.session = session
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('session', to_class=Session, in_scope=scoping.REQUEST)
+        self.handler_class = Handler
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Handler],
+            binding_specs=[SomeBindingSpec()])
+
+    def test_memoizes_within_request(self):
+        with self.obj_graph.request():
+            self.assertIs(self.obj_graph.provide(self.handler_class).session,
+                          self.obj_graph.provide(self.handler_class).session)
+
+    def test_does_not_memoize_across_requests(self):
+        with self.obj_graph.request():
+            first = self.obj_graph.provide(self.handler_class).session
+        with self.obj_graph.request():
+            self.assertIsNot(
+                first, self.obj_graph.provide(self.handler_class).session)
+
+    def test_closes_instances_when_request_exits(self):
+        with self.obj_graph.request():
+            self.obj_graph.provide(self.handler_class)
+            self.assertEqual([], self.closed_names)
+        self.assertEqual(['session'], self.closed_names)
+
+    def test_raises_error_outside_of_request(self):
+        self.assertRaises(errors.NoActiveRequestError,
+                          self.obj_graph.provide, self.handler_class)
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'requires contextvars')
+    def test_request_follows_copied_contexts(self):
+        import contextvars
+        def ProvideSession():
+            return self.obj_graph.provide(self.handler_class).session
+        with self.obj_graph.request():
+            session = ProvideSession()
+            context = contextvars.copy_context()
+        # Like an asyncio task created within the request.
+        self.assertIs(session, context.run(ProvideSession))
+        self.assertRaises(errors.NoActiveRequestError, ProvideSession)
+
+
+class ObjectGraphThreadScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        closed_parsers = []
+        self.closed_parsers = closed_parsers
+        class Parser(object):
+            def close(self):
+                closed_parsers.append(self)
+        class Worker(object):
+            def __init__(self, parser):
+                self.parser = parser
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('parser', to_class=Parser, in_scope=scoping.THREAD)
+        self.worker_class = Worker
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Worker], binding_specs=[SomeBindingSpec()])
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     'requires ThreadPoolExecutor initializer')
+    def test_gives_each_executor_thread_its_own_instance(self):
+        import concurrent.futures
+        barrier = threading.Barrier(2)
+        def GetParser():
+            parser = self.obj_graph.provide(self.worker_class).parser
+            self.assertIs(
+                parser, self.obj_graph.provide(self.worker_class).parser)
+            # Make sure both tasks run in different threads.
+            barrier.wait()
+            return parser
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2,
+            initializer=self.obj_graph.get_thread_initializer(
+                [self.worker_class]))
+        futures = [executor.submit(GetParser) for _ in range(2)]
+        parsers = [future.result() for future in futures]
+        self.assertIsNot(parsers[0], parsers[1])
+        executor.shutdown(wait=True)
+        gc.collect()
+        self.assertEqual(set(id(parser) for parser in parsers),
+                         set(id(parser) for parser in self.closed_parsers))
+
+    def test_close_closes_instances_of_all_threads(self):
+        parser = self.obj_graph.provide(self.worker_class).parser
+        self.obj_graph.close()
+        self.assertEqual([parser], self.closed_parsers)
+
+
+class ObjectGraphPoolScopeTest(unittest.TestCase):
+
+    def test_leases_pooled_instances_and_closes_them(self):
+        closed_sessions = []
+        class HttpSession(object):
+            def close(self):
+                closed_sessions.append(self)
+        class Client(object):
+            def __init__(self, http_session):
+                self.http_session = http_session
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('http_session', to_class=HttpSession,
+                     in_scope='pooled')
+        pool_scope = scoping.PoolScope(max_size=2)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Client], binding_specs=[SomeBindingSpec()],
+            id_to_scope={'pooled': pool_scope})
+        with pool_scope.lease():
+            session = obj_graph.provide(Client).http_session
+        with pool_scope.lease():
+            self.assertIs(session, obj_graph.provide(Client).http_session)
+        obj_graph.close()
+        self.assertEqual([session], closed_sessions)
+
+
+class ObjectGraphWeakSingletonScopeTest(unittest.TestCase):
+
+    def test_shares_instance_only_while_referenced(self):
+        class LookupTable(object):
+            pass
+        class Lookup(object):
+            def __init__(self, lookup_table):
+                self.lookup_table = lookup_table
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('lookup_table', to_class=LookupTable,
+                     in_scope=scoping.WEAK_SINGLETON)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Lookup], binding_specs=[SomeBindingSpec()])
+        lookup = obj_graph.provide(Lookup)
+        self.assertIs(lookup.lookup_table,
+                      obj_graph.provide(Lookup).lookup_table)
+        lookup_table_ref = weakref.ref(lookup.lookup_table)
+        del lookup
+        gc.collect()
+        self.assertIsNone(lookup_table_ref())
+        self.assertIsInstance(obj_graph.provide(Lookup).lookup_table,
+                              LookupTable)
+
+
+class ObjectGraphDirectArgsMemoizationTest(unittest.TestCase):
+
+    def setUp(self):
+        class Client(object):
+            def __init__(self, region):
+                self.region = region
+        class Service(object):
+            def __init__(self, provide_client):
+                self.eu_client = provide_client(region='eu')
+                self.us_client = provide_client(region='us')
+                self.list_client = provide_client(region=['eu'])
+                self.one_client = provide_client(region=1)
+                self.true_client = provide_client(region=True)
+        self.client_class = Client
+        self.service_class = Service
+
+    def new_obj_graph(self, in_scope, id_to_scope=None):
+        client_class = self.client_class
+        class SomeBindingSpec(bindings.BindingSpec):
+            @decorators.provides(in_scope=in_scope)
+            @decorators.inject(all_except=['region'])
+            def provide_client(self, region):
+                return client_class(region)
+        return object_graph.new_object_graph(
+            modules=None, classes=[self.service_class],
+            binding_specs=[SomeBindingSpec()], id_to_scope=id_to_scope)
+
+    def new_cached_obj_graph(self, max_entries=10):
+        return self.new_obj_graph(
+            'cached',
+            {'cached': scoping.CacheScope(max_entries=max_entries)})
+
+    def test_cache_scope_memoizes_per_direct_args(self):
+        obj_graph = self.new_cached_obj_graph()
+        service = obj_graph.provide(self.service_class)
+        self.assertEqual(('eu', 'us'), (service.eu_client.region,
+                                        service.us_client.region))
+        other_service = obj_graph.provide(self.service_class)
+        self.assertIs(service.eu_client, other_service.eu_client)
+        self.assertIs(service.us_client, other_service.us_client)
+
+    def test_cache_scope_memoizes_equal_args_of_different_types_apart(self):
+        service = self.new_cached_obj_graph().provide(self.service_class)
+        self.assertEqual(1, service.one_client.region)
+        self.assertIs(True, service.true_client.region)
+
+    def test_cache_scope_does_not_memoize_with_unhashable_direct_args(self):
+        obj_graph = self.new_cached_obj_graph()
+        service = obj_graph.provide(self.service_class)
+        self.assertIsNot(service.list_client,
+                         obj_graph.provide(self.service_class).list_client)
+
+    def test_cache_scope_bounds_instances_memoized_per_direct_args(self):
+        obj_graph = self.new_cached_obj_graph(max_entries=1)
+        service = obj_graph.provide(self.service_class)
+        self.assertIsNot(service.eu_client,
+                         obj_graph.provide(self.service_class).eu_client)
+
+
+class ObjectGraphTenantScopeTest(unittest.TestCase):
+
+    def test_memoizes_per_tenant_and_closes_evicted_tenants(self):
+        closed_connections = []
+        class Connection(object):
+            def close(self):
+                closed_connections.append(self)
+        class Repository(object):
+            def __init__(self, connection):
+                self.connection = connection
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('connection', to_class=Connection, in_scope='tenant')
+        tenant_scope = scoping.TenantScope(max_tenants=1)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Repository],
+            binding_specs=[SomeBindingSpec()],
+            id_to_scope={'tenant': tenant_scope})
+        with tenant_scope.tenant('a'):
+            connection_a = obj_graph.provide(Repository).connection
+            self.assertIs(connection_a,
+                          obj_graph.provide(Repository).connection)
+        with tenant_scope.tenant('b'):
+            connection_b = obj_graph.provide(Repository).connection
+        self.assertEqual([connection_a], closed_connections)
+        obj_graph.close()
+        self.assertEqual([connection_a, connection_b], closed_connections)
+
+
+class ObjectGraphChildTest(unittest.TestCase):
+
+    def setUp(self):
+        class Foo(object):
+            pass
+        class Bar(object):
+            def __init__(self, foo):
+                self.foo = foo
+        class ParentBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('foo', to_class=Foo)
+        self.foo_class = Foo
+        self.bar_class = Bar
+        self.parent = object_graph.new_object_graph(
+            modules=None, classes=[Bar], binding_specs=[ParentBindingSpec()])
+
+    def test_shares_parent_singletons(self):
+        child = self.parent.child()
+        self.assertIs(self.parent.provide(self.bar_class).foo,
+                      child.provide(self.bar_class).foo)
+
+    def test_child_bindings_override_parent_bindings_in_child_only(self):
+        class OtherFoo(object):
+            pass
+        class ChildBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('foo', to_class=OtherFoo)
+        class Baz(object):
+            def __init__(self, foo, bar):
+                self.foo = foo
+                self.bar = bar
+        child = self.parent.child(
+            classes=[Baz], binding_specs=[ChildBindingSpec()])
+        baz = child.provide(Baz)
+        self.assertIsInstance(baz.foo, OtherFoo)
+        self.assertIsInstance(baz.bar.foo, self.foo_class)
+        self.assertIsInstance(
+            self.parent.provide(self.bar_class).foo, self.foo_class)
+
+    def test_child_has_own_singletons(self):
+        class Plugin(object):
+            def __init__(self, foo):
+                self.foo = foo
+        child_one = self.parent.child(classes=[Plugin])
+        child_two = self.parent.child(classes=[Plugin])
+        self.assertIs(child_one.provide(Plugin).foo,
+                      child_two.provide(Plugin).foo)
+        self.assertIsNot(child_one.provide(Plugin), child_two.provide(Plugin))
+
+    def test_closing_child_leaves_parent_instances_open(self):
+        closed = []
+        class Plugin(object):
+            def __init__(self, foo):
+                self.foo = foo
+            def close(self):
+                closed.append(self)
+        class Host(object):
+            def __init__(self, plugin):
+                self.plugin = plugin
+        child = self.parent.child(classes=[Plugin, Host])
+        host = child.provide(Host)
+        parent_foo = host.plugin.foo
+        child.close()
+        self.assertEqual([host.plugin], closed)
+        self.assertIs(parent_foo, self.parent.provide(self.bar_class).foo)
+
+    def test_requirements_can_be_met_by_parent(self):
+        class ChildBindingSpec(bindings.BindingSpec):
+            def configure(self, require):
+                require('foo')
+        self.parent.child(binding_specs=[ChildBindingSpec()])
+
+    def test_raises_error_for_unmet_requirement(self):
+        class ChildBindingSpec(bindings.BindingSpec):
+            def configure(self, require):
+                require('unbound')
+        self.assertRaises(errors.MissingRequiredBindingError,
+                          self.parent.child,
+                          binding_specs=[ChildBindingSpec()])
+
+    def test_child_can_use_parent_custom_scopes(self):
+        parent = object_graph.new_object_graph(
+            modules=None, id_to_scope={'custom': scoping.SingletonScope()})
+        class ChildBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('foo', to_class=self.foo_class, in_scope='custom')
+        ChildBindingSpec.foo_class = self.foo_class
+        child = parent.child(
+            classes=[self.bar_class], binding_specs=[ChildBindingSpec()])
+        self.assertIsInstance(child.provide(self.bar_class).foo, self.foo_class)
+
+    def test_child_bindings_in_parent_custom_scopes_are_memoized_apart(self):
+        class OtherFoo(object):
+            pass
+        class Baz(object):
+            def __init__(self, foo):
+                self.foo = foo
+        class ParentBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('foo', to_class=self.foo_class, in_scope='cached')
+        ParentBindingSpec.foo_class = self.foo_class
+        class ChildBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('foo', to_class=OtherFoo, in_scope='cached')
+        parent = object_graph.new_object_graph(
+            modules=None, classes=[self.bar_class],
+            binding_specs=[ParentBindingSpec()],
+            id_to_scope={'cached': scoping.CacheScope()})
+        child = parent.child(
+            classes=[Baz], binding_specs=[ChildBindingSpec()])
+        self.assertIsInstance(child.provide(Baz).foo, OtherFoo)
+        self.assertIsInstance(
+            parent.provide(self.bar_class).foo, self.foo_class)
+        self.assertIs(child.provide(Baz).foo, child.provide(Baz).foo)
+
+
+class ObjectGraphOverrideTest(unittest.TestCase):
+
+    def setUp(self):
+        class Clock(object):
+            pass
+        class Scheduler(object):
+            def __init__(self, clock):
+                self.clock = clock
+        class Mailer(object):
+            pass
+        class App(object):
+            def __init__(self, scheduler, mailer):
+                self.scheduler = scheduler
+                self.mailer = mailer
+        class FakeClock(object):
+            def close(self):
+                raise AssertionError('fakes are never closed')
+        self.fake_clock = FakeClock()
+        fake_clock = self.fake_clock
+        class FakeClockBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('clock', to_instance=fake_clock)
+        self.clock_class = Clock
+        self.scheduler_class = Scheduler
+        self.mailer_class = Mailer
+        self.app_class = App
+        self.fake_clock_binding_spec = FakeClockBindingSpec()
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Clock, Scheduler, Mailer, App])
+
+    def test_replaces_bindings_where_injected(self):
+        with self.obj_graph.override(
+                [self.fake_clock_binding_spec]) as test_graph:
+            app = test_graph.provide(self.app_class)
+            self.assertIs(self.fake_clock, app.scheduler.clock)
+
+    def test_does_not_affect_original_graph(self):
+        with self.obj_graph.override([self.fake_clock_binding_spec]):
+            pass
+        app = self.obj_graph.provide(self.app_class)
+        self.assertIsNot(self.fake_clock, app.scheduler.clock)
+
+    def test_shares_unaffected_singletons_and_rebuilds_stale_ones(self):
+        app = self.obj_graph.provide(self.app_class)
+        with self.obj_graph.override(
+                [self.fake_clock_binding_spec]) as test_graph:
+            test_app = test_graph.provide(self.app_class)
+            self.assertIs(app.mailer, test_app.mailer)
+            self.assertIsNot(app.scheduler, test_app.scheduler)
+        self.assertIs(app.scheduler,
+                      self.obj_graph.provide(self.app_class).scheduler)
+
+    def test_does_not_share_stale_singletons_provided_after_overlay(self):
+        with self.obj_graph.override(
+                [self.fake_clock_binding_spec]) as test_graph:
+            app = self.obj_graph.provide(self.app_class)
+            test_app = test_graph.provide(self.app_class)
+            self.assertIs(self.fake_clock, test_app.scheduler.clock)
+            self.assertIsNot(self.fake_clock, app.scheduler.clock)
+            self.assertIs(app.mailer, test_app.mailer)
+
+    def test_does_not_share_custom_scope_instances_with_original_graph(self):
+        class SchedulerBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('scheduler', to_class=self.scheduler_class,
+                     in_scope='cached')
+        SchedulerBindingSpec.scheduler_class = self.scheduler_class
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.clock_class, self.mailer_class,
+                                   self.app_class],
+            binding_specs=[SchedulerBindingSpec()],
+            id_to_scope={'cached': scoping.CacheScope()})
+        with obj_graph.override([self.fake_clock_binding_spec]) as test_graph:
+            test_app = test_graph.provide(self.app_class)
+            self.assertIs(self.fake_clock, test_app.scheduler.clock)
+            app = obj_graph.provide(self.app_class)
+            self.assertIsNot(self.fake_clock, app.scheduler.clock)
+            self.assertIs(test_app.scheduler,
+                          test_graph.provide(self.app_class).scheduler)
+
+    def test_does_not_share_singletons_first_provided_by_overlay(self):
+        with self.obj_graph.override(
+                [self.fake_clock_binding_spec]) as test_graph:
+            test_app = test_graph.provide(self.app_class)
+        app = self.obj_graph.provide(self.app_class)
+        self.assertIsNot(app.mailer, test_app.mailer)
+
+    def test_invalidate_drops_dependents_shared_with_original_graph(self):
+        get_mailer = lambda mailer: mailer
+        # Only what's injected records what it depends on.
+        app = self.obj_graph.call(lambda app: app)
+        with self.obj_graph.override(
+                [self.fake_clock_binding_spec]) as test_graph:
+            self.assertIs(app.mailer, test_graph.call(get_mailer))
+            self.assertEqual(['app'], test_graph.invalidate('mailer'))
+            self.assertIsNot(app.mailer, test_graph.call(get_mailer))
+        self.assertIs(app.mailer, self.obj_graph.call(get_mailer))
+
+
+class ObjectGraphInvalidateTest(unittest.TestCase):
+
+    def setUp(self):
+        class Credentials(object):
+            pass
+        class Client(object):
+            def __init__(self, credentials):
+                self.credentials = credentials
+        class Service(object):
+            def __init__(self, client):
+                self.client = client
+        class Mailer(object):
+            pass
+        class App(object):
+            def __init__(self, service, mailer):
+                self.service = service
+                self.mailer = mailer
+        self.credentials_class = Credentials
+        self.app_class = App
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Credentials, Client, Service, Mailer, App])
+
+    def test_rebuilds_invalidated_instance_and_dependents(self):
+        app = self.obj_graph.provide(self.app_class)
+        self.assertEqual(['client', 'service'],
+                         self.obj_graph.invalidate('credentials'))
+        new_app = self.obj_graph.provide(self.app_class)
+        self.assertIsNot(app.service.client.credentials,
+                         new_app.service.client.credentials)
+        self.assertIsNot(app.service, new_app.service)
+        self.assertIs(app.mailer, new_app.mailer)
+
+    def test_get_dependent_arg_names(self):
+        self.obj_graph.provide(self.app_class)
+        self.assertEqual(['client', 'service'],
+                         self.obj_graph.get_dependent_arg_names('credentials'))
+        self.assertEqual([], self.obj_graph.get_dependent_arg_names('mailer'))
+
+    def test_drops_dependents_in_request_scope(self):
+        class Session(object):
+            def __init__(self, credentials):
+                self.credentials = credentials
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('session', to_class=Session, in_scope=scoping.REQUEST)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.credentials_class],
+            binding_specs=[SomeBindingSpec()])
+        get_session = lambda session: session
+        with obj_graph.request():
+            session = obj_graph.call(get_session)
+            self.assertEqual(['session'], obj_graph.invalidate('credentials'))
+            new_session = obj_graph.call(get_session)
+        self.assertIsNot(session, new_session)
+        self.assertIsNot(session.credentials, new_session.credentials)
+
+    def test_invalidating_unprovided_arg_name_does_nothing(self):
+        self.assertEqual([], self.obj_graph.invalidate('credentials'))
+
+    def test_raises_error_if_arg_name_not_string(self):
+        self.assertRaises(errors.WrongArgTypeError,
+                          self.obj_graph.invalidate, 42)
+
+
+class ObjectGraphProviderTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class RecordProcessor(object):
+            def __init__(self, config, record=None):
+                self.config = config
+                self.record = record
+        class SomeBindingSpec(bindings.BindingSpec):
+            @decorators.provides(in_scope=scoping.PROTOTYPE)
+            @decorators.inject(all_except=['record'])
+            def provide_record_processor(self, config, record=None):
+                return RecordProcessor(config, record)
+        class Job(object):
+            def __init__(self, provide_record_processor, provide_config):
+                self.provide_record_processor = provide_record_processor
+                self.provide_config = provide_config
+        self.job = object_graph.new_object_graph(
+            modules=None, classes=[Config, RecordProcessor, Job],
+            binding_specs=[SomeBindingSpec()]).provide(Job)
+
+    def test_many_provides_distinct_prototypes_sharing_singletons(self):
+        processors = self.job.provide_record_processor.many(3)
+        self.assertEqual(3, len(set(id(p) for p in processors)))
+        self.assertEqual(1, len(set(id(p.config) for p in processors)))
+        self.assertIs(self.job.provide_config(), processors[0].config)
+
+    def test_many_provides_singleton_args_once(self):
+        provider_call = object_providers.Provider.__call__
+        with mock.patch.object(object_providers.Provider, '__call__',
+                               autospec=True,
+                               side_effect=provider_call) as call:
+            self.job.provide_record_processor.many(3)
+        self.assertEqual(1, call.call_count)
+
+    def test_many_passes_direct_args(self):
+        processors = self.job.provide_record_processor.many(
+            2, record='a-record')
+        self.assertEqual(['a-record', 'a-record'],
+                         [p.record for p in processors])
+
+    def test_many_provides_same_singleton(self):
+        configs = self.job.provide_config.many(2)
+        self.assertIs(configs[0], configs[1])
+
+    def test_can_call_provider_repeatedly(self):
+        self.assertIsNot(self.job.provide_record_processor(),
+                         self.job.provide_record_processor())
+        self.assertIs(self.job.provide_config(), self.job.provide_config())
+
+
+class ObjectGraphProviderScopeAndDependencyTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class Writer(object):
+            def __init__(self, config):
+                self.config = config
+        class Narrow(object):
+            def __init__(self, config):
+                self.config = config
+        class Processor(object):
+            def __init__(self, config, writer):
+                self.config = config
+                self.writer = writer
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('processor', to_class=Processor,
+                     in_scope=scoping.PROTOTYPE)
+                bind('narrow', to_class=Narrow, in_scope='narrow')
+        class Job(object):
+            def __init__(self, provide_processor, provide_narrow):
+                self.provide_processor = provide_processor
+                self.provide_narrow = provide_narrow
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Config, Writer, Job],
+            binding_specs=[SomeBindingSpec()],
+            id_to_scope={'narrow': scoping.PrototypeScope()},
+            is_scope_usable_from_scope=(
+                lambda child_scope_id, scope_id: scope_id != 'narrow'))
+        self.job = self.obj_graph.provide(Job)
+
+    def test_many_records_dependencies_on_shared_instances(self):
+        self.job.provide_processor.many(2)
+        self.assertIn('writer', self.obj_graph.invalidate('config'))
+
+    def test_many_provides_nested_singletons_once(self):
+        self.job.provide_processor()
+        provider_call = object_providers.Provider.__call__
+        with mock.patch.object(object_providers.Provider, '__call__',
+                               autospec=True,
+                               side_effect=provider_call) as call:
+            self.job.provide_processor.many(1)
+            num_calls = call.call_count
+            call.reset_mock()
+            processors = self.job.provide_processor.many(3)
+        self.assertEqual(num_calls, call.call_count)
+        self.assertIs(processors[0].writer, processors[2].writer)
+
+    def test_checks_scopes_for_memoized_instances(self):
+        self.job.provide_processor()
+        self.assertRaises(errors.BadDependencyScopeError,
+                          self.job.provide_narrow)
+        self.assertRaises(errors.BadDependencyScopeError,
+                          self.job.provide_narrow.many, 2)
+
+    def test_provides_memoized_instance_without_providing_anew(self):
+        config = self.job.provide_processor().config
+        self.assertIs(config, self.job.provide_processor().config)
+
+
+class ObjectGraphProvideManyTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class Handler(object):
+            def __init__(self, config):
+                self.config = config
+        class OtherHandler(object):
+            def __init__(self, config):
+                self.config = config
+        self.handler_class = Handler
+        self.other_handler_class = OtherHandler
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Config, Handler, OtherHandler])
+
+    def test_provide_many_provides_each_class_in_order(self):
+        handler, other_handler = self.obj_graph.provide_many(
+            [self.handler_class, self.other_handler_class])
+        self.assertIsInstance(handler, self.handler_class)
+        self.assertIsInstance(other_handler, self.other_handler_class)
+        self.assertIs(handler.config, other_handler.config)
+
+    def test_provide_many_with_no_classes(self):
+        self.assertEqual([], self.obj_graph.provide_many([]))
+
+    def test_provide_many_verifies_classes(self):
+        self.assertRaises(errors.WrongArgElementTypeError,
+                          self.obj_graph.provide_many, [self.handler_class, 42])
+
+    def test_provide_batch_provides_distinct_root_instances(self):
+        handlers = self.obj_graph.provide_batch(self.handler_class, 3)
+        self.assertEqual(3, len(set(id(h) for h in handlers)))
+        self.assertEqual(1, len(set(id(h.config) for h in handlers)))
+
+    def new_obj_graph_with_shared_config(self, **kwargs):
+        class Config(object):
+            pass
+        class Client(object):
+            def __init__(self, config):
+                self.config = config
+        class Narrow(object):
+            def __init__(self, config):
+                self.config = config
+        class Root(object):
+            def __init__(self, client, narrow):
+                self.client = client
+                self.narrow = narrow
+        class OtherRoot(object):
+            def __init__(self, narrow):
+                self.narrow = narrow
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('narrow', to_class=Narrow, in_scope='narrow')
+        self.root_class = Root
+        self.other_root_class = OtherRoot
+        return object_graph.new_object_graph(
+            modules=None, classes=[Config, Client, Root, OtherRoot],
+            binding_specs=[SomeBindingSpec()],
+            id_to_scope={'narrow': scoping.SingletonScope()}, **kwargs)
+
+    def test_provide_many_records_dependencies_on_shared_instances(self):
+        obj_graph = self.new_obj_graph_with_shared_config()
+        obj_graph.provide_many([self.root_class, self.other_root_class])
+        self.assertEqual(['client', 'narrow'], obj_graph.invalidate('config'))
+
+    def test_provide_batch_records_dependencies_on_shared_instances(self):
+        obj_graph = self.new_obj_graph_with_shared_config()
+        obj_graph.provide_batch(self.root_class, 2)
+        self.assertEqual(['client', 'narrow'], obj_graph.invalidate('config'))
+
+    def test_provide_many_and_batch_check_scopes_like_provide(self):
+        obj_graph = self.new_obj_graph_with_shared_config(
+            is_scope_usable_from_scope=(
+                lambda child_scope_id, scope_id: scope_id != 'narrow'))
+        self.assertRaises(errors.BadDependencyScopeError,
+                          obj_graph.provide, self.root_class)
+        self.assertRaises(errors.BadDependencyScopeError,
+                          obj_graph.provide_many, [self.root_class])
+        self.assertRaises(errors.BadDependencyScopeError,
+                          obj_graph.provide_batch, self.root_class, 2)
+
+    def test_provide_batch_does_not_share_instances_of_custom_scopes(self):
+        class Dep(object):
+            pass
+        class Root(object):
+            def __init__(self, dep):
+                self.dep = dep
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('dep', to_class=Dep, in_scope='custom')
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Root], binding_specs=[SomeBindingSpec()],
+            id_to_scope={'custom': scoping.PrototypeScope()})
+        roots = obj_graph.provide_batch(Root, 2)
+        self.assertIsNot(roots[0].dep, roots[1].dep)
+
+    def test_provide_batch_does_not_share_prototypes(self):
+        class Dep(object):
+            pass
+        class Root(object):
+            def __init__(self, dep):
+                self.dep = dep
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('dep', to_class=Dep, in_scope=scoping.PROTOTYPE)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Root], binding_specs=[SomeBindingSpec()])
+        roots = obj_graph.provide_batch(Root, 2)
+        self.assertIsNot(roots[0].dep, roots[1].dep)
+
+    def test_provide_batch_verifies_class(self):
+        self.assertRaises(errors.WrongArgTypeError,
+                          self.obj_graph.provide_batch, 42, 2)
+
+    def test_provide_batch_raises_error_if_not_injectable(self):
+        class NotInjectable(object):
+            pass
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[NotInjectable],
+            only_use_explicit_bindings=True)
+        self.assertRaises(errors.NonExplicitlyBoundClassError,
+                          obj_graph.provide_batch, NotInjectable, 2)
+        self.assertRaises(errors.NonExplicitlyBoundClassError,
+                          obj_graph.provide_many, [NotInjectable])
+
+    def test_provide_many_raises_error_if_closed(self):
+        self.obj_graph.close()
+        self.assertRaises(errors.ClosedObjectGraphError,
+                          self.obj_graph.provide_many, [self.handler_class])
+        self.assertRaises(errors.ClosedObjectGraphError,
+                          self.obj_graph.provide_batch, self.handler_class, 1)
+
+
+class ObjectGraphCallTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class Session(object):
+            pass
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('session', to_class=Session, in_scope=scoping.PROTOTYPE)
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Config, Session],
+            binding_specs=[SomeBindingSpec()])
+        def handle(request, config, session, verbose=False):
+            return request, config, session, verbose
+        self.handle = handle
+
+    def test_call_injects_args_not_passed_directly(self):
+        request, config, session, verbose = self.obj_graph.call(
+            self.handle, 'a-request', verbose=True)
+        self.assertEqual('a-request', request)
+        self.assertEqual('Config', type(config).__name__)
+        self.assertEqual('Session', type(session).__name__)
+        self.assertTrue(verbose)
+
+    def test_call_does_not_inject_args_passed_directly(self):
+        _, config, _, _ = self.obj_graph.call(
+            self.handle, request='a-request', config='a-config')
+        self.assertEqual('a-config', config)
+
+    def test_call_reuses_singletons_and_not_prototypes(self):
+        _, config_1, session_1, _ = self.obj_graph.call(self.handle, 1)
+        _, config_2, session_2, _ = self.obj_graph.call(self.handle, 2)
+        self.assertIs(config_1, config_2)
+        self.assertIsNot(session_1, session_2)
+
+    def test_call_with_bound_method(self):
+        class SomeClass(object):
+            def get_config(self, config):
+                return config
+        self.assertEqual('Config', type(
+            self.obj_graph.call(SomeClass().get_config)).__name__)
+
+    def test_call_reuses_plan_for_bound_methods_of_same_function(self):
+        class SomeClass(object):
+            def get_config(self, config):
+                return self, config
+        some_instance = SomeClass()
+        other_instance = SomeClass()
+        self.obj_graph.call(some_instance.get_config)
+        with mock.patch.object(self.obj_graph, '_new_call_plan') as new_plan:
+            self.assertIs(some_instance, self.obj_graph.call(
+                some_instance.get_config)[0])
+            self.assertIs(other_instance, self.obj_graph.call(
+                other_instance.get_config)[0])
+        self.assertFalse(new_plan.called)
+
+    def test_call_does_not_keep_fns_called(self):
+        fn_refs = []
+        for _ in range(1000):
+            fn = lambda config: config
+            fn_refs.append(weakref.ref(fn))
+            self.obj_graph.call(fn)
+        del fn
+        gc.collect()
+        self.assertEqual([], [fn_ref for fn_ref in fn_refs if fn_ref()])
+
+    def test_call_does_not_keep_instance_of_bound_method(self):
+        class SomeClass(object):
+            def get_config(self, config):
+                return config
+        some_instance = SomeClass()
+        some_instance_ref = weakref.ref(some_instance)
+        self.obj_graph.call(some_instance.get_config)
+        del some_instance
+        gc.collect()
+        self.assertIsNone(some_instance_ref())
+
+    def test_call_raises_error_if_not_callable(self):
+        self.assertRaises(errors.WrongArgTypeError, self.obj_graph.call, 42)
+
+    def test_call_raises_error_if_nothing_injectable(self):
+        self.assertRaises(errors.NothingInjectableForArgError,
+                          self.obj_graph.call, self.handle)
+
+    def test_wrap_calls_with_injection(self):
+        handle = self.obj_graph.wrap(self.handle)
+        _, config_1, session_1, _ = handle('a-request')
+        request, config_2, session_2, _ = handle(request='another-request')
+        self.assertEqual('another-request', request)
+        self.assertIs(config_1, config_2)
+        self.assertIsNot(session_1, session_2)
+
+    def test_wrap_provides_new_singleton_after_invalidation(self):
+        handle = self.obj_graph.wrap(self.handle)
+        _, config_1, _, _ = handle('a-request')
+        self.obj_graph.invalidate('config')
+        _, config_2, _, _ = handle('a-request')
+        self.assertIsNot(config_1, config_2)
+
+    def test_wrap_in_child_reuses_parent_singletons(self):
+        parent_config = self.obj_graph.call(lambda config: config)
+        child_graph = self.obj_graph.child()
+        _, config, _, _ = child_graph.wrap(self.handle)('a-request')
+        self.assertIs(parent_config, config)
+
+    def test_wrap_raises_error_if_closed(self):
+        handle = self.obj_graph.wrap(self.handle)
+        self.obj_graph.close()
+        self.assertRaises(errors.ClosedObjectGraphError, handle, 'a-request')
+        self.assertRaises(errors.ClosedObjectGraphError,
+                          self.obj_graph.call, self.handle, 'a-request')
+
+
+class ObjectGraphOptionalArgTest(unittest.TestCase):
+
+    def setUp(self):
+        class Plugin(object):
+            @decorators.optional_arg('metrics')
+            def __init__(self, metrics=None):
+                self.metrics = metrics
+        self.plugin_class = Plugin
+
+    def test_injects_optional_arg_if_bound(self):
+        class Metrics(object):
+            pass
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.plugin_class, Metrics])
+        self.assertIsInstance(
+            obj_graph.provide(self.plugin_class).metrics, Metrics)
+
+    def test_leaves_optional_arg_to_default_if_unbound(self):
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.plugin_class])
+        self.assertIsNone(obj_graph.provide(self.plugin_class).metrics)
+
+    def test_leaves_optional_arg_to_default_when_called(self):
+        @decorators.optional_arg('metrics')
+        def get_metrics(metrics='no-metrics'):
+            return metrics
+        obj_graph = object_graph.new_object_graph(modules=None, classes=[])
+        self.assertEqual('no-metrics', obj_graph.call(get_metrics))
+
+
+class ObjectGraphTryProvideTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class Plugin(object):
+            def __init__(self, config, capability):
+                pass
+        class PluginHost(object):
+            def __init__(self, plugin):
+                pass
+        class OtherPluginHost(object):
+            def __init__(self, provide_plugin):
+                pass
+        self.config_class = Config
+        self.plugin_host_class = PluginHost
+        self.other_plugin_host_class = OtherPluginHost
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Config, Plugin, PluginHost, OtherPluginHost])
+
+    def test_provides_if_everything_bound(self):
+        self.assertIsInstance(self.obj_graph.try_provide(self.config_class),
+                              self.config_class)
+
+    def test_returns_default_if_something_transitively_unbound(self):
+        self.assertIsNone(self.obj_graph.try_provide(self.plugin_host_class))
+        self.assertEqual('a-default', self.obj_graph.try_provide(
+            self.plugin_host_class, default='a-default'))
+
+    def test_provides_if_injected_provider_fn_unusable(self):
+        self.assertIsInstance(
+            self.obj_graph.try_provide(self.other_plugin_host_class),
+            self.other_plugin_host_class)
+
+    def test_returns_default_if_not_injectable(self):
+        class NotInjectable(object):
+            pass
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[NotInjectable],
+            only_use_explicit_bindings=True)
+        self.assertIsNone(obj_graph.try_provide(NotInjectable))
+
+    def test_checks_through_provider_methods(self):
+        class SomeBindingSpec(bindings.BindingSpec):
+            def provide_capability(self, missing_thing):
+                return 'a-capability'
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.plugin_host_class],
+            binding_specs=[SomeBindingSpec()])
+        self.assertIsNone(obj_graph.try_provide(self.plugin_host_class))
+
+    def test_checks_parent_bindings_in_child(self):
+        child_graph = self.obj_graph.child(
+            classes=[], binding_specs=[])
+        self.assertIsNone(child_graph.try_provide(self.plugin_host_class))
+        self.assertIsInstance(child_graph.try_provide(self.config_class),
+                              self.config_class)
+
+    def test_raises_error_if_closed(self):
+        self.obj_graph.close()
+        self.assertRaises(errors.ClosedObjectGraphError,
+                          self.obj_graph.try_provide, self.config_class)
+
+
+class ObjectGraphFreezeTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class Handler(object):
+            def __init__(self, config):
+                self.config = config
+        class Unused(object):
+            def __init__(self, config):
+                pass
+        self.handler_class = Handler
+        self.unused_class = Unused
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Config, Handler, Unused])
+        self.config = self.obj_graph.provide(Handler).config
+
+    def test_provides_singletons_provided_before_freezing(self):
+        self.obj_graph.freeze()
+        self.assertIs(self.config,
+                      self.obj_graph.provide(self.handler_class).config)
+
+    def test_raises_error_for_singletons_not_provided_before_freezing(self):
+        self.obj_graph.freeze()
+        self.assertRaises(errors.FrozenObjectGraphError,
+                          self.obj_graph.call, lambda unused: unused)
+
+    def test_allows_new_singletons_if_configured(self):
+        self.obj_graph.freeze(allow_new_singletons=True)
+        self.obj_graph.call(lambda unused: unused)
+
+    def test_invalidated_singletons_can_be_provided_again(self):
+        self.obj_graph.freeze()
+        self.obj_graph.invalidate('config')
+        self.assertIsNot(self.config,
+                         self.obj_graph.provide(self.handler_class).config)
+
+
+class ObjectGraphLockMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        class Config(object):
+            pass
+        class Handler(object):
+            def __init__(self, config):
+                self.config = config
+        self.config_class = Config
+        self.handler_class = Handler
+
+    def test_records_nothing_by_default(self):
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.config_class, self.handler_class])
+        obj_graph.provide(self.handler_class)
+        self.assertEqual({}, obj_graph.get_lock_metrics())
+
+    def test_records_singleton_lock_metrics_if_configured(self):
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.config_class, self.handler_class],
+            record_lock_metrics=True)
+        obj_graph.provide(self.handler_class)
+        obj_graph.provide(self.handler_class)
+        binding_key_to_metrics = obj_graph.get_lock_metrics()
+        self.assertEqual(
+            ['config'],
+            [binding_key.get_arg_name()
+             for binding_key in binding_key_to_metrics])
+        [metrics] = binding_key_to_metrics.values()
+        self.assertEqual(1, metrics.num_acquisitions)
+
+    def test_includes_custom_scopes_that_record_lock_metrics(self):
+        config_class = self.config_class
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('config', to_class=config_class, in_scope='cached')
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[self.handler_class],
+            binding_specs=[SomeBindingSpec()],
+            id_to_scope={
+                'cached': scoping.CacheScope(record_lock_metrics=True)})
+        obj_graph.provide(self.handler_class)
+        obj_graph.provide(self.handler_class)
+        arg_name_to_metrics = {
+            binding_key.get_arg_name(): metrics
+            for binding_key, metrics in obj_graph.get_lock_metrics().items()}
+        self.assertEqual(2, arg_name_to_metrics['config'].num_acquisitions)
+
+
+def _is_gil_enabled():
+    # Free-threaded builds of Python 3.13+ can run without the GIL.
+    return getattr(sys, '_is_gil_enabled', lambda: True)()
+
+
+class ObjectGraphConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        constructed = []
+        self.constructed = constructed
+        class Config(object):
+            def __init__(self):
+                constructed.append(self)
+        class Database(object):
+            def __init__(self, config):
+                constructed.append(self)
+                self.config = config
+        class Handler(object):
+            def __init__(self, database):
+                self.database = database
+        class SomeBindingSpec(bindings.BindingSpec):
+            def configure(self, bind):
+                bind('handler', to_class=Handler, in_scope=scoping.PROTOTYPE)
+        self.database_class = Database
+        self.obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Config, Database],
+            binding_specs=[SomeBindingSpec()])
+
+    def run_in_threads(self, num_threads, fn):
+        start = threading.Event()
+        exceptions = []
+        def RunFn():
+            start.wait()
+            try:
+                fn()
+            except Exception as e:
+                exceptions.append(e)
+        threads = [threading.Thread(target=RunFn)
+                   for _ in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        start_time = time.time()
+        start.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], exceptions)
+        return time.time() - start_time
+
+    def test_provides_each_singleton_once_from_many_threads(self):
+        get_handler = lambda handler: handler
+        get_database = lambda database: database
+        handlers = []
+        databases = []
+        def ProvideMany():
+            for _ in range(200):
+                handlers.append(self.obj_graph.call(get_handler))
+                databases.append(self.obj_graph.call(get_database))
+        self.run_in_threads(8, ProvideMany)
+        self.assertEqual(2, len(self.constructed))
+        self.assertEqual(1600, len(set(id(handler) for handler in handlers)))
+        self.assertEqual(1, len(set(id(database) for database in databases)))
+        self.assertTrue(all(handler.database is databases[0]
+                            for handler in handlers))
+
+    @unittest.skipIf(not hasattr(threading, 'Barrier'),
+                     'requires threading.Barrier')
+    def test_provides_independent_singletons_concurrently(self):
+        # Each constructor waits for all the others to be running, so this
+        # only passes if singletons aren't constructed one at a time.
+        barrier = threading.Barrier(4, timeout=5)
+        def __init__(self):
+            barrier.wait()
+        classes = [type('Service{0}'.format(i), (object,),
+                        {'__init__': __init__})
+                   for i in range(4)]
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=classes)
+        fns = [lambda service_0: None, lambda service_1: None,
+               lambda service_2: None, lambda service_3: None]
+        self.run_in_threads(4, lambda: obj_graph.call(fns.pop()))
+
+    @unittest.skipIf(_is_gil_enabled() or multiprocessing.cpu_count() < 4,
+                     'requires a free-threaded build and at least 4 cores')
+    def test_providing_memoized_singletons_scales_with_threads(self):
+        get_database = lambda database: database
+        self.obj_graph.call(get_database)
+        def ProvideMany():
+            for _ in range(20000):
+                self.obj_graph.call(get_database)
+        one_thread_secs = self.run_in_threads(1, ProvideMany)
+        four_threads_secs = self.run_in_threads(4, ProvideMany)
+        # Four threads do four times the work, so if providing serialized
+        # them, it'd take about four times as long.
+        self.assertLess(four_threads_secs, one_thread_secs * 2.5)
+
+
+class ObjectGraphCacheScopeTest(unittest.TestCase):
+
+    def test_memoizes_per_direct_args_to_provider_fn(self):
+        class Client(object):
+            def __init__(self, region):
+                self.region = region
+        class Service(object):
+            def __init__(self, provide_client):
+                self.eu_client = provide_client(region='eu')
+                self.us_client = provide_client(region='us')
+        class SomeBindingSpec(bindings.BindingSpec):
+            @decorators.provides(in_scope='cached')
+            @decorators.inject(all_except=['region'])
+            def provide_client(self, region):
+                return Client(region)
+        obj_graph = object_graph.new_object_graph(
+            modules=None, classes=[Service],
+            binding_specs=[SomeBindingSpec()],
+            id_to_scope={'cached': scoping.CacheScope(max_entries=10)})
+        service = obj_graph.provide(Service)
+        self.assertEqual(('eu', 'us'), (service.eu_client.region,
+                                        service.us_client.region))
+        other_service = obj_graph.provide(Service)
+        self.assertIs(service.eu_client, other_service.eu_client)
+        self.assertIs(service.us_client, other_service.us_client)
@@ -14,7 +14,9 @@ limitations under the License.
 """
 
 
+import gc
 import unittest
+import weakref
 
 from pinject import arg_binding_keys
 from pinject import bindings
@@ -124,3 +126,108 @@ class ObjectProviderTest(unittest.TestCase):
             foo, new_injection_context(), [], {})
         self.assertEqual([], pargs)
         self.assertEqual({'bar': 'a-bar'}, kwargs)
+
+
+class CallPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.singleton_scope = scoping.SingletonScope()
+        self.binding_key = arg_binding_keys.new('bar').binding_key
+        self.provided = []
+        def provide_bar():
+            self.provided.append('a-bar')
+            return 'a-bar'
+        binding = bindings.Binding(
+            self.binding_key,
+            lambda injection_context, obj_provider, pargs, kwargs: (
+                provide_bar()),
+            lambda: 'unused-desc', scoping.SINGLETON, lambda: 'unused-loc')
+        self.obj_provider = object_providers.ObjectProvider(
+            bindings.BindingMapping({self.binding_key: binding}, {}),
+            scoping.BindableScopes({scoping.SINGLETON: self.singleton_scope}),
+            allow_injecting_none=False)
+
+    def new_call_plan(self, fn):
+        return object_providers.CallPlan(
+            self.obj_provider, fn,
+            injection_contexts.InjectionContextFactory(lambda _1, _2: True))
+
+    def test_calls_with_injection(self):
+        fn = lambda foo, bar: foo + '-' + bar
+        call_plan = self.new_call_plan(fn)
+        self.assertEqual('a-foo-a-bar', call_plan.call(fn, ['a-foo'], {}))
+        self.assertEqual('b-foo-a-bar',
+                         call_plan.call(fn, [], {'foo': 'b-foo'}))
+
+    def test_does_not_inject_args_passed_directly(self):
+        fn = lambda bar: bar
+        call_plan = self.new_call_plan(fn)
+        self.assertEqual('other-bar',
+                         call_plan.call(fn, [], {'bar': 'other-bar'}))
+        self.assertEqual('other-bar', call_plan.call(fn, ['other-bar'], {}))
+        self.assertEqual([], self.provided)
+
+    def test_reuses_instances_memoized_by_scope(self):
+        fn = lambda bar: bar
+        call_plan = self.new_call_plan(fn)
+        call_plan.call(fn, [], {})
+        call_plan.call(fn, [], {})
+        self.assertEqual(['a-bar'], self.provided)
+
+    def test_provides_again_after_scope_drops_instance(self):
+        fn = lambda bar: bar
+        call_plan = self.new_call_plan(fn)
+        call_plan.call(fn, [], {})
+        self.singleton_scope.drop([self.binding_key])
+        call_plan.call(fn, [], {})
+        self.assertEqual(['a-bar', 'a-bar'], self.provided)
+
+    def test_does_not_keep_fn(self):
+        fn = lambda bar: bar
+        fn_ref = weakref.ref(fn)
+        call_plan = self.new_call_plan(fn)
+        call_plan.call(fn, [], {})
+        del fn
+        gc.collect()
+        self.assertIsNone(fn_ref())
+
+
+class IsProvidableClassTest(unittest.TestCase):
+
+    def setUp(self):
+        class Foo(object):
+            def __init__(self, bar):
+                pass
+        self.foo_class = Foo
+        binding_key = arg_binding_keys.new('bar').binding_key
+        binding = bindings.new_binding_to_instance(
+            binding_key, 'a-bar', 'a-scope', lambda: 'unused-loc')
+        self.obj_provider = object_providers.ObjectProvider(
+            bindings.BindingMapping({binding_key: binding}, {}),
+            scoping.BindableScopes({'a-scope': scoping.PrototypeScope()}),
+            allow_injecting_none=False)
+
+    def test_class_with_bound_args_is_providable(self):
+        self.assertTrue(self.obj_provider.is_providable_class(self.foo_class))
+
+    def test_class_with_unbound_arg_is_not_providable(self):
+        class Baz(object):
+            def __init__(self, bar, unbound):
+                pass
+        self.assertFalse(self.obj_provider.is_providable_class(Baz))
+
+    def test_class_with_unbound_optional_arg_is_providable(self):
+        class Baz(object):
+            @decorators.optional_arg('unbound')
+            def __init__(self, bar, unbound=None):
+                pass
+        self.assertTrue(self.obj_provider.is_providable_class(Baz))
+
+    def test_get_bound_arg_binding_keys_omits_unbound_optional_args(self):
+        bound = arg_binding_keys.new('bar', is_optional=True)
+        unbound = arg_binding_keys.new('unbound', is_optional=True)
+        required = arg_binding_keys.new('required')
+        self.assertEqual(
+            [bound, required],
+            self.obj_provider.get_bound_arg_binding_keys(
+                [bound, unbound, required]))
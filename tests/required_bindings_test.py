@@ -34,4 +34,5 @@ class RequiredBindingsTest(unittest.TestCase):
         self.assertEqual(
             binding_keys.new('an-arg-name', annotated_with='annot'),
             required_binding.binding_key)
-        self.assertIn('required_bindings_test.py', required_binding.require_loc)
+        self.assertIn('required_bindings_test.py',
+                      str(required_binding.require_loc))
@@ -14,10 +14,15 @@ limitations under the License.
 """
 
 
+import gc
+import threading
 import unittest
 
+import mock
+
 from pinject import bindings
 from pinject import binding_keys
+from pinject import dependencies
 from pinject import errors
 from pinject import scoping
 
@@ -62,6 +67,830 @@ class SingletonScopeTest(unittest.TestCase):
                          self.scope.provide(self.binding_key_one,
                                             provide_from_singleton_scope))
 
+    def test_provides_memoized_instance_without_locking(self):
+        instance = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope._lock = None
+        self.assertIs(instance,
+                      self.scope.provide(self.binding_key_one, self.provider_fn))
+
+    def test_frozen_scope_raises_error_for_new_binding_key(self):
+        instance = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope.freeze(allow_new_instances=False)
+        self.assertIs(instance,
+                      self.scope.provide(self.binding_key_one, self.provider_fn))
+        self.assertRaises(errors.FrozenObjectGraphError, self.scope.provide,
+                          self.binding_key_two, self.provider_fn)
+
+    def test_frozen_scope_provides_dropped_binding_key_anew(self):
+        instance = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope.freeze(allow_new_instances=False)
+        self.scope.drop([self.binding_key_one])
+        self.assertIsNot(instance, self.scope.provide(
+            self.binding_key_one, self.provider_fn))
+
+    def test_frozen_scope_allowing_new_instances_provides_them(self):
+        self.scope.freeze(allow_new_instances=False)
+        self.scope.freeze(allow_new_instances=True)
+        self.scope.provide(self.binding_key_two, self.provider_fn)
+
+
+    def test_get_aliased_binding_keys_includes_keys_with_same_instance(self):
+        binding_key_three = binding_keys.new('three')
+        instance = object()
+        self.scope.provide(self.binding_key_one, lambda: instance)
+        self.scope.provide(self.binding_key_two, lambda: instance)
+        self.scope.provide(binding_key_three, self.provider_fn)
+        self.assertEqual(
+            {self.binding_key_one, self.binding_key_two},
+            self.scope.get_aliased_binding_keys([self.binding_key_one]))
+
+    def test_get_aliased_binding_keys_ignores_unmemoized_keys(self):
+        self.assertEqual(
+            set(), self.scope.get_aliased_binding_keys([self.binding_key_one]))
+
+    def test_drop_causes_provider_fn_to_be_called_again(self):
+        first = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope.drop([self.binding_key_one, self.binding_key_two])
+        self.assertNotEqual(
+            first, self.scope.provide(self.binding_key_one, self.provider_fn))
+
+    def test_provides_after_reset_after_fork(self):
+        first = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope.reset_after_fork()
+        self.assertEqual(
+            first, self.scope.provide(self.binding_key_one, self.provider_fn))
+
+    def test_pop_instances_returns_instances_in_reverse_creation_order(self):
+        def provide_with_dependency():
+            self.scope.provide(self.binding_key_two, lambda: 'dependency')
+            return 'dependent'
+        self.scope.provide(self.binding_key_one, provide_with_dependency)
+        self.assertEqual(['dependent', 'dependency'],
+                         self.scope.pop_instances())
+
+    def test_pop_instances_returns_aliased_instance_once(self):
+        instance = object()
+        self.scope.provide(self.binding_key_one, lambda: instance)
+        self.scope.provide(self.binding_key_two, lambda: instance)
+        self.assertEqual([instance], self.scope.pop_instances())
+
+    def test_pop_instances_forgets_instances(self):
+        first = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope.pop_instances()
+        self.assertEqual([], self.scope.pop_instances())
+        self.assertNotEqual(
+            first, self.scope.provide(self.binding_key_one, self.provider_fn))
+
+    def test_pop_instances_skips_dropped_instances(self):
+        self.scope.provide(self.binding_key_one, lambda: 'one')
+        self.scope.provide(self.binding_key_two, lambda: 'two')
+        self.scope.drop([self.binding_key_one])
+        self.assertEqual(['two'], self.scope.pop_instances())
+
+    def test_pop_binding_keys_and_instances(self):
+        self.scope.provide(self.binding_key_one, lambda: 'one')
+        self.scope.provide(self.binding_key_two, lambda: 'two')
+        self.assertEqual(
+            [(self.binding_key_two, 'two'), (self.binding_key_one, 'one')],
+            self.scope.pop_binding_keys_and_instances())
+        self.assertEqual([], self.scope.pop_binding_keys_and_instances())
+
+
+class SingletonScopeConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = scoping.SingletonScope()
+        self.binding_key_one = binding_keys.new('one')
+        self.binding_key_two = binding_keys.new('two')
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def blocking_provider_fn(self):
+        self.started.set()
+        self.assertTrue(self.release.wait(5))
+        return object()
+
+    def start_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.release.set)
+        return thread
+
+    def test_provides_different_binding_keys_concurrently(self):
+        self.start_thread(lambda: self.scope.provide(
+            self.binding_key_one, self.blocking_provider_fn))
+        self.assertTrue(self.started.wait(5))
+        self.assertEqual(
+            'two', self.scope.provide(self.binding_key_two, lambda: 'two'))
+
+    def test_provides_same_binding_key_once_for_concurrent_threads(self):
+        provided = []
+        self.start_thread(lambda: provided.append(self.scope.provide(
+            self.binding_key_one, self.blocking_provider_fn)))
+        self.assertTrue(self.started.wait(5))
+        thread = self.start_thread(lambda: provided.append(self.scope.provide(
+            self.binding_key_one, lambda: 'unused')))
+        self.release.set()
+        thread.join()
+        self.assertEqual(2, len(provided))
+        self.assertIs(provided[0], provided[1])
+
+    def test_waiting_thread_provides_instance_if_providing_fails(self):
+        def fail():
+            self.started.set()
+            self.assertTrue(self.release.wait(5))
+            raise ValueError('a-failure')
+        errors_raised = []
+        def ProvideAndFail():
+            try:
+                self.scope.provide(self.binding_key_one, fail)
+            except ValueError as e:
+                errors_raised.append(e)
+        failing_thread = self.start_thread(ProvideAndFail)
+        self.assertTrue(self.started.wait(5))
+        threading.Timer(0.01, self.release.set).start()
+        self.assertEqual(
+            'one', self.scope.provide(self.binding_key_one, lambda: 'one'))
+        failing_thread.join()
+        self.assertEqual(1, len(errors_raised))
+
+    def test_does_not_deadlock_on_cyclic_providing_across_threads(self):
+        one_started = threading.Event()
+        two_started = threading.Event()
+        def ProvideOne():
+            one_started.set()
+            self.assertTrue(two_started.wait(5))
+            self.scope.provide(self.binding_key_two, lambda: 'two-from-one')
+            return 'one'
+        def ProvideTwo():
+            two_started.set()
+            self.assertTrue(one_started.wait(5))
+            self.scope.provide(self.binding_key_one, lambda: 'one-from-two')
+            return 'two'
+        thread = self.start_thread(
+            lambda: self.scope.provide(self.binding_key_one, ProvideOne))
+        self.scope.provide(self.binding_key_two, ProvideTwo)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_does_not_memoize_instance_dropped_while_being_provided(self):
+        self.start_thread(lambda: self.scope.provide(
+            self.binding_key_one, self.blocking_provider_fn))
+        self.assertTrue(self.started.wait(5))
+        self.scope.drop([self.binding_key_one])
+        self.release.set()
+        self.assertEqual(
+            'one', self.scope.provide(self.binding_key_one, lambda: 'one'))
+
+    def test_reset_after_fork_forgets_instances_being_provided(self):
+        self.start_thread(lambda: self.scope.provide(
+            self.binding_key_one, self.blocking_provider_fn))
+        self.assertTrue(self.started.wait(5))
+        self.scope.reset_after_fork()
+        self.assertEqual(
+            'one', self.scope.provide(self.binding_key_one, lambda: 'one'))
+
+
+class OverlaySingletonScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parent_scope = scoping.SingletonScope()
+        self.binding_key_one = binding_keys.new('one')
+        self.binding_key_two = binding_keys.new('two')
+        self.provider_fn = lambda: object()
+        self.parent_one = self.parent_scope.provide(
+            self.binding_key_one, self.provider_fn)
+        self.parent_two = self.parent_scope.provide(
+            self.binding_key_two, self.provider_fn)
+        self.parent_dependency_index = dependencies.DependencyIndex()
+        self.scope = scoping.OverlaySingletonScope(
+            self.parent_scope, [self.binding_key_two],
+            self.parent_dependency_index)
+
+    def test_shares_parent_instances(self):
+        self.assertIs(self.parent_one, self.scope.provide(
+            self.binding_key_one, self.provider_fn))
+
+    def test_does_not_share_stale_parent_instances(self):
+        instance = self.scope.provide(self.binding_key_two, self.provider_fn)
+        self.assertIsNot(self.parent_two, instance)
+        self.assertIs(instance, self.scope.provide(
+            self.binding_key_two, self.provider_fn))
+
+    def test_does_not_share_instances_provided_with_stale_ones(self):
+        self.parent_dependency_index.record(
+            self.binding_key_two, self.binding_key_one)
+        self.assertIsNot(self.parent_one, self.scope.provide(
+            self.binding_key_one, self.provider_fn))
+
+    def test_does_not_share_stale_instances_provided_by_parent_later(self):
+        binding_key_three = binding_keys.new('three')
+        self.assertIsNone(self.scope.get_memoized(binding_key_three))
+        self.parent_dependency_index.record(
+            self.binding_key_two, binding_key_three)
+        self.parent_scope.provide(binding_key_three, self.provider_fn)
+        self.assertIsNone(self.scope.get_memoized(binding_key_three))
+
+    def test_does_not_memoize_in_parent(self):
+        binding_key_three = binding_keys.new('three')
+        instance = self.scope.provide(binding_key_three, self.provider_fn)
+        self.assertIsNone(self.parent_scope.get_memoized(binding_key_three))
+        self.assertIs(instance, self.scope.get_memoized(binding_key_three))
+
+    def test_drop_stops_sharing_parent_instances(self):
+        self.scope.drop([self.binding_key_one])
+        self.assertIsNot(self.parent_one, self.scope.provide(
+            self.binding_key_one, self.provider_fn))
+        self.assertIs(self.parent_one, self.parent_scope.get_memoized(
+            self.binding_key_one))
+
+    def test_pop_instances_returns_own_instances_only(self):
+        instance = self.scope.provide(self.binding_key_two, self.provider_fn)
+        self.assertEqual([instance], self.scope.pop_instances())
+
+
+class WeakSingletonScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = scoping.WeakSingletonScope()
+        self.binding_key = binding_keys.new('one')
+        self.provider_fn = lambda: Weakrefable()
+
+    def provide(self):
+        return self.scope.provide(self.binding_key, self.provider_fn)
+
+    def test_is_same_instance_while_referenced(self):
+        instance = self.provide()
+        self.assertIs(instance, self.provide())
+
+    def test_is_new_instance_once_unreferenced(self):
+        created = []
+        def provider_fn():
+            created.append(None)
+            return Weakrefable()
+        self.scope.provide(self.binding_key, provider_fn)
+        gc.collect()
+        self.scope.provide(self.binding_key, provider_fn)
+        self.assertEqual(2, len(created))
+
+    def test_raises_error_if_instance_not_weakly_referenceable(self):
+        self.assertRaises(errors.UnweakrefableInstanceError,
+                          self.scope.provide, self.binding_key, lambda: 42)
+
+    def test_drop_forgets_instances_for_binding_keys(self):
+        instance = self.provide()
+        self.scope.drop([self.binding_key])
+        self.assertIsNot(instance, self.provide())
+
+    def test_pop_instances_returns_referenced_instances(self):
+        instance = self.provide()
+        self.assertEqual([instance], self.scope.pop_instances())
+        self.assertEqual([], self.scope.pop_instances())
+
+
+class Weakrefable(object):
+    pass
+
+
+class RequestScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = scoping.RequestScope()
+        self.binding_key_one = binding_keys.new('one')
+        self.binding_key_two = binding_keys.new('two')
+        self.provider_fn = lambda: object()
+
+    def test_raises_error_outside_of_request(self):
+        self.assertRaises(errors.NoActiveRequestError, self.scope.provide,
+                          self.binding_key_one, self.provider_fn)
+
+    def test_calls_provider_fn_just_once_per_request(self):
+        token = self.scope.enter()
+        first = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.assertIs(
+            first, self.scope.provide(self.binding_key_one, self.provider_fn))
+        self.scope.exit(token)
+        token = self.scope.enter()
+        self.assertIsNot(
+            first, self.scope.provide(self.binding_key_one, self.provider_fn))
+        self.scope.exit(token)
+
+    def test_exit_returns_instances_in_reverse_creation_order(self):
+        def provide_with_dependency():
+            self.scope.provide(self.binding_key_two, lambda: 'dependency')
+            return 'dependent'
+        token = self.scope.enter()
+        self.scope.provide(self.binding_key_one, provide_with_dependency)
+        self.assertEqual(['dependent', 'dependency'], self.scope.exit(token))
+
+    def test_exit_returns_aliased_instance_once(self):
+        instance = object()
+        token = self.scope.enter()
+        self.scope.provide(self.binding_key_one, lambda: instance)
+        self.scope.provide(self.binding_key_two, lambda: instance)
+        self.assertEqual([instance], self.scope.exit(token))
+
+    def test_nested_request_restores_outer_request(self):
+        outer_token = self.scope.enter()
+        outer = self.scope.provide(self.binding_key_one, self.provider_fn)
+        inner_token = self.scope.enter()
+        self.assertIsNot(
+            outer, self.scope.provide(self.binding_key_one, self.provider_fn))
+        self.scope.exit(inner_token)
+        self.assertIs(
+            outer, self.scope.provide(self.binding_key_one, self.provider_fn))
+        self.scope.exit(outer_token)
+        self.assertFalse(self.scope.is_in_request())
+
+    def test_drop_forgets_instances_but_still_returns_them_on_exit(self):
+        token = self.scope.enter()
+        first = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.scope.drop([self.binding_key_one])
+        second = self.scope.provide(self.binding_key_one, self.provider_fn)
+        self.assertIsNot(first, second)
+        self.assertEqual([second, first], self.scope.exit(token))
+
+    def test_requests_in_other_threads_are_separate(self):
+        token = self.scope.enter()
+        self.scope.provide(self.binding_key_one, lambda: 'main-thread')
+        provided = []
+        def ProvideInOtherThread():
+            other_token = self.scope.enter()
+            provided.append(
+                self.scope.provide(self.binding_key_one, lambda: 'other'))
+            self.scope.exit(other_token)
+        thread = threading.Thread(target=ProvideInOtherThread)
+        thread.start()
+        thread.join()
+        self.assertEqual(['other'], provided)
+        self.assertEqual(['main-thread'], self.scope.exit(token))
+
+
+class FakeCloser(object):
+
+    def __init__(self):
+        self.closed = []
+
+    def close_all(self, instances):
+        self.closed.extend(instances)
+
+
+class ThreadScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = scoping.ThreadScope()
+        self.binding_key_one = binding_keys.new('one')
+        self.binding_key_two = binding_keys.new('two')
+        self.provider_fn = lambda: object()
+
+    def provide_in_other_thread(self, binding_key):
+        provided = []
+        thread = threading.Thread(target=lambda: provided.append(
+            self.scope.provide(binding_key, self.provider_fn)))
+        thread.start()
+        thread.join()
+        return provided[0]
+
+    def test_calls_provider_fn_just_once_per_thread(self):
+        self.assertIs(
+            self.scope.provide(self.binding_key_one, self.provider_fn),
+            self.scope.provide(self.binding_key_one, self.provider_fn))
+
+    def test_provides_different_instances_in_different_threads(self):
+        self.assertIsNot(
+            self.scope.provide(self.binding_key_one, self.provider_fn),
+            self.provide_in_other_thread(self.binding_key_one))
+
+    def test_closes_instances_when_thread_exits(self):
+        closer = FakeCloser()
+        self.scope.set_closer(closer)
+        instance = self.provide_in_other_thread(self.binding_key_one)
+        gc.collect()
+        self.assertEqual([instance], closer.closed)
+
+    def test_drop_forgets_instances_in_all_threads(self):
+        first = self.scope.provide(self.binding_key_one, self.provider_fn)
+        def DropInOtherThread():
+            self.scope.drop([self.binding_key_one])
+        thread = threading.Thread(target=DropInOtherThread)
+        thread.start()
+        thread.join()
+        self.assertIsNot(
+            first, self.scope.provide(self.binding_key_one, self.provider_fn))
+
+    def test_pop_instances_returns_instances_of_all_threads(self):
+        def provide_with_dependency():
+            self.scope.provide(self.binding_key_two, lambda: 'dependency')
+            return 'dependent'
+        self.scope.provide(self.binding_key_one, provide_with_dependency)
+        self.assertEqual(['dependent', 'dependency'],
+                         self.scope.pop_instances())
+        self.assertEqual([], self.scope.pop_instances())
+
+
+class TenantScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.closer = FakeCloser()
+        self.scope = scoping.TenantScope(max_tenants=2)
+        self.scope.set_closer(self.closer)
+        self.binding_key = binding_keys.new('one')
+        self.provider_fn = lambda: object()
+
+    def provide(self, tenant_key):
+        with self.scope.tenant(tenant_key):
+            return self.scope.provide(self.binding_key, self.provider_fn)
+
+    def test_raises_error_outside_of_tenant_block(self):
+        self.assertRaises(errors.NoActiveTenantError, self.scope.provide,
+                          self.binding_key, self.provider_fn)
+
+    def test_is_same_instance_for_same_tenant(self):
+        self.assertIs(self.provide('a'), self.provide('a'))
+
+    def test_is_different_instance_for_different_tenants(self):
+        self.assertIsNot(self.provide('a'), self.provide('b'))
+
+    def test_evicts_and_closes_least_recently_used_tenant(self):
+        instance_a = self.provide('a')
+        self.provide('b')
+        self.provide('a')
+        instance_b = self.provide('b')
+        self.provide('c')
+        self.assertEqual([instance_a], self.closer.closed)
+        self.assertIs(instance_b, self.provide('b'))
+
+    def test_does_not_evict_tenants_in_use(self):
+        with self.scope.tenant('a'):
+            instance_a = self.scope.provide(self.binding_key, self.provider_fn)
+            self.provide('b')
+            self.provide('c')
+            self.assertIs(instance_a, self.scope.provide(
+                self.binding_key, self.provider_fn))
+
+    def test_evicts_beyond_max_weight(self):
+        scope = scoping.TenantScope(
+            max_weight=5, get_weight_fn=lambda instance: len(instance))
+        for tenant_key in ['a', 'b']:
+            with scope.tenant(tenant_key):
+                scope.provide(self.binding_key, lambda: 'abc')
+        self.assertEqual({'b': 3}, scope.get_tenant_weights())
+
+    def test_evict_closes_tenant_instances(self):
+        instance = self.provide('a')
+        self.scope.evict('a')
+        self.assertEqual([instance], self.closer.closed)
+        self.assertEqual({}, self.scope.get_tenant_weights())
+
+    def test_evict_during_tenant_block_closes_later_instances_on_exit(self):
+        with self.scope.tenant('a'):
+            self.scope.evict('a')
+            instance = self.scope.provide(self.binding_key, self.provider_fn)
+            self.assertEqual([], self.closer.closed)
+        self.assertEqual([instance], self.closer.closed)
+
+    def test_evict_during_tenant_block_does_not_leak_weight(self):
+        scope = scoping.TenantScope(
+            max_weight=5, get_weight_fn=lambda instance: len(instance))
+        with scope.tenant('a'):
+            scope.evict('a')
+            scope.provide(self.binding_key, lambda: 'abc')
+        for tenant_key in ['b', 'c']:
+            with scope.tenant(tenant_key):
+                scope.provide(self.binding_key, lambda: 'abc')
+        self.assertEqual({'c': 3}, scope.get_tenant_weights())
+
+    def test_drop_forgets_instances_of_all_tenants(self):
+        instance_a = self.provide('a')
+        instance_b = self.provide('b')
+        self.scope.drop([self.binding_key])
+        self.assertIsNot(instance_a, self.provide('a'))
+        self.assertIsNot(instance_b, self.provide('b'))
+        self.assertEqual([], self.closer.closed)
+
+    def test_pop_instances_returns_all_tenants_instances(self):
+        instance_a = self.provide('a')
+        instance_b = self.provide('b')
+        self.assertEqual([instance_a, instance_b], self.scope.pop_instances())
+        self.assertEqual([], self.scope.pop_instances())
+
+
+class PoolScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scope = scoping.PoolScope(max_size=2, timeout_secs=0.01)
+        self.binding_key = binding_keys.new('one')
+        self.provider_fn = lambda: object()
+
+    def provide(self):
+        return self.scope.provide(self.binding_key, self.provider_fn)
+
+    def test_raises_error_outside_of_lease(self):
+        self.assertRaises(errors.NoActivePoolLeaseError, self.provide)
+
+    def test_provides_same_instance_within_lease(self):
+        with self.scope.lease():
+            self.assertIs(self.provide(), self.provide())
+
+    def test_reuses_returned_instances(self):
+        with self.scope.lease():
+            first = self.provide()
+        with self.scope.lease():
+            self.assertIs(first, self.provide())
+
+    def test_creates_instances_up_to_max_size(self):
+        with self.scope.lease():
+            first = self.provide()
+            with self.scope.lease():
+                self.assertIsNot(first, self.provide())
+
+    def test_raises_error_after_timeout_if_pool_exhausted(self):
+        with self.scope.lease():
+            self.provide()
+            with self.scope.lease():
+                self.provide()
+                with self.scope.lease():
+                    self.assertRaises(errors.PoolTimeoutError, self.provide)
+        [metrics] = self.scope.get_metrics().values()
+        self.assertEqual(1, metrics.num_timeouts)
+
+    def test_waits_for_instance_to_be_returned(self):
+        scope = scoping.PoolScope(max_size=1)
+        lease_started = threading.Event()
+        release_lease = threading.Event()
+        def HoldLease():
+            with scope.lease():
+                scope.provide(self.binding_key, self.provider_fn)
+                lease_started.set()
+                release_lease.wait()
+        thread = threading.Thread(target=HoldLease)
+        thread.start()
+        lease_started.wait()
+        threading.Timer(0.01, release_lease.set).start()
+        with scope.lease():
+            scope.provide(self.binding_key, self.provider_fn)
+        thread.join()
+        [metrics] = scope.get_metrics().values()
+        self.assertEqual(1, metrics.num_waits)
+        self.assertGreater(metrics.max_wait_secs, 0)
+
+    def test_does_not_count_instance_whose_creation_failed(self):
+        def fail():
+            raise ValueError('a-failure')
+        with self.scope.lease():
+            self.assertRaises(
+                ValueError, self.scope.provide, self.binding_key, fail)
+        [metrics] = self.scope.get_metrics().values()
+        self.assertEqual(0, metrics.in_use)
+
+    def test_reports_in_use_and_idle_instances(self):
+        with self.scope.lease():
+            self.provide()
+            with self.scope.lease():
+                self.provide()
+            [metrics] = self.scope.get_metrics().values()
+            self.assertEqual((1, 1), (metrics.in_use, metrics.idle))
+
+    def test_pop_instances_returns_idle_instances(self):
+        with self.scope.lease():
+            instance = self.provide()
+        self.assertEqual([instance], self.scope.pop_instances())
+        self.assertEqual([], self.scope.pop_instances())
+
+
+class CacheScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.binding_key = binding_keys.new('one')
+        self.provider_fn = lambda: object()
+        self.now = 0
+        patcher = mock.patch.object(scoping, '_get_time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def provide(self, scope, binding_key=None):
+        return scope.provide(binding_key or self.binding_key, self.provider_fn)
+
+    def test_is_same_instance_for_same_binding_key(self):
+        scope = scoping.CacheScope()
+        self.assertIs(self.provide(scope), self.provide(scope))
+
+    def test_evicts_least_recently_used_beyond_max_entries(self):
+        scope = scoping.CacheScope(max_entries=2)
+        one = self.provide(scope, binding_keys.new('one'))
+        two = self.provide(scope, binding_keys.new('two'))
+        self.provide(scope, binding_keys.new('one'))
+        self.provide(scope, binding_keys.new('three'))
+        self.assertIs(one, self.provide(scope, binding_keys.new('one')))
+        self.assertIsNot(two, self.provide(scope, binding_keys.new('two')))
+
+    def test_evicts_instances_older_than_max_age(self):
+        scope = scoping.CacheScope(max_age_secs=10)
+        instance = self.provide(scope)
+        self.now = 10
+        self.assertIs(instance, self.provide(scope))
+        self.now = 11
+        self.assertIsNot(instance, self.provide(scope))
+
+    def test_evicts_beyond_max_weight(self):
+        scope = scoping.CacheScope(
+            max_weight=5, get_weight_fn=lambda instance: len(instance))
+        self.provider_fn = lambda: 'abc'
+        self.provide(scope, binding_keys.new('one'))
+        self.provide(scope, binding_keys.new('two'))
+        self.assertEqual(1, scope.get_num_entries())
+        self.provider_fn = lambda: 'too-heavy'
+        self.provide(scope, binding_keys.new('three'))
+        self.assertEqual(0, scope.get_num_entries())
+
+    def test_drop_forgets_instances_for_binding_keys(self):
+        scope = scoping.CacheScope()
+        direct_args_binding_key = binding_keys.new_with_direct_args(
+            self.binding_key, (), {'region': 'eu'})
+        instance = self.provide(scope, direct_args_binding_key)
+        scope.drop([self.binding_key])
+        self.assertIsNot(instance, self.provide(scope, direct_args_binding_key))
+
+    def test_pop_instances_returns_instances_in_reverse_creation_order(self):
+        scope = scoping.CacheScope()
+        one = self.provide(scope, binding_keys.new('one'))
+        two = self.provide(scope, binding_keys.new('two'))
+        self.provide(scope, binding_keys.new('one'))
+        self.assertEqual([two, one], scope.pop_instances())
+        self.assertEqual([], scope.pop_instances())
+
+
+class ProvidingOutsideLockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.binding_key_one = binding_keys.new('one')
+        self.binding_key_two = binding_keys.new('two')
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def blocking_provider_fn(self):
+        self.started.set()
+        self.assertTrue(self.release.wait(5))
+        return object()
+
+    def start_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.release.set)
+        return thread
+
+    def assert_provides_different_binding_keys_concurrently(self, provide):
+        self.start_thread(
+            lambda: provide(self.binding_key_one, self.blocking_provider_fn))
+        self.assertTrue(self.started.wait(5))
+        self.assertEqual('two', provide(self.binding_key_two, lambda: 'two'))
+
+    def test_cache_scope_provides_different_binding_keys_concurrently(self):
+        self.assert_provides_different_binding_keys_concurrently(
+            scoping.CacheScope().provide)
+
+    def test_request_scope_provides_different_binding_keys_concurrently(self):
+        scope = scoping.RequestScope()
+        token = scope.enter()
+        self.addCleanup(scope.exit, token)
+        request = scope._current_request.get()
+        def ProvideInRequest():
+            # Joins the main thread's request.
+            scope._current_request.set(request)
+            scope.provide(self.binding_key_one, self.blocking_provider_fn)
+        self.start_thread(ProvideInRequest)
+        self.assertTrue(self.started.wait(5))
+        self.assertEqual(
+            'two', scope.provide(self.binding_key_two, lambda: 'two'))
+
+    def test_tenant_scope_provides_different_binding_keys_concurrently(self):
+        scope = scoping.TenantScope()
+        def Provide(binding_key, provider_fn):
+            with scope.tenant('a'):
+                return scope.provide(binding_key, provider_fn)
+        self.assert_provides_different_binding_keys_concurrently(Provide)
+
+    def test_does_not_deadlock_providing_cache_through_singleton(self):
+        # x (cached) depends on s (a singleton), which depends on y (cached).
+        cache_scope = scoping.CacheScope()
+        singleton_scope = scoping.SingletonScope()
+        x_started = threading.Event()
+        def ProvideY():
+            return cache_scope.provide(binding_keys.new('y'), lambda: 'y')
+        def ProvideS():
+            self.started.set()
+            self.assertTrue(x_started.wait(5))
+            ProvideY()
+            return 's'
+        def ProvideX():
+            x_started.set()
+            return singleton_scope.provide(binding_keys.new('s'), ProvideS)
+        thread = self.start_thread(lambda: singleton_scope.provide(
+            binding_keys.new('s'), ProvideS))
+        self.assertTrue(self.started.wait(5))
+        self.assertEqual(
+            's', cache_scope.provide(binding_keys.new('x'), ProvideX))
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+
+class LockMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.binding_key = binding_keys.new('one')
+        self.times = []
+        patcher = mock.patch.object(
+            scoping, '_get_time', lambda: self.times.pop(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_records_nothing_by_default(self):
+        scope = scoping.SingletonScope()
+        scope.provide(self.binding_key, lambda: object())
+        self.assertEqual({}, scope.get_lock_metrics())
+
+    def test_records_wait_and_hold_times(self):
+        scope = scoping.SingletonScope(record_lock_metrics=True)
+        # Waits 0.005 secs, then holds for 0.5 secs.
+        self.times = [10.0, 10.005, 10.505]
+        scope.provide(self.binding_key, lambda: object())
+        [metrics] = scope.get_lock_metrics().values()
+        self.assertEqual(1, metrics.num_acquisitions)
+        self.assertAlmostEqual(0.005, metrics.total_wait_secs)
+        self.assertAlmostEqual(0.005, metrics.max_wait_secs)
+        self.assertEqual((0, 0, 0, 1, 0, 0, 0), metrics.wait_histogram)
+        self.assertAlmostEqual(0.5, metrics.total_hold_secs)
+        self.assertAlmostEqual(0.5, metrics.max_hold_secs)
+
+    def test_does_not_take_lock_for_memoized_singleton(self):
+        scope = scoping.SingletonScope(record_lock_metrics=True)
+        self.times = [0.0, 0.0, 0.0]
+        scope.provide(self.binding_key, lambda: object())
+        scope.provide(self.binding_key, lambda: object())
+        [metrics] = scope.get_lock_metrics().values()
+        self.assertEqual(1, metrics.num_acquisitions)
+
+    def test_records_per_binding_key(self):
+        scope = scoping.SingletonScope(record_lock_metrics=True)
+        other_binding_key = binding_keys.new('two')
+        # Providing one provides two while holding the lock.
+        self.times = [0.0, 1.0, 1.0, 1.0, 1.5, 3.0]
+        scope.provide(
+            self.binding_key,
+            lambda: scope.provide(other_binding_key, lambda: object()))
+        binding_key_to_metrics = scope.get_lock_metrics()
+        self.assertEqual(
+            {self.binding_key, other_binding_key},
+            set(binding_key_to_metrics.keys()))
+        metrics = binding_key_to_metrics[self.binding_key]
+        self.assertEqual((1.0, 2.0),
+                         (metrics.max_wait_secs, metrics.max_hold_secs))
+        self.assertEqual((0, 0, 0, 0, 0, 1, 0), metrics.wait_histogram)
+        metrics = binding_key_to_metrics[other_binding_key]
+        self.assertEqual((0.0, 0.5),
+                         (metrics.max_wait_secs, metrics.max_hold_secs))
+        self.assertEqual((1, 0, 0, 0, 0, 0, 0), metrics.wait_histogram)
+
+    def test_records_when_provider_fn_fails(self):
+        scope = scoping.SingletonScope(record_lock_metrics=True)
+        self.times = [0.0, 0.0, 0.0]
+        def fail():
+            raise ValueError('a-failure')
+        self.assertRaises(ValueError, scope.provide, self.binding_key, fail)
+        [metrics] = scope.get_lock_metrics().values()
+        self.assertEqual(1, metrics.num_acquisitions)
+
+    def test_counts_long_waits_in_last_bucket(self):
+        scope = scoping.WeakSingletonScope(record_lock_metrics=True)
+        self.times = [0.0, 5.0, 5.0]
+        scope.provide(self.binding_key, Weakrefable)
+        [metrics] = scope.get_lock_metrics().values()
+        self.assertEqual((0, 0, 0, 0, 0, 0, 1), metrics.wait_histogram)
+
+    def test_cache_scope_takes_lock_for_memoized_instance(self):
+        scope = scoping.CacheScope(record_lock_metrics=True)
+        self.times = [0.0] * 7
+        scope.provide(self.binding_key, lambda: object())
+        scope.provide(self.binding_key, lambda: object())
+        [metrics] = scope.get_lock_metrics().values()
+        self.assertEqual(2, metrics.num_acquisitions)
+
+    def test_returned_metrics_are_a_snapshot(self):
+        scope = scoping.SingletonScope(record_lock_metrics=True)
+        self.times = [0.0, 0.0, 0.0]
+        scope.provide(self.binding_key, lambda: object())
+        [metrics] = scope.get_lock_metrics().values()
+        self.times = [0.0, 0.0, 0.0]
+        scope.provide(binding_keys.new('two'), lambda: object())
+        scope.drop([self.binding_key])
+        self.times = [0.0, 0.0, 0.0]
+        scope.provide(self.binding_key, lambda: object())
+        self.assertEqual(1, metrics.num_acquisitions)
+        self.assertEqual(
+            2, scope.get_lock_metrics()[self.binding_key].num_acquisitions)
+
 
 class GetIdToScopeWithDefaultsTest(unittest.TestCase):
 
@@ -74,8 +903,23 @@ class GetIdToScopeWithDefaultsTest(unittest.TestCase):
 
     def test_returns_default_scopes_if_none_given(self):
         id_to_scope = scoping.get_id_to_scope_with_defaults()
-        self.assertEqual({scoping.SINGLETON, scoping.PROTOTYPE},
-                         set(id_to_scope.keys()))
+        self.assertEqual(
+            {scoping.SINGLETON, scoping.PROTOTYPE, scoping.REQUEST,
+             scoping.THREAD, scoping.WEAK_SINGLETON},
+            set(id_to_scope.keys()))
+
+    def test_can_make_singleton_scopes_record_lock_metrics(self):
+        id_to_scope = scoping.get_id_to_scope_with_defaults(
+            record_lock_metrics=True)
+        binding_key = binding_keys.new('one')
+        id_to_scope[scoping.SINGLETON].provide(binding_key, lambda: object())
+        id_to_scope[scoping.WEAK_SINGLETON].provide(binding_key, Weakrefable)
+        self.assertEqual(
+            [binding_key],
+            list(id_to_scope[scoping.SINGLETON].get_lock_metrics()))
+        self.assertEqual(
+            [binding_key],
+            list(id_to_scope[scoping.WEAK_SINGLETON].get_lock_metrics()))
 
     def test_does_not_allow_overriding_prototype_scope(self):
         self.assertRaises(errors.OverridingDefaultScopeError,
@@ -87,6 +931,21 @@ class GetIdToScopeWithDefaultsTest(unittest.TestCase):
                           scoping.get_id_to_scope_with_defaults,
                           id_to_scope={scoping.SINGLETON: 'unused'})
 
+    def test_does_not_allow_overriding_thread_scope(self):
+        self.assertRaises(errors.OverridingDefaultScopeError,
+                          scoping.get_id_to_scope_with_defaults,
+                          id_to_scope={scoping.THREAD: 'unused'})
+
+    def test_does_not_allow_overriding_request_scope(self):
+        self.assertRaises(errors.OverridingDefaultScopeError,
+                          scoping.get_id_to_scope_with_defaults,
+                          id_to_scope={scoping.REQUEST: 'unused'})
+
+    def test_does_not_allow_overriding_weak_singleton_scope(self):
+        self.assertRaises(errors.OverridingDefaultScopeError,
+                          scoping.get_id_to_scope_with_defaults,
+                          id_to_scope={scoping.WEAK_SINGLETON: 'unused'})
+
 
 class BindableScopesTest(unittest.TestCase):
 
@@ -100,3 +959,46 @@ class BindableScopesTest(unittest.TestCase):
             lambda: 'unused-desc')
         self.assertEqual(
             'usable-scope', self.bindable_scopes.get_sub_scope(usable_binding))
+
+    def test_get_scope_successfully(self):
+        self.assertEqual(
+            'usable-scope', self.bindable_scopes.get_scope('usable-scope-id'))
+
+    def test_get_all_scopes(self):
+        self.assertEqual(['usable-scope'],
+                         self.bindable_scopes.get_all_scopes())
+
+    def test_child_falls_back_to_parent_scopes(self):
+        child = self.bindable_scopes.new_child({'child-scope-id': 'a-scope'})
+        self.assertEqual('usable-scope', child.get_scope('usable-scope-id'))
+        self.assertEqual('a-scope', child.get_scope('child-scope-id'))
+        self.assertIn('usable-scope-id', child.get_scope_ids())
+        self.assertNotIn('usable-scope', child.get_all_scopes())
+
+    def test_child_has_own_builtin_scopes(self):
+        parent = scoping.BindableScopes(
+            scoping.get_id_to_scope_with_defaults())
+        child = parent.new_child()
+        self.assertIsNot(parent.get_scope(scoping.SINGLETON),
+                         child.get_scope(scoping.SINGLETON))
+
+    def test_child_memoizes_separately_in_parent_scopes(self):
+        cache_scope = scoping.CacheScope()
+        parent = scoping.BindableScopes({'cached': cache_scope})
+        child = parent.new_child()
+        binding = bindings.new_binding_to_instance(
+            binding_keys.new('foo'), 'unused-instance', 'cached',
+            lambda: 'unused-desc')
+        self.assertIs(cache_scope, parent.get_sub_scope(binding))
+        child_scope = child.get_sub_scope(binding)
+        self.assertIs(child_scope, child.get_sub_scope(binding))
+        self.assertEqual('parent-foo', cache_scope.provide(
+            binding.binding_key, lambda: 'parent-foo'))
+        self.assertEqual('child-foo', child_scope.provide(
+            binding.binding_key, lambda: 'child-foo'))
+        self.assertEqual('child-foo', child_scope.provide_with_direct_args(
+            binding.binding_key, (), {'a': 1}, lambda: 'child-foo'))
+        self.assertEqual('parent-foo', cache_scope.provide_with_direct_args(
+            binding.binding_key, (), {'a': 1}, lambda: 'parent-foo'))
+        self.assertEqual('parent-foo', cache_scope.provide(
+            binding.binding_key, lambda: 'unused'))
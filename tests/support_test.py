@@ -14,6 +14,7 @@ limitations under the License.
 """
 
 
+import gc
 import unittest
 import types
 import inspect
@@ -110,6 +111,27 @@ class VerifyClassTypesTest(unittest.TestCase):
                           support.verify_class_types, 42, 'an-arg-name')
 
 
+class VerifyStringTypesTest(unittest.TestCase):
+
+    def test_verifies_string_types_ok(self):
+        support.verify_string_types(['foo', 'bar'], 'unused')
+
+    def test_raises_exception_if_element_is_not_string(self):
+        self.assertRaises(errors.WrongArgElementTypeError,
+                          support.verify_string_types, ['foo', 42],
+                          'an-arg-name')
+
+
+class VerifyStringTypeTest(unittest.TestCase):
+
+    def test_verifies_string_type_ok(self):
+        support.verify_string_type('foo', 'unused')
+
+    def test_raises_exception_if_not_string(self):
+        self.assertRaises(errors.WrongArgTypeError,
+                          support.verify_string_type, 42, 'an-arg-name')
+
+
 class IsSequenceTest(unittest.TestCase):
 
     def test_argument_identified_as_sequence_instance(self):
@@ -191,3 +213,50 @@ class GetMethodArgsTest(unittest.TestCase):
 
     def test_raises_exception_if_not_method(self):
         self.assertRaises(TypeError, support.get_method_args, None)
+
+    def test_get_method_args_of_bound_method_includes_self(self):
+        class SomeClass(object):
+            def some_method(self, arg1):
+                pass
+        arg_names, _, _, _ = support.get_method_args(SomeClass().some_method)
+        self.assertEqual(['self', 'arg1'], arg_names)
+
+
+class IntrospectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.introspected = []
+        def introspect(thing):
+            self.introspected.append(thing)
+            return type(thing).__name__
+        self.cache = support.IntrospectionCache('a-cache', introspect)
+
+    def test_introspects_once_per_thing(self):
+        def some_function():
+            pass
+        self.assertEqual('function', self.cache.get(some_function))
+        self.assertEqual('function', self.cache.get(some_function))
+        self.assertEqual([some_function], self.introspected)
+        self.assertEqual((1, 1), self.cache.get_stats())
+
+    def test_introspects_unweakrefable_things_every_time(self):
+        unweakrefable = object()
+        self.cache.get(unweakrefable)
+        self.cache.get(unweakrefable)
+        self.assertEqual([unweakrefable, unweakrefable], self.introspected)
+        self.assertEqual((0, 2), self.cache.get_stats())
+
+    def test_forgets_collected_things(self):
+        def some_function():
+            pass
+        self.cache.get(some_function)
+        self.assertEqual(1, len(self.cache._thing_to_result))
+        del self.introspected[:]
+        del some_function
+        gc.collect()
+        self.assertEqual(0, len(self.cache._thing_to_result))
+
+    def test_stats_are_reported_by_name(self):
+        self.cache.get(IntrospectionCacheTest)
+        self.assertEqual((0, 1),
+                         support.get_introspection_stats()['a-cache'])